@@ -1,8 +1,13 @@
+import os
 from flask import Flask
 from flask_cors import CORS
 from dotenv import load_dotenv
 from database import db
+from migrations import migrate_db
 from routes import routes
+from refresh import RefreshScheduler
+from combo_index import load_indexes
+import metrics
 
 load_dotenv()
 
@@ -13,7 +18,23 @@ app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///menu_items.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
+with app.app_context():
+    migrate_db()
+
 app.register_blueprint(routes)
 
+# per-route latency, db statement and combo search counters on GET /metrics, and a log line per slow request
+metrics.init_app(app)
+
+# map the precomputed combo indexes (python combo_index.py <restaurant>); every worker maps the same
+# files, so they share one copy in the page cache
+load_indexes()
+
+# re-scrape cached menus in the background every MENU_REFRESH_INTERVAL seconds (off when unset).
+# with the debug reloader only the child process that actually serves requests runs it
+refresh_scheduler = RefreshScheduler(app)
+if __name__ != "__main__" or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+    refresh_scheduler.start()
+
 if __name__ == "__main__":
     app.run(debug=True, host="localhost", port=5050)
@@ -0,0 +1,77 @@
+# combo search over every item vs over classes of interchangeable items (equivalence.py), on the
+# bundled pdf menus. "all" cases enumerate every valid combo and check that the classes expand to the
+# same number of concrete combos; "closest" cases have no valid combo and time the fallback. the class
+# times include grouping the items.
+# run from backend/: python -m benchmarks.bench_classes [pdf dir]
+import os
+import sys
+import time
+import random
+from math import comb, prod
+from collections import Counter
+from pdf_cache import parse_menu_pdf, PDF_DIR
+from snapshot import MenuSnapshot
+from combos import find_combos_dp, find_closest_combos, SearchStats
+from equivalence import ItemClasses
+
+MENUS = ["taco-bell.pdf", "mcdonalds.pdf"]
+
+CASES = [
+    ("all, high protein", "all", {"calorieMax": "700", "proteinMin": "45"}, 3, None),
+    ("all, light meal", "all", {"calorieMax": "400", "proteinMin": "20", "fatMax": "15"}, 3, None),
+    ("all, one drink", "all", {"calorieMax": "600", "proteinMin": "30"}, 3, {"Beverages": {"max": 1}}),
+    ("first 500", "first", {"calorieMax": "1000"}, 4, None),
+    ("closest", "closest", {"calorieMax": "300", "proteinMin": "80"}, 3, None),
+]
+
+def menu_items(path):
+    items = parse_menu_pdf(path)
+    rows = [(k, item["name"], item["category"], item["calories"], item["protein"], item["fat"], item["carbs"])
+            for k, item in enumerate(items)]
+    snapshot = MenuSnapshot(os.path.basename(path), rows)
+    # the route's search order: shuffled, then by calories
+    ordered = list(snapshot.items)
+    random.Random(0).shuffle(ordered)
+    return sorted(ordered, key=lambda item: item.calories or 0)
+
+def concrete_count(combos, classes):
+    return sum(prod(comb(len(classes.members[rep]), k) for rep, k in Counter(map(id, combo)).items())
+               for combo in combos)
+
+def run(kind, items, macros, max_items, limits, repeats=None):
+    stats = SearchStats()
+    start = time.perf_counter()
+    if kind == "closest":
+        combos = find_closest_combos(items, macros, max_items, limits, 10, stats, repeats)
+    else:
+        combos = find_combos_dp(items, macros, max_items, limits, 10 ** 9 if kind == "all" else 500, stats,
+                                repeats=repeats)
+    return combos, time.perf_counter() - start, stats.nodes
+
+def main(folder=PDF_DIR):
+    for name in MENUS:
+        items = menu_items(os.path.join(folder, name))
+        print(f"{name}: {len(items)} items, {len(ItemClasses(items).members)} classes")
+        for label, kind, macros, max_items, limits in CASES:
+            # the dfs gets the items under the calorie max, like in the route
+            pool = items if kind == "closest" else [
+                item for item in items if item.calories is not None and item.calories <= float(macros["calorieMax"])
+            ]
+            plain, plain_time, plain_nodes = run(kind, pool, macros, max_items, limits)
+            start = time.perf_counter()
+            classes = ItemClasses(pool, limits, max_items)
+            grouping_time = time.perf_counter() - start
+            grouped, grouped_time, grouped_nodes = run(kind, classes.items, macros, max_items, limits, classes.repeats)
+            grouped_time += grouping_time
+            note = ""
+            if kind == "all":
+                assert concrete_count(grouped, classes) == len(plain)
+                note = f"{len(plain)} combos as {len(grouped)} class combos"
+            elif kind == "first":
+                note = f"{len(grouped)} combos"
+            print(f"  {label:<18} items: {plain_time * 1000:8.1f} ms {plain_nodes:>9} nodes  "
+                  f"classes: {grouped_time * 1000:8.1f} ms {grouped_nodes:>9} nodes  "
+                  f"speedup: {plain_time / grouped_time:5.1f}x  {note}")
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else PDF_DIR)
@@ -0,0 +1,36 @@
+# "closest" combo fallback: relax-and-sort over 300 arbitrary combos vs the exact best-first search.
+# reports time and the distances of the combos each one returns.
+# run from backend/: python -m benchmarks.bench_closest
+import time
+from snapshot import MenuSnapshot
+from combos import find_closest_combos, macro_distance
+from benchmarks.menus import synthetic_rows
+from benchmarks.reference import plain_find_closest_combos
+
+CASES = [
+    ("low cal, high protein", {"calorieMax": "300", "proteinMin": "120"}),
+    ("high cal, low fat", {"calorieMin": "2000", "fatMax": "20"}),
+    ("three targets", {"calorieMax": "100", "proteinMin": "60", "carbMin": "50"}),
+]
+
+def combo_distance(combo, macros):
+    return macro_distance({key: sum(getattr(item, key) or 0 for item in combo)
+                           for key in ("calories", "protein", "fat", "carbs")}, macros)
+
+def main(n=300, max_items=5, num=10):
+    items = sorted(MenuSnapshot("bench", synthetic_rows(n)).items, key=lambda x: (x.calories or 0))
+    for label, macros in CASES:
+        start = time.perf_counter()
+        old = plain_find_closest_combos(items, macros, max_items)[:num]
+        old_time = time.perf_counter() - start
+        start = time.perf_counter()
+        new = find_closest_combos(items, macros, max_items, num=num)
+        new_time = time.perf_counter() - start
+
+        old_best = combo_distance(old[0], macros) if old else None
+        new_best = combo_distance(new[0], macros) if new else None
+        print(f"{label:<22} relaxed: {old_time * 1000:7.1f} ms best {old_best:7.1f}  "
+              f"exact: {new_time * 1000:7.1f} ms best {new_best:7.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+# combo search: plain dfs vs the branch-and-bound engine in combos.py.
+# run from backend/: python -m benchmarks.bench_combos
+import time
+from snapshot import MenuSnapshot
+from combos import find_combos_dp
+from benchmarks.menus import synthetic_rows
+from benchmarks.reference import plain_find_combos
+
+CASES = [
+    ("protein min near limit", {"calorieMax": "1100", "proteinMin": "180"}, None),
+    ("infeasible macro mins", {"calorieMax": "1500", "proteinMin": "150", "carbMin": "250"}, None),
+    ("easy protein min", {"calorieMax": "1200", "proteinMin": "150"}, None),
+    ("category mins", {"calorieMax": "900"}, {"Salads": {"min": 2}, "Drinks": {"min": 2}, "Sides": {"min": 1}}),
+]
+
+def prepared_items(n):
+    items = MenuSnapshot("bench", synthetic_rows(n)).items
+    return sorted(items, key=lambda x: (x.calories or 0))
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def main(n=300, max_items=5):
+    items = prepared_items(n)
+    for label, macros, category_limits in CASES:
+        filtered = [item for item in items if not macros.get("calorieMax") or item.calories <= float(macros["calorieMax"])]
+        old, old_time = timed(plain_find_combos, filtered, macros, max_items, category_limits)
+        new, new_time = timed(find_combos_dp, filtered, macros, max_items, category_limits)
+        assert old == new
+        print(f"{label:<22} {len(new):>4} combos  plain: {old_time * 1000:9.1f} ms  "
+              f"pruned: {new_time * 1000:7.1f} ms  speedup: {old_time / new_time:7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+# /api/items "closest" fallback: python sort over every item vs the vectorized snapshot ranking.
+# run from backend/: python -m benchmarks.bench_items
+import timeit
+from snapshot import MenuSnapshot
+from combos import item_distance
+from benchmarks.menus import synthetic_rows
+
+MACROS = {"calorieMin": "450", "calorieMax": "500", "proteinMin": "40", "fatMax": "10", "carbMax": "20"}
+NUM = 20
+
+def old_closest(items, macros, num):
+    items = list(items)
+    items.sort(key=lambda item: item_distance(item, macros))
+    return items[:num]
+
+def main(sizes=(500, 5000), repeat=20):
+    for n in sizes:
+        snapshot = MenuSnapshot("bench", synthetic_rows(n))
+        assert old_closest(snapshot.items, MACROS, NUM) == snapshot.closest(MACROS, num=NUM)
+
+        old = min(timeit.repeat(lambda: old_closest(snapshot.items, MACROS, NUM), number=1, repeat=repeat))
+        new = min(timeit.repeat(lambda: snapshot.closest(MACROS, num=NUM), number=1, repeat=repeat))
+        print(f"{n:>6} items  sort: {old * 1000:7.2f} ms  vectorized: {new * 1000:7.2f} ms  speedup: {old / new:5.1f}x")
+
+if __name__ == "__main__":
+    main()
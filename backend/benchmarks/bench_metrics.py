@@ -0,0 +1,88 @@
+# cost of the /metrics instrumentation (metrics.py). the hooks are timed directly (request start/finish, one db
+# statement), since their cost is well under the run-to-run noise of a whole request. a request to a route that
+# runs one sqlite query, with and without the hooks, is timed too: the two alternate round by round (a plain run
+# followed by an instrumented one drifts by more than the hooks cost), best of each.
+# run from backend/: python -m benchmarks.bench_metrics
+import time
+from types import SimpleNamespace
+from flask import Flask
+from sqlalchemy import text, event
+from sqlalchemy.engine import Engine
+import metrics
+from database import db
+
+REQUESTS = 2000
+ROUNDS = 10
+CALLS = 100_000
+
+def make_app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+
+    @app.route("/ping")
+    def ping():
+        return {"rows": db.session.execute(text("select 1")).scalar()}
+    return app
+
+def per_request(client):
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        client.get("/ping")
+    return (time.perf_counter() - start) / REQUESTS
+
+# the db hooks are on the Engine class, so they're attached for the instrumented rounds only
+def db_hooks(on):
+    for name, fn in (("before_cursor_execute", metrics._before_cursor_execute),
+                     ("after_cursor_execute", metrics._after_cursor_execute)):
+        if on and not event.contains(Engine, name, fn):
+            event.listen(Engine, name, fn)
+        elif not on and event.contains(Engine, name, fn):
+            event.remove(Engine, name, fn)
+
+def per_request_pair(plain_app, app):
+    plain_client, client = plain_app.test_client(), app.test_client()
+    best = {"plain": float("inf"), "instrumented": float("inf")}
+    with plain_app.app_context():
+        for _ in range(200):
+            plain_client.get("/ping")
+    with app.app_context():
+        for _ in range(200):
+            client.get("/ping")
+    for _ in range(ROUNDS):
+        for label, target, on in (("plain", plain_app, False), ("instrumented", app, True)):
+            db_hooks(on)
+            with target.app_context():
+                best[label] = min(best[label], per_request(plain_client if label == "plain" else client))
+    db_hooks(True)
+    return best["plain"], best["instrumented"]
+
+def per_call(fn):
+    start = time.perf_counter()
+    for _ in range(CALLS):
+        fn()
+    return (time.perf_counter() - start) / CALLS
+
+def main():
+    plain_app, app = make_app(), make_app()
+    metrics.init_app(app)
+    plain, instrumented = per_request_pair(plain_app, app)
+
+    response = app.response_class("ok")
+    with app.test_request_context("/ping"):
+        request_hooks = per_call(lambda: metrics._finish_request(
+            metrics._record_status(metrics._start_request() or response) and None))
+    context = SimpleNamespace()
+
+    def statement():
+        metrics._before_cursor_execute(None, None, "select 1", (), context, False)
+        metrics._after_cursor_execute(None, None, "select 1", (), context, False)
+    db_hooks = per_call(statement)
+
+    print(f"request timing hooks: {request_hooks * 1e6:5.1f} us per request")
+    print(f"db statement hooks:   {db_hooks * 1e6:5.1f} us per statement")
+    print(f"request + 1 query:    {plain * 1e6:5.0f} us plain, {instrumented * 1e6:5.0f} us instrumented, "
+          f"{(instrumented - plain) * 1e6:+.0f} us (best of {ROUNDS} alternating x {REQUESTS})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# combo search: serial find_combos_dp vs find_combos_parallel at increasing worker counts.
+# run from backend/: python -m benchmarks.bench_parallel [max workers]
+import os
+import sys
+from combos import find_combos_dp, is_valid_item
+from parallel import find_combos_parallel, shutdown_pool
+from benchmarks.bench_combos import prepared_items, timed
+
+# cases the branch and bound can't cut down much: tight macro maxes leave lots of dead ends per node
+CASES = [
+    ("high protein, low fat", {"calorieMax": "2000", "proteinMin": "180", "fatMax": "15", "carbMax": "100"}, None),
+    ("sparse protein min", {"calorieMax": "1500", "proteinMin": "150", "fatMax": "12", "carbMax": "40"}, None),
+    ("category mins", {"calorieMax": "1800", "fatMax": "10", "proteinMin": "120"},
+     {"Salads": {"min": 1}, "Drinks": {"min": 1}}),
+]
+
+def worker_counts(max_workers):
+    counts, k = [], 2
+    while k < max_workers:
+        counts.append(k)
+        k *= 2
+    return counts + [max_workers] if max_workers >= 2 else counts
+
+def main(n=1000, max_items=6, max_workers=None):
+    max_workers = max_workers or os.cpu_count() or 1
+    items = prepared_items(n)
+    print(f"{n} items, up to {max_items} per combo, {os.cpu_count()} cores")
+    try:
+        for label, macros, category_limits in CASES:
+            filtered = [item for item in items if is_valid_item(item, macros)]
+            serial, serial_time = timed(find_combos_dp, filtered, macros, max_items, category_limits)
+            print(f"{label:<22} {len(serial):>4} combos  serial: {serial_time * 1000:9.1f} ms")
+            for workers in worker_counts(max_workers):
+                # first call per worker count starts the pool, keep it out of the timing
+                find_combos_parallel(filtered[:300], macros, 2, category_limits, workers=workers)
+                result, elapsed = timed(find_combos_parallel, filtered, macros, max_items, category_limits,
+                                        workers=workers)
+                assert result == serial
+                print(f"{'':<22} {workers:>3} workers: {elapsed * 1000:9.1f} ms  "
+                      f"speedup: {serial_time / elapsed:5.2f}x")
+    finally:
+        shutdown_pool()
+
+if __name__ == "__main__":
+    main(max_workers=int(sys.argv[1]) if len(sys.argv) > 1 else None)
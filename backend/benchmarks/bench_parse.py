@@ -0,0 +1,86 @@
+# nutritionix page parsing: the original BeautifulSoup parser vs the single-pass menu_parser, checking
+# both return the same (restaurant_name, items, logo_url) on synthetic pages, the edge cases below and
+# the pages in benchmarks/fixtures/ (or a directory of saved pages passed in). any difference fails the run.
+# run from backend/: python -m benchmarks.bench_parse [saved pages dir]
+import os
+import sys
+import time
+from menu_parser import parse_nutritionix_menu
+from benchmarks.menus import synthetic_page
+from benchmarks.reference import soup_parse_nutritionix_menu
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+HEAD = ('<tr><th id="inmGrid_c0">Item</th><th id="inmGrid_c1"><span>Calo</span> <b>ries</b></th>'
+        '<th id="inmGrid_c2">Total Fat</th><th id="inmGrid_c3">Total Carbohydrates</th>'
+        '<th id="inmGrid_c4">Protein</th><th id="inmGrid_c5">Sodium</th></tr>')
+
+def row(name, cal, fat, carbs, prot, link_attrs='class="nmItem"', td_attrs='class="al"', extra=""):
+    cells = "".join(f'<td headers="inmGrid_c{c}">{v}</td>' for c, v in enumerate([cal, fat, carbs, prot], 1))
+    return f'<tr class="odd"><td {td_attrs}><a {link_attrs}>{name}</a>{extra}</td>{cells}</tr>'
+
+def page(title, rows, brand='<div id="brand"><img src="/logo.png"></div>'):
+    return f"<html><head><title>{title}</title></head><body>{brand}<table>{HEAD}{''.join(rows)}</table></body></html>"
+
+# small pages for the corners of the old parser's behaviour
+EDGE_CASES = {
+    "entities and nested text": page("Ben &amp; Jerry&#39;s - Full Nutrition Information", [
+        '<tr class="subCategory"><td><h3> Cones &amp; <em>Cups</em> </h3></td></tr>',
+        row("<span>Big</span> <b>Cone</b>", "1,020", "12.5", "40", "8"),
+        row("Waffle", "300", "1", "2", "3", link_attrs='class="nmItem x" title="Waffle &quot;XL&quot;"'),
+    ]),
+    "title that doesn't match": page("\n  Some Place | Menu", [row("Fries", "300", "15", "40", "4")]),
+    "leading newline in title": page("\nTaco Town - Interactive Nutrition", [row("Taco", "170", "9", "13", "8")]),
+    "skipped rows": page("Diner - Full Nutrition Information", [
+        '<tr class="subCategory"><td>no heading here</td></tr>',
+        row("No link", "100", "1", "1", "1", link_attrs='class="other"'),
+        row("Not al", "100", "1", "1", "1", td_attrs='class="left"'),
+        row("Dashes", "--", "1", "1", "1"),
+        row("Empty title", "200", "2", "2", "2", link_attrs='class="nmItem" title=""'),
+        '<tr class="subCategory"><td><h3>Catering</h3></td></tr>',
+        row("Party Tray", "5000", "1", "1", "1"),
+        '<tr class="subCategory other"><td><h3>Drinks</h3><h3>ignored</h3></td></tr>',
+        row("Soda", "150", "0", "40", "0"),
+    ], brand='<div id="brand"><p>no image</p></div><div id="brand"><img src="/second.png"></div>'),
+    "scripts and comments": page("Wings - Full Nutrition Information", [
+        '<!-- <tr class="subCategory"><td><h3>Commented</h3></td></tr> -->',
+        '<script>var t = "<tr class=\'subCategory\'><td><h3>Scripted</h3></td></tr>";</script>',
+        row("Hot Wings", "600", "40", "2", "50", extra="<br/><img src='x.png' alt='a > b'>"),
+    ]),
+    "multi-token headers": page("Grill - Full Nutrition Information", [
+        '<tr><td class="al"><a class="nmItem">Steak</a></td><td headers="inmGrid_c1 x">700</td>'
+        '<td headers="y inmGrid_c2">40</td><td headers="inmGrid_c3">0</td><td headers="inmGrid_c4">60</td>'
+        '<td headers="inmGrid_c1">999</td></tr>',
+    ], brand=""),
+}
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def check(label, html, slug="some-slug"):
+    old, old_time = timed(soup_parse_nutritionix_menu, html, slug)
+    new, new_time = timed(parse_nutritionix_menu, html, slug)
+    assert old == new, f"{label}: parsers disagree"
+    return old, old_time, new_time
+
+def main(pages_dir=FIXTURES):
+    for label, html in EDGE_CASES.items():
+        check(label, html)
+    print(f"{len(EDGE_CASES)} edge cases match")
+
+    pages = [(f"synthetic, {n} items", synthetic_page("Bench Burger", n, seed=n)) for n in (100, 500, 2000)]
+    if pages_dir:
+        for filename in sorted(os.listdir(pages_dir)):
+            if filename.endswith(".html"):
+                with open(os.path.join(pages_dir, filename), encoding="utf-8") as f:
+                    pages.append((filename, f.read()))
+
+    for label, html in pages:
+        (_, items, _), old_time, new_time = check(label, html, label)
+        print(f"{label:<24} {len(items):>5} items  soup: {old_time * 1000:8.1f} ms  "
+              f"single pass: {new_time * 1000:7.1f} ms  speedup: {old_time / new_time:5.1f}x")
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else FIXTURES)
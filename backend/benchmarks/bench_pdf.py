@@ -0,0 +1,27 @@
+# pdf menu ingestion: parse_menu_pdf one file at a time vs parse_menu_pdfs splitting every file's pages
+# over a process pool, checking both return the same items for every file.
+# run from backend/: python -m benchmarks.bench_pdf [pdf dir] [max workers]
+import os
+import sys
+import time
+from pdf_cache import parse_menu_pdf, parse_menu_pdfs, PDF_DIR
+
+def main(folder=PDF_DIR, max_workers=os.cpu_count() or 1):
+    paths = [os.path.join(folder, name) for name in sorted(os.listdir(folder)) if name.lower().endswith(".pdf")]
+    start = time.perf_counter()
+    serial = {path: parse_menu_pdf(path) for path in paths}
+    baseline = time.perf_counter() - start
+    print(f"{len(paths)} pdfs, {sum(map(len, serial.values()))} items")
+    print(f"serial:    {baseline:6.2f} s")
+
+    workers = 2
+    while workers <= max(max_workers, 2):
+        start = time.perf_counter()
+        parsed = dict(parse_menu_pdfs(paths, workers, progress=None))
+        elapsed = time.perf_counter() - start
+        same = all(parsed[path] == serial[path] for path in paths)
+        print(f"{workers:>3} workers: {elapsed:6.2f} s  speedup: {baseline / elapsed:5.1f}x  identical: {same}")
+        workers *= 2
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else PDF_DIR, int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1)
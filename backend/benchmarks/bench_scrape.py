@@ -0,0 +1,32 @@
+# bulk scraping against the local nutritionix stand-in: one page at a time vs the pooled, concurrent
+# pipeline in scraper.py, with simulated latency and 503s to exercise the retries.
+# run from backend/: python -m benchmarks.bench_scrape
+import time
+from cache import parse_menu_page
+from scraper import scrape_many
+from benchmarks.stub_server import StubServer
+
+SLUGS = [f"chain-{i}" for i in range(24)] + ["missing-chain"]
+
+def run(server, workers, rate):
+    start = time.perf_counter()
+    report = {}
+    for slug, result, error in scrape_many(SLUGS, parse_menu_page, workers=workers, rate=rate,
+                                           base_url=server.url, retries=4):
+        report[slug] = f"error: {error}" if error else len(result[1])
+    return report, time.perf_counter() - start
+
+def main(latency=0.3, failure_rate=0.1):
+    with StubServer(latency=latency, failure_rate=failure_rate, items=60) as server:
+        print(f"{len(SLUGS)} menus, {latency * 1000:.0f} ms latency, {failure_rate:.0%} 503s")
+        baseline = None
+        for workers, rate in [(1, None), (4, 20), (8, 20), (16, 40)]:
+            before = server.requests
+            report, elapsed = run(server, workers, rate)
+            errors = {slug: r for slug, r in report.items() if isinstance(r, str)}
+            baseline = baseline or elapsed
+            print(f"{workers:>3} workers: {elapsed:6.2f} s  speedup: {baseline / elapsed:5.1f}x  "
+                  f"requests: {server.requests - before}  failed slugs: {sorted(errors)}")
+
+if __name__ == "__main__":
+    main()
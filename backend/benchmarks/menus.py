@@ -0,0 +1,115 @@
+import random
+
+CATEGORIES = ["Burgers", "Chicken", "Breakfast", "Sides", "Salads", "Drinks", "Desserts", "Sauces"]
+
+# synthetic menu rows shaped like the snapshot query: (id, name, category, calories, protein, fat, carbs)
+def synthetic_rows(n, seed=0):
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n):
+        protein = round(rnd.uniform(0, 60))
+        fat = round(rnd.uniform(0, 50))
+        carbs = round(rnd.uniform(0, 120))
+        calories = protein * 4 + carbs * 4 + fat * 9 + rnd.randint(-20, 20)
+        rows.append((i + 1, f"Item {i}", rnd.choice(CATEGORIES), max(calories, 0), protein, fat, carbs))
+    return rows
+
+# nutrition grid columns in the order nutritionix lists them; the scraper only reads four of them
+PAGE_COLUMNS = ["Calories", "Total Fat", "Saturated Fat", "Trans Fat", "Cholesterol", "Sodium",
+                "Total Carbohydrates", "Dietary Fiber", "Sugars", "Protein"]
+
+# an html page shaped like nutritionix.com/{slug}/menu/premium, for the scraper stand-in and the
+# parser benchmark. includes the things the parser has to skip: catering sections, rows without
+# numbers, rows without an item link, thousands separators
+def synthetic_page(name, n, seed=0):
+    rnd = random.Random(seed)
+    categories = CATEGORIES + ["Catering Trays"]
+    rows = []
+    for k, cat in enumerate(categories):
+        rows.append(f'<tr class="subCategory"><td colspan="{len(PAGE_COLUMNS) + 1}"><h3>{cat}</h3></td></tr>')
+        for i in range(k * n // len(categories), (k + 1) * n // len(categories)):
+            protein = round(rnd.uniform(0, 60), 1)
+            fat = round(rnd.uniform(0, 50) * 2) / 2
+            carbs = round(rnd.uniform(0, 120))
+            calories = round(protein * 4 + carbs * 4 + fat * 9) * (3 if rnd.random() < 0.05 else 1)
+            values = {"Calories": f"{calories:,}", "Total Fat": fat, "Total Carbohydrates": carbs, "Protein": protein}
+            if rnd.random() < 0.02:
+                values["Protein"] = "--"
+            cells = "".join(
+                f'<td headers="inmGrid_c{c + 1}" class="ac">{values.get(col, rnd.randint(0, 900))}</td>'
+                for c, col in enumerate(PAGE_COLUMNS)
+            )
+            link = (f'<a class="nmItem" title="Item {i} &amp; Co" href="/i/{i}">Item {i} &amp; Co</a>'
+                    if rnd.random() > 0.01 else f"Item {i}")
+            rows.append(f'<tr class="odd"><td class="al">{link}</td>{cells}</tr>')
+
+    return _page(name, seed, rows)
+
+def _page(name, seed, rows):
+    headers = "".join(f'<th id="inmGrid_c{c + 1}" class="ac"><span>{col}</span></th>' for c, col in enumerate(PAGE_COLUMNS))
+    return (
+        f"<!DOCTYPE html><html><head><title>{name} - Full Nutrition Information</title></head><body>"
+        f'<div id="brand"><a href="/"><img src="https://example.com/logos/{seed}.png" alt="{name}"></a></div>'
+        f'<table id="inmGrid" class="nutrition"><thead><tr><th id="inmGrid_c0">Item</th>{headers}</tr></thead>'
+        f"<tbody>{''.join(rows)}</tbody></table>"
+        "<footer><table><tr><td>site footer</td></tr></table></footer></body></html>"
+    )
+
+# (category, share of the menu, (min, typical, max) grams of protein, fat, carbs, share of zero-calorie items)
+MENU_PROFILE = [
+    ("Burgers",   0.14, (15, 30, 60), (10, 28, 60), (30, 45, 70),  0.0),
+    ("Chicken",   0.14, (15, 32, 70), (5, 20, 45),  (0, 30, 60),   0.0),
+    ("Breakfast", 0.12, (5, 18, 35),  (5, 20, 40),  (20, 40, 70),  0.0),
+    ("Salads",    0.07, (5, 25, 45),  (5, 18, 40),  (5, 15, 35),   0.0),
+    ("Sides",     0.12, (1, 4, 12),   (0, 14, 30),  (10, 35, 70),  0.0),
+    ("Drinks",    0.22, (0, 1, 12),   (0, 0, 15),   (0, 40, 110),  0.3),
+    ("Desserts",  0.10, (2, 6, 15),   (5, 15, 40),  (30, 60, 120), 0.0),
+    ("Sauces",    0.09, (0, 0, 2),    (0, 6, 20),   (0, 4, 15),    0.2),
+]
+SIZES = [("Small", 0.75), ("Medium", 1.0), ("Large", 1.4)]
+
+# menu rows like synthetic_rows, but shaped like real menus: category mixes and per-category macro
+# ranges from MENU_PROFILE, calories from the macros, zero-calorie drinks and sauces, a quarter of the
+# items in three sizes, and some items listed again under a second category with the same macros
+def realistic_rows(n, seed=0):
+    rnd = random.Random(seed)
+    rows = []
+
+    def add(name, category, protein, fat, carbs):
+        calories = round((protein * 4 + carbs * 4 + fat * 9) * rnd.uniform(0.95, 1.05), -1)
+        rows.append((len(rows) + 1, name, category, calories, protein, fat, carbs))
+
+    while len(rows) < n:
+        category, _, protein, fat, carbs, zero = rnd.choices(MENU_PROFILE, [p[1] for p in MENU_PROFILE])[0]
+        name = f"{category} Item {len(rows)}"
+        if rnd.random() < zero:
+            add(f"{name} Zero", category, 0, 0, 0)
+            continue
+        macros = [round(rnd.triangular(low, high, mode)) for low, mode, high in (protein, fat, carbs)]
+        if rnd.random() < 0.25:
+            for size, scale in SIZES:
+                add(f"{name} ({size})", category, *[round(m * scale) for m in macros])
+        else:
+            add(name, category, *macros)
+        if rnd.random() < 0.08:
+            add(name, rnd.choice(MENU_PROFILE)[0], *macros)
+    return rows[:n]
+
+# realistic_rows as a nutritionix page, one section per category, for the parsing benchmarks
+def realistic_page(name, n, seed=0):
+    sections = {}
+    for _, item, category, calories, protein, fat, carbs in realistic_rows(n, seed):
+        sections.setdefault(category, []).append((item, calories, protein, fat, carbs))
+    rnd = random.Random(seed)
+    rows = []
+    for category, items in sections.items():
+        rows.append(f'<tr class="subCategory"><td colspan="{len(PAGE_COLUMNS) + 1}"><h3>{category}</h3></td></tr>')
+        for item, calories, protein, fat, carbs in items:
+            values = {"Calories": f"{calories:,.0f}", "Total Fat": fat, "Total Carbohydrates": carbs, "Protein": protein}
+            cells = "".join(
+                f'<td headers="inmGrid_c{c + 1}" class="ac">{values.get(col, rnd.randint(0, 900))}</td>'
+                for c, col in enumerate(PAGE_COLUMNS)
+            )
+            rows.append(f'<tr class="odd"><td class="al"><a class="nmItem" title="{item}" href="/i/{len(rows)}">'
+                        f'{item}</a></td>{cells}</tr>')
+    return _page(name, seed, rows)
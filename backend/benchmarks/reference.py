@@ -0,0 +1,192 @@
+# original implementations kept as baselines for benchmarks and equivalence checks
+import re
+from bs4 import BeautifulSoup
+from combos import safe_float, macro_distance
+from menu_parser import disallowed_categories
+
+# f(i, j) = all valid combos from items[i:] given accumulated macro totals j = (cal, prot, fat, carb).
+# each call either skips items[i] (implicit, via loop advancing to i+1) or includes it and recurses.
+# combo and cat_counts are mutated in-place and restored after each branch (append/pop).
+# valid_combos is a shared collector; collect_limit provides early termination.
+def plain_find_combos(items, macros, max_items, category_limits=None, collect_limit=500):
+    cal_max  = safe_float(macros.get("calorieMax"))
+    prot_max = safe_float(macros.get("proteinMax"))
+    fat_max  = safe_float(macros.get("fatMax"))
+    carb_max = safe_float(macros.get("carbMax"))
+    cal_min  = safe_float(macros.get("calorieMin"))
+    prot_min = safe_float(macros.get("proteinMin"))
+    fat_min  = safe_float(macros.get("fatMin"))
+    carb_min = safe_float(macros.get("carbMin"))
+    cat_lim  = category_limits or {}
+
+    valid_combos = []
+    n = len(items)
+
+    def meets_min(cal, prot, fat, carb):
+        if cal_min  is not None and cal  < cal_min:  return False
+        if prot_min is not None and prot < prot_min: return False
+        if fat_min  is not None and fat  < fat_min:  return False
+        if carb_min is not None and carb < carb_min: return False
+        return True
+
+    def meets_category_min(cat_counts):
+        for cat, limits in cat_lim.items():
+            min_cat = limits.get("min")
+            if min_cat is not None and cat_counts.get(cat, 0) < min_cat:
+                return False
+        return True
+
+    # f(i, j): collect valid combos from items[i:] with accumulated totals j
+    def f(i, count, cal, prot, fat, carb, combo, cat_counts):
+        if len(valid_combos) >= collect_limit:
+            return
+
+        if count >= 2 and meets_min(cal, prot, fat, carb) and meets_category_min(cat_counts):
+            valid_combos.append(list(combo))
+            if len(valid_combos) >= collect_limit:
+                return
+
+        if count >= max_items:
+            return
+
+        for i in range(i, n):
+            if len(valid_combos) >= collect_limit:
+                return
+
+            item = items[i]
+            cat = item.category or ""
+
+            # prune if this category already hit its max
+            if cat_lim.get(cat, {}).get("max") is not None:
+                if cat_counts.get(cat, 0) >= cat_lim[cat]["max"]:
+                    continue
+
+            new_cal  = cal  + (item.calories or 0)
+            new_prot = prot + (item.protein  or 0)
+            new_fat  = fat  + (item.fat      or 0)
+            new_carb = carb + (item.carbs    or 0)
+
+            if cal_max  is not None and new_cal  > cal_max:  break
+            if prot_max is not None and new_prot > prot_max: continue
+            if fat_max  is not None and new_fat  > fat_max:  continue
+            if carb_max is not None and new_carb > carb_max: continue
+
+            cat_counts[cat] = cat_counts.get(cat, 0) + 1
+            combo.append(item)
+            f(i + 1, count + 1, new_cal, new_prot, new_fat, new_carb, combo, cat_counts)
+            combo.pop()
+            cat_counts[cat] -= 1
+            if cat_counts[cat] == 0:
+                del cat_counts[cat]
+
+    f(0, 0, 0, 0, 0, 0, [], {})
+    return valid_combos
+
+# there there are no exact combos exist, get all combos ignoring max constraints and return the closest ones
+def plain_find_closest_combos(items, macros, max_items, category_limits=None, collect_limit=300):
+
+    # relax max constraints so the DFS doesn't prune on them
+    relaxed = dict(macros)
+    for key in ("calorieMax", "proteinMax", "fatMax", "carbMax"):
+        relaxed[key] = None
+
+    combos = plain_find_combos(items, relaxed, max_items, category_limits, collect_limit)
+
+    if not combos:
+        # also relax min constraints as a last resort
+        empty = {k: None for k in macros}
+        combos = plain_find_combos(items, empty, max_items, category_limits, collect_limit)
+
+    def combo_dist(combo):
+        return macro_distance({
+            "calories": sum(i.calories or 0 for i in combo),
+            "protein":  sum(i.protein  or 0 for i in combo),
+            "fat":      sum(i.fat      or 0 for i in combo),
+            "carbs":    sum(i.carbs    or 0 for i in combo),
+        }, macros)
+
+    combos.sort(key=combo_dist)
+    return combos
+
+# the original BeautifulSoup page parser, kept as the baseline for menu_parser.parse_nutritionix_menu
+def soup_parse_nutritionix_menu(html, slug):
+    soup = BeautifulSoup(html, "html.parser")
+
+    # get the restaurant name from the page
+    title = soup.title.string if soup.title else ""
+    title_match = re.match(r"^(.+?)\s+-\s+(Full|Interactive) Nutrition", title)
+    restaurant_name = title_match.group(1).strip() if title_match else slug.replace("-", " ").title()
+
+    # get the column ids for nutrition info
+    col_ids = {}
+    for th in soup.find_all("th", id=re.compile(r"^inmGrid_c\d+$")):
+        text = th.get_text(strip=True).lower()
+        col_id = th["id"].split("_")[1]  # e.g. "c1"
+        if "calorie" in text:
+            col_ids["calories"] = col_id
+        elif "total fat" in text:
+            col_ids["fat"] = col_id
+        elif "total carbohydrate" in text:
+            col_ids["carbs"] = col_id
+        elif "protein" in text:
+            col_ids["protein"] = col_id
+
+    if not col_ids:
+        raise ValueError(f"could not detect nutrition columns for '{slug}'")
+
+    items = []
+    current_category = "Other"
+
+    # go through all <tr> elements in order
+    for row in soup.find_all("tr"):
+        if "subCategory" in (row.get("class") or []):
+            h3 = row.find("h3")
+            if h3:
+                current_category = h3.get_text(strip=True)
+            continue
+
+        name_td = row.find("td", class_="al")
+        if not name_td:
+            continue
+
+        name_link = name_td.find("a", class_="nmItem")
+        if not name_link:
+            continue
+        name = name_link.get("title") or name_link.get_text(strip=True)
+
+        def get_col(col_id):
+            td = row.find("td", headers=f"inmGrid_{col_id}")
+            return td.get_text(strip=True) if td else None
+
+        if any(d in current_category.lower() for d in disallowed_categories):
+            continue
+
+        try:
+            calories = int(get_col(col_ids["calories"]).replace(",", ""))
+            fat      = float(get_col(col_ids["fat"]).replace(",", ""))
+            carbs    = float(get_col(col_ids["carbs"]).replace(",", ""))
+            protein  = float(get_col(col_ids["protein"]).replace(",", ""))
+        except (TypeError, ValueError, AttributeError):
+            continue
+
+        items.append({
+            "name": name,
+            "restaurant": restaurant_name,
+            "category": current_category,
+            "calories": calories,
+            "fat": fat,
+            "carbs": carbs,
+            "protein": protein,
+        })
+
+    if not items:
+        raise ValueError(f"No menu items found for '{slug}' — restaurant may not exist on Nutritionix")
+
+    logo_url = None
+    brand_div = soup.find("div", id="brand")
+    if brand_div:
+        img = brand_div.find("img")
+        if img and img.get("src"):
+            logo_url = img["src"]
+
+    return restaurant_name, items, logo_url
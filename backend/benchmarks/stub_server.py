@@ -0,0 +1,115 @@
+# local stand-in for nutritionix, serving saved menu pages so the scraper can be run and timed offline.
+#
+#   python -m benchmarks.stub_server [pages dir] [port]
+#   NUTRITIONIX_URL=http://127.0.0.1:8765 python cache.py
+#
+# GET /{slug}/menu/premium serves {pages dir}/{slug}.html when it exists, otherwise a synthetic page
+# generated from the slug (see menus.synthetic_page); slugs starting with "missing" get a 404.
+# latency and failure_rate simulate a slow, flaky upstream (failures are 503s with Retry-After: 0).
+# pages carry an ETag and Last-Modified and conditional requests get a 304 unless validators=False;
+# set_page() swaps a page's content to simulate a menu change.
+import os
+import sys
+import time
+import random
+import threading
+import zlib
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from benchmarks.menus import synthetic_page
+
+class StubServer:
+    def __init__(self, pages_dir=None, port=0, latency=0.0, failure_rate=0.0, items=300, seed=0, validators=True):
+        self.pages_dir = pages_dir
+        self.validators = validators
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.items = items
+        self.rnd = random.Random(seed)
+        self.requests = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._pages = {}
+        self._modified = {}
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def set_page(self, slug, html):
+        self._pages[slug] = html
+        self._modified[slug] = time.time()
+
+    def page(self, slug):
+        if slug not in self._pages:
+            path = os.path.join(self.pages_dir, f"{slug}.html") if self.pages_dir else None
+            if path and os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    self._pages[slug] = f.read()
+            else:
+                name = slug.replace("-", " ").title()
+                self._pages[slug] = synthetic_page(name, self.items, seed=zlib.crc32(slug.encode()))
+        return self._pages[slug]
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parts = self.path.strip("/").split("/")
+                with server._lock:
+                    server.requests += 1
+                    fail = server.rnd.random() < server.failure_rate
+                    server.failures += fail
+                time.sleep(server.latency)
+                if len(parts) != 3 or parts[1:] != ["menu", "premium"] or parts[0].startswith("missing"):
+                    return self.reply(404, b"not found")
+                if fail:
+                    return self.reply(503, b"try again", {"Retry-After": "0"})
+                body = server.page(parts[0]).encode("utf-8")
+                headers = {"Content-Type": "text/html; charset=utf-8"}
+                if server.validators:
+                    etag = f'"{zlib.crc32(body):08x}"'
+                    modified = server._modified.setdefault(parts[0], time.time())
+                    headers["ETag"] = etag
+                    headers["Last-Modified"] = formatdate(modified, usegmt=True)
+                    if self.headers.get("If-None-Match") == etag:
+                        return self.reply(304, b"", {"ETag": etag})
+                self.reply(200, body, headers)
+
+            def reply(self, status, body, headers=None):
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+if __name__ == "__main__":
+    pages_dir = sys.argv[1] if len(sys.argv) > 1 else None
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8765
+    server = StubServer(pages_dir, port)
+    print(f"serving nutritionix stand-in on {server.url}")
+    server.httpd.serve_forever()
@@ -0,0 +1,237 @@
+# benchmark suite for the search, query and ingestion hot paths, with a stored baseline to catch
+# regressions. every case runs on generated menus of realistic shape (menus.realistic_rows) at each size,
+# except the pdf cases, which parse the bundled menus.
+#
+#   python -m benchmarks.suite                  # run and compare against benchmarks/baseline.json
+#   python -m benchmarks.suite --save           # run and store the results as the new baseline
+#   python -m benchmarks.suite -k combos --sizes 100 500 --threshold 0.5
+#
+# each case reports ops/sec, p50 and p99 over its timed runs and the peak memory (tracemalloc) of one
+# extra run. the timed runs are split into ROUNDS rounds and the fastest round's median is kept as "best";
+# a busy moment or a slow cpu state can drag one round (or the overall p50) up by half, but rarely all of
+# them. a case regresses when even its best is more than --threshold slower than the baseline's p50 (what
+# it usually takes) and by more than --noise-ms, or its peak memory more than --memory-threshold bigger.
+# a case that looks slower is measured again at the end of the run, up to --retries times, keeping its
+# fastest result: a real regression is slow every time, a stall of the machine isn't. any regression left
+# makes the run exit with status 1.
+# baselines are only comparable on the machine they were saved on, so save one per machine (or CI runner).
+# the nutritionix pages (*.html) in benchmarks/fixtures/ are parsed as extra cases.
+import os
+import io
+import sys
+import gc
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+import tracemalloc
+import numpy as np
+
+from flask import Flask
+import cache
+from database import db
+from snapshot import MenuSnapshot
+from combos import find_combos_dp, find_closest_combos, SearchStats
+from menu_parser import parse_nutritionix_menu
+from pdf_cache import parse_menu_pdf, PDF_DIR
+from benchmarks.menus import realistic_rows, realistic_page
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(HERE, "baseline.json")
+FIXTURES = os.path.join(HERE, "fixtures")
+SIZES = [100, 500, 1000, 5000]
+PDFS = ["mcdonalds.pdf"]  # pdfplumber takes seconds a page set; one menu is enough to see a change
+MIN_TIME = 0.5   # seconds of timed runs per case, at least MIN_RUNS and at most MAX_RUNS of them
+MIN_RUNS = 5
+MAX_RUNS = 1000
+ROUNDS = 5       # the timed runs are split into this many rounds; the fastest round's median is compared
+NOISE_MS = 1.0   # slowdowns smaller than this are ignored whatever the percentage
+RETRIES = 2      # extra measurements of a case that looks slower before it counts as a regression
+RETRY_PAUSE = 10 # seconds to wait before each round of them
+
+COMBO_QUERY = {"calorieMax": "900", "proteinMin": "50"}
+CLOSEST_QUERY = {"calorieMax": "300", "proteinMin": "90", "fatMax": "5"}
+CLOSEST_NODES = 20_000  # the fallback searches until its limits on big menus, so it's timed per node budget
+ITEMS_QUERY = {"calorieMin": "450", "calorieMax": "500", "proteinMin": "40", "fatMax": "10", "carbMax": "20"}
+
+# items in the order the combo routes search them: under the calorie max, by calories
+def search_items(snapshot, macros):
+    return sorted(snapshot.filter(macros, use_min=False), key=lambda item: item.calories or 0)
+
+# a flask app on a throwaway sqlite file for cache_restaurant, which needs an app context
+def ingest_app(path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+# (name, size, setup) for every case; setup() returns the function to time. setup runs untimed
+def cases(sizes, tmp):
+    app = ingest_app(os.path.join(tmp, "bench.db"))
+    # frontier and combo index builds run on background threads after cache_restaurant; they'd compete
+    # with the timed runs and aren't part of the insert path
+    cache.schedule_build = lambda *args: None
+    cache.combo_index.schedule_build = lambda *args: None
+
+    for n in sizes:
+        snapshot = MenuSnapshot("bench", realistic_rows(n, seed=n))
+        combo_items = search_items(snapshot, COMBO_QUERY)
+        yield "combos_dp", n, lambda items=combo_items: (
+            lambda: find_combos_dp(items, COMBO_QUERY, 3, None, 500, SearchStats()))
+        closest_items = sorted(snapshot.items, key=lambda item: item.calories or 0)
+        yield "closest_combos", n, lambda items=closest_items: (
+            lambda: find_closest_combos(items, CLOSEST_QUERY, 3, None, 10, SearchStats(node_limit=CLOSEST_NODES)))
+        yield "items_fallback", n, lambda snapshot=snapshot: (lambda: snapshot.closest(ITEMS_QUERY, num=20))
+        html = realistic_page("Bench Grill", n, seed=n)
+        yield "parse_page", n, lambda html=html: (lambda: parse_nutritionix_menu(html, "bench-grill"))
+
+        items = [{"name": name, "category": category, "calories": cal, "protein": prot, "fat": fat, "carbs": carbs}
+                 for _, name, category, cal, prot, fat, carbs in realistic_rows(n, seed=n)]
+
+        def insert(items=items, n=n):
+            runs = iter(range(MAX_RUNS + 2))
+
+            def run():
+                with app.app_context(), contextlib.redirect_stdout(io.StringIO()):
+                    cache.cache_restaurant(f"Bench {n} {next(runs)}", items)
+            return run
+        yield "cache_restaurant", n, insert
+
+    if os.path.isdir(FIXTURES):
+        for filename in sorted(os.listdir(FIXTURES)):
+            if filename.endswith(".html"):
+                with open(os.path.join(FIXTURES, filename), encoding="utf-8") as f:
+                    html = f.read()
+                yield f"parse_fixture:{filename}", 0, lambda html=html, slug=filename[:-5]: (
+                    lambda: parse_nutritionix_menu(html, slug))
+
+    for filename in PDFS:
+        path = os.path.join(PDF_DIR, filename)
+        if os.path.exists(path):
+            yield f"parse_pdf:{filename}", 0, lambda path=path: (lambda: parse_menu_pdf(path))
+
+def measure(fn, min_time=MIN_TIME, rounds=ROUNDS):
+    fn()  # warm up: imports, caches, first-touch allocations
+    # MIN_RUNS, MAX_RUNS and min_time are shared out between the rounds, so slow cases cost the same as before
+    min_runs, max_runs = -(-MIN_RUNS // rounds), max(MAX_RUNS // rounds, 1)
+    medians, times = [], []
+    for _ in range(rounds):
+        round_times = []
+        start = time.perf_counter()
+        while len(round_times) < max_runs and (len(round_times) < min_runs
+                                               or time.perf_counter() - start < min_time / rounds):
+            t = time.perf_counter()
+            fn()
+            round_times.append(time.perf_counter() - t)
+        medians.append(np.median(round_times))
+        times += round_times
+
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    times = np.array(times)
+    return {
+        "runs": len(times),
+        "ops_per_sec": round(len(times) / times.sum(), 2),
+        "p50_ms": round(float(np.percentile(times, 50)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(times, 99)) * 1000, 3),
+        "best_ms": round(float(min(medians)) * 1000, 3),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+# how much slower a result's best round is than the baseline's p50, as a fraction
+def slowdown(result, base):
+    return result["best_ms"] / base["p50_ms"] - 1
+
+# what's worse than the baseline by more than the thresholds, as messages
+def regressions(result, base, threshold, memory_threshold, noise_ms=NOISE_MS):
+    found = []
+    if slowdown(result, base) > threshold and result["best_ms"] - base["p50_ms"] > noise_ms:
+        found.append(f"p50 {base['p50_ms']:.3f} -> best {result['best_ms']:.3f} ms")
+    # a few KB either way is allocator noise, not a regression
+    if result["peak_kb"] > base["peak_kb"] * (1 + memory_threshold) + 64:
+        found.append(f"peak {base['peak_kb']:.0f} -> {result['peak_kb']:.0f} KB")
+    return found
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="benchmark the search, query and ingestion hot paths")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="menu sizes to generate")
+    parser.add_argument("-k", dest="only", help="only run cases whose name contains this")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline file to compare against or save to")
+    parser.add_argument("--save", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown (0.25 = 25%%)")
+    parser.add_argument("--noise-ms", type=float, default=NOISE_MS, help="slowdowns under this many ms never fail")
+    parser.add_argument("--memory-threshold", type=float, default=0.25, help="allowed peak memory growth")
+    parser.add_argument("--min-time", type=float, default=MIN_TIME, help="seconds of timed runs per case")
+    parser.add_argument("--retries", type=int, default=RETRIES, help="re-measure a slower case this many times")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    def show(key, result, base):
+        problems = []
+        if base is None:
+            note = "new"
+        else:
+            problems = regressions(result, base, args.threshold, args.memory_threshold, args.noise_ms)
+            note = f"{slowdown(result, base):+.0%}" + (f"  REGRESSION: {'; '.join(problems)}" if problems else "")
+        print(f"{key:<34} {result['ops_per_sec']:>10.1f} {result['best_ms']:>10.3f} {result['p50_ms']:>10.3f} "
+              f"{result['p99_ms']:>10.3f} {result['peak_kb']:>10.0f}  {note}")
+        return problems
+
+    results, suspects = {}, {}
+    print(f"{'case':<34} {'ops/s':>10} {'best ms':>10} {'p50 ms':>10} {'p99 ms':>10} {'peak KB':>10}  vs baseline")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, n, setup in cases(args.sizes, tmp):
+            key = f"{name}/{n}" if n else name
+            if args.only and args.only not in key:
+                continue
+            fn = setup()
+            results[key] = measure(fn, args.min_time)
+            if show(key, results[key], baseline.get(key)):
+                suspects[key] = fn
+
+        # slow stretches of a shared machine last seconds, so cases that look slower are measured again
+        # after everything else (and a pause), keeping their fastest result
+        for attempt in range(args.retries):
+            if not suspects:
+                break
+            time.sleep(RETRY_PAUSE)
+            print(f"re-measuring {len(suspects)} slower cases ({attempt + 1}/{args.retries})")
+            for key, fn in list(suspects.items()):
+                retry = measure(fn, args.min_time)
+                if retry["best_ms"] < results[key]["best_ms"]:
+                    results[key] = retry
+                if not show(key, results[key], baseline[key]):
+                    del suspects[key]
+    failed = list(suspects)
+
+    if args.save:
+        saved = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                saved = json.load(f)["results"]
+        saved.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump({"python": sys.version.split()[0], "numpy": np.__version__, "results": saved}, f, indent=2,
+                      sort_keys=True)
+            f.write("\n")
+        print(f"saved {len(results)} results to {args.baseline}")
+    elif failed:
+        print(f"{len(failed)} regressions beyond {args.threshold:.0%} (and {args.noise_ms:g} ms) time / "
+              f"{args.memory_threshold:.0%} memory: "
+              f"{', '.join(failed)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,27 @@
-import pdfplumber
-import os
-import re
-import json
-import requests
-from bs4 import BeautifulSoup
-from database import db, MenuItem
-
-LOGOS_FILE = "restaurant_logos.json"
-
-def load_logos():
-    if os.path.exists(LOGOS_FILE):
-        with open(LOGOS_FILE) as f:
-            return json.load(f)
-    return {}
-
+import time
+from datetime import datetime, timezone
+from sqlalchemy import insert, update, delete
+from database import db, MenuItem, Restaurant, clean_name
+from snapshot import invalidate
+import metadata
+import metrics
+from flask import current_app
+from frontier import schedule_build
+import combo_index
+from result_cache import results
+from scraper import fetch, content_hash, menu_url, scrape_many
+from menu_parser import parse_nutritionix_menu
+from logos import registry as logo_registry
+
+# logo urls are kept in restaurant_logos.json as well as on the restaurant row, so they survive a db rebuild
 def save_logo(restaurant_name, logo_url):
-    logos = load_logos()
-    logos[restaurant_name] = logo_url
-    with open(LOGOS_FILE, "w") as f:
-        json.dump(logos, f, indent=2)
+    logo_registry.set(restaurant_name, logo_url)
+
+    restaurant = Restaurant.query.filter_by(name=restaurant_name).first()
+    if restaurant:
+        restaurant.logo = logo_url
+        db.session.commit()
+        metadata.invalidate()
 
 initial_restaurant_slugs = [
     "taco-bell",
@@ -28,222 +31,149 @@ initial_restaurant_slugs = [
     "burger-king",
 ]
 
-disallowed_categories = ["at participating locations", "catering", "trays"]
-
 # get restaurant's full menu from nutritionix.com/{slug}/menu/premium
-# returns (restaurant_name, items_list)
-def scrape_nutritionix_menu(slug):
-    url = f"https://www.nutritionix.com/{slug}/menu/premium"
-    headers = {"User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"}
-    r = requests.get(url, headers=headers, timeout=15)
-    if r.status_code != 200:
-        raise ValueError(f"Nutritionix returned {r.status_code} for '{slug}'")
-
-    soup = BeautifulSoup(r.text, "html.parser")
-
-    # get the restaurant name from the page
-    title = soup.title.string if soup.title else ""
-    title_match = re.match(r"^(.+?)\s+-\s+(Full|Interactive) Nutrition", title)
-    restaurant_name = title_match.group(1).strip() if title_match else slug.replace("-", " ").title()
-
-    # get the column ids for nutrition info
-    col_ids = {}
-    for th in soup.find_all("th", id=re.compile(r"^inmGrid_c\d+$")):
-        text = th.get_text(strip=True).lower()
-        col_id = th["id"].split("_")[1]  # e.g. "c1"
-        if "calorie" in text:
-            col_ids["calories"] = col_id
-        elif "total fat" in text:
-            col_ids["fat"] = col_id
-        elif "total carbohydrate" in text:
-            col_ids["carbs"] = col_id
-        elif "protein" in text:
-            col_ids["protein"] = col_id
-
-    if not col_ids:
-        raise ValueError(f"could not detect nutrition columns for '{slug}'")
-
-    items = []
-    current_category = "Other"
-
-    # go through all <tr> elements in order
-    for row in soup.find_all("tr"):
-        if "subCategory" in (row.get("class") or []):
-            h3 = row.find("h3")
-            if h3:
-                current_category = h3.get_text(strip=True)
-            continue
-
-        name_td = row.find("td", class_="al")
-        if not name_td:
-            continue
-
-        name_link = name_td.find("a", class_="nmItem")
-        if not name_link:
-            continue
-        name = name_link.get("title") or name_link.get_text(strip=True)
-
-        def get_col(col_id):
-            td = row.find("td", headers=f"inmGrid_{col_id}")
-            return td.get_text(strip=True) if td else None
-
-        if any(d in current_category.lower() for d in disallowed_categories):
-            continue
-
-        try:
-            calories = int(get_col(col_ids["calories"]).replace(",", ""))
-            fat      = float(get_col(col_ids["fat"]).replace(",", ""))
-            carbs    = float(get_col(col_ids["carbs"]).replace(",", ""))
-            protein  = float(get_col(col_ids["protein"]).replace(",", ""))
-        except (TypeError, ValueError, AttributeError):
-            continue
-
-        items.append({
-            "name": name,
-            "restaurant": restaurant_name,
-            "category": current_category,
-            "calories": calories,
-            "fat": fat,
-            "carbs": carbs,
-            "protein": protein,
-        })
-
-    if not items:
-        raise ValueError(f"No menu items found for '{slug}' — restaurant may not exist on Nutritionix")
-
-    logo_url = None
-    brand_div = soup.find("div", id="brand")
-    if brand_div:
-        img = brand_div.find("img")
-        if img and img.get("src"):
-            logo_url = img["src"]
-
-    return restaurant_name, items, logo_url
-
-def get_restaurant_name(filepath):
-    with pdfplumber.open(filepath) as pdf:
-        first_page_text = pdf.pages[0].extract_text()
-        if not first_page_text:
-            return "unknown"
-
-        # make one page
-        first_page_text = " ".join(first_page_text.splitlines())
-        first_page_text = re.sub(r'\s+', ' ', first_page_text)
-
-        # get the name using regex
-        match = re.search(
-            r'\d{1,2}/\d{1,2}/\d{2,4},\s*\d{1,2}:\d{2}\s*[AP]M\s+(.*?)\s+-\s+(Full|Interactive) Nutrition (Information|Menu)',
-            first_page_text
-        )
-
-        if match:
-            return match.group(1).strip()
-        else:
-            return "unknown"
-        
-def get_indices(table):
-    transposed = list(map(list, zip(*table)))
-    col_map = {}
-
-    for col_index, col in enumerate(transposed):
-        word = "".join(cell.strip() if cell else "" for cell in col).lower()
-        word = re.sub(r"\s+", "", word)
-        
-        if "seirolac" in word:
-            col_map["calories"] = col_index
-        elif "taflatot" in word:
-            col_map["fat"] = col_index
-        elif "setardyhobraclatot" in word:
-            col_map["carbs"] = col_index
-        elif "nietorp" in word:
-            col_map["protein"] = col_index
-
-    return col_map
-
-def parse_menu_pdf(filepath):
-    menu_items = []
-    restaurant_name = get_restaurant_name(filepath)
-    with pdfplumber.open(filepath) as pdf:
-        for page in pdf.pages:
-            tables = page.extract_tables()
-            if not tables or not tables[0]:  # skip if tables is empty or first table is empty
-                continue
-            
-            # get indexes for calories, protein, carbs, and fat
-            col_map = get_indices(tables[0])
-                    
-            for table in tables:
-                for row in table[1:]:
-                    if not row or len(row) < 5:
-                        continue
-                    
-                    category_candidate = row[0].strip() if row[0] else ""
-
-                    # check if the row is a category header
-                    if not any(row[i] for i in col_map.values()) and category_candidate:
-                        last_category = category_candidate
-                        continue  # skip the category header row itself
-
-                    # make sure row has nutrition info
-                    if not all(row[i] for i in col_map.values()):
-                        print("skipping bad row")
-                        continue
-                    
-                    # don't need disallowed categories
-                    if any(disallowed in last_category.lower() for disallowed in disallowed_categories):
-                        continue
-
-                    name = row[0].strip()
-                    try:
-                        calories = int(row[col_map["calories"]])
-                        fat = float(row[col_map["fat"]])
-                        carbs = float(row[col_map["carbs"]])
-                        protein = float(row[col_map["protein"]])
-                    except (ValueError, IndexError): # skip bad stuff that didnt get caught somehow
-                        continue 
-
-                    restaurant_name = restaurant_name[0].upper() + restaurant_name[1:]
-                    menu_items.append({
-                        "name": name,
-                        "restaurant": restaurant_name,
-                        "category": last_category if 'last_category' in locals() else "unknown",
-                        "calories": calories,
-                        "fat": fat,
-                        "carbs": carbs,
-                        "protein": protein
-                    })
-
-    return menu_items
-
-def cache_restaurant(restaurant_name, items):
+# returns (restaurant_name, items_list, logo_url)
+def scrape_nutritionix_menu(slug, session=None):
+    r = fetch(menu_url(slug), session)
+    with metrics.scrape_seconds.time("parse"):
+        return parse_nutritionix_menu(r.text, slug)
+
+# parse a fetched menu page for scrape_many, keeping the response for record_page
+def parse_menu_page(r, slug):
+    return (*parse_nutritionix_menu(r.text, slug), r)
+
+# the fetched page's ETag, Last-Modified and body hash, so the restaurant's first refresh can send a
+# conditional request and skip the page if it hasn't changed, like every refresh after it (see refresh.py)
+def record_page(restaurant, r):
+    restaurant.scraped_at = datetime.now(timezone.utc)
+    restaurant.etag = r.headers.get("ETag")
+    restaurant.last_modified = r.headers.get("Last-Modified")
+    restaurant.content_hash = content_hash(r.content)
+
+# the restaurant row for a name, created if it's new. slug defaults to the cleaned name
+def get_or_create_restaurant(restaurant_name, slug=None):
+    restaurant = Restaurant.query.filter_by(name=restaurant_name).first()
+    if restaurant is None:
+        slug = base = slug or clean_name(restaurant_name)
+        suffix = 2
+        while Restaurant.query.filter_by(slug=slug).first():
+            slug, suffix = f"{base}-{suffix}", suffix + 1
+        restaurant = Restaurant(name=restaurant_name, slug=slug, logo=logo_registry.get(restaurant_name),
+                                item_count=0)
+        db.session.add(restaurant)
+        db.session.flush()
+    return restaurant
+
+INGEST_BATCH_SIZE = 500  # rows per executemany batch (and ids per DELETE ... IN)
+MACRO_COLUMNS = ["calories", "protein", "fat", "carbs"]
+
+def _batches(rows):
+    for start in range(0, len(rows), INGEST_BATCH_SIZE):
+        yield rows[start:start + INGEST_BATCH_SIZE]
+
+def _macros(item):
+    return tuple(None if item.get(key) is None else float(item[key]) for key in MACRO_COLUMNS)
+
+# write a restaurant's menu in one transaction with batched statements, returns the change counts.
+#
+# by default every item is inserted. with refresh=True the incoming items are diffed against the stored
+# ones by (name, category): new items are inserted, items whose macros changed are updated in place
+# (keeping their ids), stored items missing from the new menu are deleted and the rest are left alone.
+# on any error nothing is written. page is the response the menu was parsed from, if it was scraped;
+# its validators are stored with the items (see record_page)
+def cache_restaurant(restaurant_name, items, slug=None, refresh=False, page=None):
     print(f"caching {restaurant_name}")
-    for item in items:
-        db.session.add(MenuItem(
-            restaurant=restaurant_name,
-            name=item["name"],
-            calories=item["calories"],
-            fat=item["fat"],
-            carbs=item["carbs"],
-            protein=item["protein"],
-            category=item["category"]
-        ))
-    db.session.commit()
-    print("cached new restaurant")
-
-
-
-def cache_first_restaurants(app):
+    start = time.perf_counter()
+    counts = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+    try:
+        restaurant = get_or_create_restaurant(restaurant_name, slug)
+        if page is not None:
+            record_page(restaurant, page)
+
+        # stored rows by (name, category); duplicates are matched up in order
+        stored = {}
+        if refresh:
+            rows = (
+                db.session.query(
+                    MenuItem.id, MenuItem.name, MenuItem.category,
+                    MenuItem.calories, MenuItem.protein, MenuItem.fat, MenuItem.carbs,
+                )
+                .filter(MenuItem.restaurant_id == restaurant.id)
+                .order_by(MenuItem.id)
+                .all()
+            )
+            for row in rows:
+                stored.setdefault((row.name, row.category), []).append(row)
+
+        inserts, updates = [], []
+        for item in items:
+            matches = stored.get((item["name"], item["category"]))
+            if not matches:
+                inserts.append({
+                    "restaurant_id": restaurant.id,
+                    "name": item["name"],
+                    "category": item["category"],
+                    **dict(zip(MACRO_COLUMNS, _macros(item))),
+                })
+                continue
+            row = matches.pop(0)
+            macros = _macros(item)
+            if macros != tuple(getattr(row, key) for key in MACRO_COLUMNS):
+                updates.append({"id": row.id, **dict(zip(MACRO_COLUMNS, macros))})
+            else:
+                counts["unchanged"] += 1
+        deletes = [row.id for matches in stored.values() for row in matches]
+
+        for batch in _batches(inserts):
+            db.session.execute(insert(MenuItem), batch)
+        for batch in _batches(updates):
+            db.session.execute(update(MenuItem), batch)
+        for batch in _batches(deletes):
+            db.session.execute(delete(MenuItem).where(MenuItem.id.in_(batch)))
+
+        counts.update(inserted=len(inserts), updated=len(updates), deleted=len(deletes))
+        restaurant.item_count += len(inserts) - len(deletes)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    invalidate(restaurant_name)
+    results.invalidate(restaurant_name)
+    metadata.invalidate()
+    # precompute the pareto frontier for "optimize" queries in the background
+    schedule_build(current_app._get_current_object(), restaurant_name)
+    # and rebuild the restaurant's combo index if it has one
+    combo_index.schedule_build(current_app._get_current_object(), restaurant_name)
+    metrics.scrape_seconds.observe(time.perf_counter() - start, "store")
+    print(f"cached {restaurant_name}: {counts['inserted']} inserted, {counts['updated']} updated, "
+          f"{counts['deleted']} deleted, {counts['unchanged']} unchanged")
+    return counts
+
+
+# scrape and cache many restaurants, writing each menu as soon as it's parsed while the rest are still
+# downloading. returns {slug: {"restaurant": name, "items": count} or {"error": message}}
+def cache_restaurants(app, slugs, refresh=False, **scrape_options):
+    report = {}
     with app.app_context():
-        for slug in initial_restaurant_slugs:
-            print(f"scraping {slug}")
+        for slug, result, error in scrape_many(slugs, parse_menu_page, **scrape_options):
             try:
-                restaurant_name, items, logo_url = scrape_nutritionix_menu(slug)
-                cache_restaurant(restaurant_name, items)
+                if error:
+                    raise error
+                restaurant_name, items, logo_url, page = result
+                cache_restaurant(restaurant_name, items, slug, refresh=refresh, page=page)
                 if logo_url:
                     save_logo(restaurant_name, logo_url)
+                report[slug] = {"restaurant": restaurant_name, "items": len(items)}
             except Exception as e:
                 print(f"failed to scrape {slug}: {e}")
-        print("cached all restaurants")
+                report[slug] = {"error": str(e)}
+    failed = sum("error" in r for r in report.values())
+    print(f"cached {len(report) - failed} of {len(report)} restaurants")
+    return report
+
+def cache_first_restaurants(app):
+    return cache_restaurants(app, initial_restaurant_slugs)
 
 if __name__ == "__main__":
     from flask import Flask
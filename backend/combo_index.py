@@ -0,0 +1,326 @@
+import os
+import json
+import hashlib
+import math
+import time
+import random
+import tempfile
+import threading
+import numpy as np
+from frontier import fingerprint
+
+# every combo of 2..COMBO_INDEX_MAX_ITEMS items is enumerated, as long as the sizes so far stay under
+# COMBO_INDEX_MAX_COMBOS (about 40 bytes each on disk); bigger sizes are left to the search
+COMBO_INDEX_MAX_ITEMS = int(os.environ.get("COMBO_INDEX_MAX_ITEMS") or 3)
+COMBO_INDEX_MAX_COMBOS = int(os.environ.get("COMBO_INDEX_MAX_COMBOS") or 4_000_000)
+COMBO_INDEX_DIR = os.environ.get("COMBO_INDEX_DIR", "combo_index")
+BAND_ROWS = 4096  # combos per calorie band of the grid
+MAGIC = b"CMBIDX1\n"
+HEADER_BYTES = 4096  # magic, header length and json header, padded
+ALIGN = 64
+
+# every combo of 2..max_items items of a menu in one file, memory-mapped read-only so the workers of a
+# server share a single copy through the page cache.
+#
+# the combos form a grid: sorted by total calories, cut into bands of BAND_ROWS, and sorted by protein
+# within each band. a query visits the bands that overlap its calorie range and binary searches each
+# for its protein range, so it only reads the rows in that slice of the grid, and skips the calorie
+# check in bands that lie entirely inside the range. fat, carbs and the combo size are checked on what's
+# left, then item filters (categories, exclusions, items over a max) and category limits.
+#
+# file: MAGIC, a little-endian uint32 header length, a json header padded to HEADER_BYTES, then the
+# arrays at 64-byte aligned offsets listed in the header
+#   item_ids     int64   [n]             menu item ids, the positions are the snapshot rows
+#   totals       float64 [4, count]      calories, protein, fat, carbs of every combo (missing macros as 0)
+#   members      uint16  [count, size]   item positions, padded with n for combos below the max size
+#   sizes        uint8   [count]
+#   band_starts  int64   [bands + 1]     first row of each band, then count
+#   band_cal     float64 [2, bands]      min and max calories in each band
+class ComboIndex:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.stamp = _stamp(os.fstat(f.fileno()))
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a combo index")
+            length = int.from_bytes(f.read(4), "little")
+            header = json.loads(f.read(length))
+        self.restaurant = header["restaurant"]
+        self.fingerprint = header["fingerprint"]
+        self.max_items = header["max_items"]
+        self.count = header["count"]
+        for name, (offset, dtype, shape) in header["arrays"].items():
+            setattr(self, name, np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=tuple(shape)))
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        return os.path.getsize(self.path)
+
+    # rows of the combos with at most max_items items whose totals fall in the macro box, made only of
+    # `allowed` items (a mask over the snapshot rows) and within the category limits
+    def query(self, macros, max_items, allowed, category_codes=None, category_names=None, category_limits=None):
+        (cal_min, cal_max), (prot_min, prot_max), *rest = [
+            (_bound(macros, min_key), _bound(macros, max_key)) for min_key, max_key in BOX_KEYS
+        ]
+        low = -np.inf if cal_min is None else cal_min
+        high = np.inf if cal_max is None else cal_max
+        bands = np.flatnonzero((self.band_cal[1] >= low) & (self.band_cal[0] <= high))
+        box = [(col, min_val, max_val) for col, (min_val, max_val) in enumerate(rest, 2)]
+
+        found = []
+        for band in bands.tolist():
+            start, stop = self.band_starts[band], self.band_starts[band + 1]
+            protein = self.totals[1, start:stop]
+            first = np.searchsorted(protein, prot_min, "left") if prot_min is not None else 0
+            last = np.searchsorted(protein, prot_max, "right") if prot_max is not None else stop - start
+            if first >= last:
+                continue
+            start, stop = start + first, start + last
+
+            keep = None
+            checks = box
+            if not low <= self.band_cal[0, band] <= self.band_cal[1, band] <= high:
+                checks = box + [(0, cal_min, cal_max)]
+            for col, min_val, max_val in checks:
+                for bound, passes in ((min_val, np.greater_equal), (max_val, np.less_equal)):
+                    if bound is not None:
+                        ok = passes(self.totals[col, start:stop], bound)
+                        keep = ok if keep is None else keep & ok
+            if max_items < self.max_items:
+                ok = self.sizes[start:stop] <= max_items
+                keep = ok if keep is None else keep & ok
+            found.append(np.arange(start, stop) if keep is None else np.flatnonzero(keep) + start)
+        rows = np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+        # padding points one past the last item, which passes every item filter and is in no category
+        if len(rows) and not allowed.all():
+            rows = rows[np.append(allowed, True)[self.members[rows]].all(axis=1)]
+        for cat, limits in (category_limits or {}).items():
+            min_cat, max_cat = limits.get("min"), limits.get("max")
+            if (min_cat is None and max_cat is None) or not len(rows):
+                continue
+            code = category_names.index(cat) if cat in category_names else -1
+            counts = (np.append(category_codes, -2)[self.members[rows]] == code).sum(axis=1)
+            if min_cat is not None:
+                rows, counts = rows[counts >= min_cat], counts[counts >= min_cat]
+            if max_cat is not None:
+                rows = rows[counts <= max_cat]
+        return rows
+
+    # item positions of the given rows, one list per combo
+    def combo_rows(self, rows):
+        n = len(self.item_ids)
+        return [[i for i in members if i != n] for members in self.members[rows].tolist()]
+
+BOX_KEYS = [("calorieMin", "calorieMax"), ("proteinMin", "proteinMax"), ("fatMin", "fatMax"), ("carbMin", "carbMax")]
+
+def _bound(macros, key):
+    try:
+        return float(macros.get(key))
+    except (TypeError, ValueError):
+        return None
+
+# the combos an index query matched, as a pool for the result cache: draw() samples from them uniformly
+class IndexMatches:
+    def __init__(self, index, rows, items):
+        self.index = index
+        self.rows = rows
+        self.items = items
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def nbytes(self):
+        return self.rows.nbytes
+
+    def draw(self, num, rng=random):
+        picked = self.rows[sorted(rng.sample(range(len(self.rows)), min(num, len(self.rows))))]
+        return [[self.items[i] for i in combo] for combo in self.index.combo_rows(picked)]
+
+# all k-item subsets of range(n) in lexicographic order, as an [C(n, k), k] array, grown one column
+# at a time by appending every larger item to each row
+def _combinations(n, k):
+    rows = np.arange(n, dtype=np.int64)[:, None]
+    for _ in range(k - 1):
+        last = rows[:, -1]
+        counts = n - 1 - last
+        starts = np.cumsum(counts) - counts
+        following = np.repeat(last + 1, counts) + np.arange(counts.sum()) - np.repeat(starts, counts)
+        rows = np.column_stack([np.repeat(rows, counts, axis=0), following])
+    return rows
+
+# identifies one version of an index file; a rebuild renames a new file over the path, so this changes
+def _stamp(stat):
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+def _path(restaurant):
+    safe = "".join(c if c.isalnum() else "-" for c in restaurant.lower())
+    return os.path.join(COMBO_INDEX_DIR, f"{safe}-{hashlib.sha256(restaurant.encode()).hexdigest()[:8]}.idx")
+
+# enumerate and write the index for a snapshot's menu, returns the number of combos or None when the
+# menu is too big for pairs under COMBO_INDEX_MAX_COMBOS
+def build_index(snapshot, path, max_items=COMBO_INDEX_MAX_ITEMS, max_combos=COMBO_INDEX_MAX_COMBOS):
+    n = len(snapshot)
+    if n >= np.iinfo(np.uint16).max:
+        return None
+    size, count = 1, 0
+    while size < max_items and count + math.comb(n, size + 1) <= max_combos:
+        size += 1
+        count += math.comb(n, size)
+    if size < 2 or not count:
+        return None
+
+    macros = np.nan_to_num(np.column_stack([snapshot.calories, snapshot.protein, snapshot.fat, snapshot.carbs]))
+    members = np.full((count, size), n, dtype=np.uint16)
+    totals = np.empty((count, 4))
+    sizes = np.empty(count, dtype=np.uint8)
+    row = 0
+    for k in range(2, size + 1):
+        combos = _combinations(n, k)
+        members[row:row + len(combos), :k] = combos
+        totals[row:row + len(combos)] = macros[combos].sum(axis=1)
+        sizes[row:row + len(combos)] = k
+        row += len(combos)
+        del combos
+
+    # calorie bands of BAND_ROWS combos, each sorted by protein
+    order = np.argsort(totals[:, 0], kind="stable")
+    band = np.arange(count) // BAND_ROWS
+    order = order[np.lexsort((totals[order, 1], band))]
+    totals = np.ascontiguousarray(totals[order].T)
+    members, sizes = members[order], sizes[order]
+    band_starts = np.append(np.arange(0, count, BAND_ROWS), count)
+    band_cal = np.vstack([np.minimum.reduceat(totals[0], band_starts[:-1]),
+                          np.maximum.reduceat(totals[0], band_starts[:-1])])
+
+    arrays = {"item_ids": snapshot.ids.astype(np.int64), "totals": totals, "members": members, "sizes": sizes,
+              "band_starts": band_starts.astype(np.int64), "band_cal": band_cal}
+    header = {"restaurant": snapshot.restaurant, "fingerprint": fingerprint(snapshot), "max_items": size,
+              "count": count, "arrays": {}}
+    # the offsets are part of the header, so the header gets a fixed HEADER_BYTES and the arrays follow
+    offset = HEADER_BYTES
+    for name, array in arrays.items():
+        header["arrays"][name] = [offset, array.dtype.str, list(array.shape)]
+        offset += -(-array.nbytes // ALIGN) * ALIGN
+    encoded = json.dumps(header).encode().ljust(HEADER_BYTES - len(MAGIC) - 4)
+
+    # written next to the target and renamed over it, processes that mapped the old file keep reading it
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC + len(encoded).to_bytes(4, "little") + encoded)
+            for name, array in arrays.items():
+                f.seek(header["arrays"][name][0])
+                f.write(np.ascontiguousarray(array).tobytes())
+            f.truncate(offset)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return count
+
+_indexes = {}
+_building = set()
+_lock = threading.Lock()
+
+# map every index in COMBO_INDEX_DIR, called once at startup. indexes rebuilt later (by this or another
+# worker) are picked up by get_index
+def load_indexes():
+    if not os.path.isdir(COMBO_INDEX_DIR):
+        return
+    for name in sorted(os.listdir(COMBO_INDEX_DIR)):
+        if name.endswith(".idx"):
+            try:
+                index = ComboIndex(os.path.join(COMBO_INDEX_DIR, name))
+            except Exception as e:
+                print(f"couldn't map combo index {name}: {e}")
+                continue
+            with _lock:
+                _indexes[index.restaurant] = index
+    print(f"mapped {len(_indexes)} combo indexes")
+
+# the index for a snapshot's menu, or None if the restaurant has none or it's out of date. the index is
+# rebuilt by whichever worker wrote the menu, so on a mismatch the file is mapped again if it changed
+# since this worker mapped it
+def get_index(snapshot):
+    key = snapshot.restaurant
+    index = _indexes.get(key)
+    if index is not None and index.fingerprint == fingerprint(snapshot):
+        return index
+    try:
+        stamp = _stamp(os.stat(_path(key)))
+    except FileNotFoundError:
+        return None
+    if index is not None and index.stamp == stamp:
+        return None
+    try:
+        index = ComboIndex(_path(key))
+    except Exception as e:
+        print(f"couldn't map combo index for {key}: {e}")
+        return None
+    # kept even if it's stale too, so the file is only read again once it's replaced
+    with _lock:
+        _indexes[key] = index
+    return index if index.fingerprint == fingerprint(snapshot) else None
+
+# only restaurants that were given an index (by the offline build) keep one up to date
+def has_index(restaurant):
+    return restaurant in _indexes or os.path.exists(_path(restaurant))
+
+def refresh_index(snapshot, max_items=COMBO_INDEX_MAX_ITEMS):
+    if not len(snapshot) or get_index(snapshot) is not None:
+        return get_index(snapshot)
+    start = time.perf_counter()
+    path = _path(snapshot.restaurant)
+    count = build_index(snapshot, path, max_items)
+    if count is None:
+        print(f"{snapshot.restaurant} has too many items for a combo index")
+        return None
+    index = ComboIndex(path)
+    with _lock:
+        _indexes[snapshot.restaurant] = index
+    print(f"built combo index for {snapshot.restaurant}: {count} combos up to {index.max_items} items, "
+          f"{index.nbytes / 2 ** 20:.1f} MB in {time.perf_counter() - start:.2f}s")
+    return index
+
+# rebuild a restaurant's index on a background thread after its menu changes, if it has one
+def schedule_build(app, restaurant):
+    with _lock:
+        if restaurant in _building or not has_index(restaurant):
+            return
+        _building.add(restaurant)
+
+    def build():
+        from snapshot import get_snapshot
+        try:
+            with app.app_context():
+                snapshot = get_snapshot(restaurant)
+                while refresh_index(snapshot) is not None:
+                    latest = get_snapshot(restaurant)
+                    if fingerprint(latest) == fingerprint(snapshot):
+                        break
+                    snapshot = latest
+        except Exception as e:
+            print(f"failed to build combo index for {restaurant}: {e}")
+        finally:
+            with _lock:
+                _building.discard(restaurant)
+
+    threading.Thread(target=build, name="combo-index", daemon=True).start()
+
+# python combo_index.py restaurant [...]: build (or rebuild) the index for the given restaurants
+if __name__ == "__main__":
+    import sys
+    from app import app
+    from snapshot import get_snapshot
+    if len(sys.argv) < 2:
+        sys.exit("usage: python combo_index.py restaurant [restaurant ...]")
+    with app.app_context():
+        for name in sys.argv[1:]:
+            refresh_index(get_snapshot(name))
@@ -0,0 +1,478 @@
+import heapq
+import time
+import numpy as np
+
+#  how much each macro is outside its target range
+def macro_distance(totals, macros):
+    d = 0
+    checks = [
+        (totals.get("calories"), "calorieMin", "calorieMax"),
+        (totals.get("protein"),  "proteinMin", "proteinMax"),
+        (totals.get("fat"),      "fatMin",     "fatMax"),
+        (totals.get("carbs"),    "carbMin",    "carbMax"),
+    ]
+    for val, min_key, max_key in checks:
+        if val is None:
+            continue
+        min_val = safe_float(macros.get(min_key))
+        max_val = safe_float(macros.get(max_key))
+        if min_val is not None and val < min_val:
+            d += min_val - val
+        elif max_val is not None and val > max_val:
+            d += val - max_val
+    return d
+
+def item_distance(item, macros):
+    return macro_distance({
+        "calories": item.calories or 0,
+        "protein":  item.protein  or 0,
+        "fat":      item.fat      or 0,
+        "carbs":    item.carbs    or 0,
+    }, macros)
+
+def safe_float(val):
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        return None
+
+def violates_max(item, key, max_key, macros):
+    max_val = safe_float(macros.get(max_key))
+    return max_val is not None and getattr(item, key) > max_val
+
+# returns whether an item is valid for a combo
+def is_valid_item(item, macros):
+    return not (
+        violates_max(item, "calories", "calorieMax", macros) or
+        violates_max(item, "protein", "proteinMax", macros) or
+        violates_max(item, "fat", "fatMax", macros) or
+        violates_max(item, "carbs", "carbMax", macros)
+    )
+
+# node/time budget for one search plus counters for what it did. `expand` is called once per node
+# and returns False once the budget is spent, which also sets `truncated`. `cancelled` is an optional
+# callable polled along with the clock, for stopping a search from outside. a time limit of None is no
+# limit; zero or less is a budget that's already spent.
+class SearchStats:
+    def __init__(self, time_limit=None, node_limit=None, cancelled=None):
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.cancelled = cancelled
+        self.start = time.perf_counter()
+        self.deadline = self.start + time_limit if time_limit is not None else None
+        self.nodes = 0
+        self.prunes = {}
+        self.truncated = time_limit is not None and time_limit <= 0
+
+    def expand(self):
+        self.nodes += 1
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            self.truncated = True
+        # checking the clock every node is measurable, every 64 isn't
+        elif not self.nodes & 63 and (
+            (self.deadline is not None and time.perf_counter() > self.deadline) or
+            (self.cancelled is not None and self.cancelled())
+        ):
+            self.truncated = True
+        return not self.truncated
+
+    def prune(self, reason):
+        self.prunes[reason] = self.prunes.get(reason, 0) + 1
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    # fold in the counters from a search run elsewhere (a worker process)
+    def merge(self, other):
+        self.nodes += other["nodes"]
+        for reason, count in other["prunes"].items():
+            self.prunes[reason] = self.prunes.get(reason, 0) + count
+        self.truncated = self.truncated or other["truncated"]
+
+    @property
+    def remaining(self):
+        return None if self.deadline is None else max(self.deadline - time.perf_counter(), 0)
+
+    def as_dict(self):
+        return {
+            "nodes": self.nodes,
+            "prunes": dict(self.prunes),
+            "elapsed_ms": round(self.elapsed * 1000, 2),
+            "truncated": self.truncated,
+        }
+
+BOUND_BUCKETS = 64  # calorie budget resolution for the suffix bounds
+
+# best[i][r][b] = an upper bound on the total of `key` reachable with at most r items from items[i:]
+# whose calories fit in b buckets of width `bucket` (a small knapsack, filled backwards one item at a
+# time). item calories are rounded down to buckets so the bound never undershoots.
+# without a calorie budget there is a single bucket and it's just the sum of the r largest values.
+def suffix_bounds(items, key, max_items, bucket=None):
+    n = len(items)
+    n_buckets = BOUND_BUCKETS + 1 if bucket else 1
+
+    table = np.zeros((max_items + 1, n_buckets))
+    best = [None] * (n + 1)
+    best[n] = table.tolist()
+    for i in range(n - 1, -1, -1):
+        val = max(getattr(items[i], key) or 0, 0)
+        cost = int(max(items[i].calories or 0, 0) // bucket) if bucket else 0
+        if val and cost < n_buckets:
+            np.maximum(table[1:, cost:], table[:-1, :n_buckets - cost] + val, out=table[1:, cost:])
+        best[i] = table.tolist()
+    return best
+
+# top[i][r] = the sum of the r largest values in values[i:] (fewer if the suffix is shorter)
+def suffix_top_sums(values, max_items):
+    n = len(values)
+    top = [[0] * (max_items + 1) for _ in range(n + 1)]
+    largest = []  # largest values seen so far, descending, at most max_items long
+    for i in range(n - 1, -1, -1):
+        largest.append(values[i])
+        largest.sort(reverse=True)
+        del largest[max_items:]
+        row = top[i]
+        for r in range(1, max_items + 1):
+            row[r] = row[r - 1] + (largest[r - 1] if r <= len(largest) else 0)
+    return top
+
+# left[cat][i] = how many items in items[i:] belong to cat
+def suffix_category_counts(items, cats):
+    n = len(items)
+    left = {cat: [0] * (n + 1) for cat in cats}
+    for i in range(n - 1, -1, -1):
+        item_cat = items[i].category or ""
+        for cat, counts in left.items():
+            counts[i] = counts[i + 1] + (item_cat == cat)
+    return left
+
+# f(i, j) = all valid combos from items[i:] given accumulated macro totals j = (cal, prot, fat, carb).
+# each call either skips items[i] (implicit, via loop advancing to i+1) or includes it and recurses.
+# combo and cat_counts are mutated in-place and restored after each branch (append/pop).
+# valid_combos is a shared collector; collect_limit provides early termination.
+#
+# branch and bound: before including items[i] we check that the best totals still reachable from
+# items[i:] in the remaining slots can meet every macro min and category min. the suffix bounds only
+# shrink as i grows, so the first failure ends the loop. only branches without a single valid combo
+# are cut, so the combos (and their order) are the same as a plain dfs.
+#
+# stats (a SearchStats) bounds the search by nodes and/or time; when it runs out the combos found so
+# far are returned and stats.truncated is set. it also counts nodes and prunes by reason.
+#
+# roots restricts the first item of every combo to those indices (increasing), so the search can be split
+# into disjoint subtrees; collecting the subtrees in order gives the same combos as one full search.
+#
+# on_found(combo), if given, is called with each combo the moment it's found, for streaming them out.
+#
+# repeats[k] marks items[k] as another copy of items[k - 1] (see equivalence.ItemClasses): it's only
+# taken straight after that copy, so combos that differ only in which copies they use are found once.
+def find_combos_dp(items, macros, max_items, category_limits=None, collect_limit=500, stats=None, roots=None,
+                   on_found=None, repeats=None):
+    cal_max  = safe_float(macros.get("calorieMax"))
+    prot_max = safe_float(macros.get("proteinMax"))
+    fat_max  = safe_float(macros.get("fatMax"))
+    carb_max = safe_float(macros.get("carbMax"))
+    cal_min  = safe_float(macros.get("calorieMin"))
+    prot_min = safe_float(macros.get("proteinMin"))
+    fat_min  = safe_float(macros.get("fatMin"))
+    carb_min = safe_float(macros.get("carbMin"))
+    cat_lim  = category_limits or {}
+    stats    = stats or SearchStats()
+
+    valid_combos = []
+    n = len(items)
+
+    # calorie budget per bucket for the suffix bounds, None if there is no calorie max
+    bucket = cal_max / BOUND_BUCKETS if cal_max and cal_max > 0 else None
+    slots_max = max(max_items, 0)
+    best_cal  = suffix_bounds(items, "calories", slots_max, bucket) if cal_min  is not None else None
+    best_prot = suffix_bounds(items, "protein",  slots_max, bucket) if prot_min is not None else None
+    best_fat  = suffix_bounds(items, "fat",      slots_max, bucket) if fat_min  is not None else None
+    best_carb = suffix_bounds(items, "carbs",    slots_max, bucket) if carb_min is not None else None
+
+    cat_mins = {cat: limits["min"] for cat, limits in cat_lim.items() if limits.get("min")}
+    cat_left = suffix_category_counts(items, cat_mins)
+
+    def meets_min(cal, prot, fat, carb):
+        if cal_min  is not None and cal  < cal_min:  return False
+        if prot_min is not None and prot < prot_min: return False
+        if fat_min  is not None and fat  < fat_min:  return False
+        if carb_min is not None and carb < carb_min: return False
+        return True
+
+    def meets_category_min(cat_counts):
+        for cat, limits in cat_lim.items():
+            min_cat = limits.get("min")
+            if min_cat is not None and cat_counts.get(cat, 0) < min_cat:
+                return False
+        return True
+
+    # why no combo extending the current one with items[i:] (at most `slots` more) can meet every min,
+    # or None if one still might
+    def unreachable(i, slots, cal, prot, fat, carb, cat_counts):
+        b = min(int((cal_max - cal) / bucket + 1e-9), BOUND_BUCKETS) if bucket else 0
+        if best_cal  is not None and cal  + best_cal[i][slots][b]  < cal_min:  return "calorie_min"
+        if best_prot is not None and prot + best_prot[i][slots][b] < prot_min: return "protein_min"
+        if best_fat  is not None and fat  + best_fat[i][slots][b]  < fat_min:  return "fat_min"
+        if best_carb is not None and carb + best_carb[i][slots][b] < carb_min: return "carb_min"
+        for cat, min_cat in cat_mins.items():
+            if cat_counts.get(cat, 0) + cat_left[cat][i] < min_cat:
+                return "category_min"
+        return None
+
+    # slots still needed just to satisfy the category mins
+    def category_slots_needed(cat_counts):
+        return sum(max(min_cat - cat_counts.get(cat, 0), 0) for cat, min_cat in cat_mins.items())
+
+    # f(i, j): collect valid combos from items[i:] with accumulated totals j
+    def f(i, count, cal, prot, fat, carb, combo, cat_counts):
+        if len(valid_combos) >= collect_limit or not stats.expand():
+            return
+
+        if count >= 2 and meets_min(cal, prot, fat, carb) and meets_category_min(cat_counts):
+            valid_combos.append(list(combo))
+            if on_found is not None:
+                on_found(valid_combos[-1])
+            if len(valid_combos) >= collect_limit:
+                return
+
+        if count >= max_items:
+            return
+
+        slots = max_items - count
+        needed = category_slots_needed(cat_counts)
+        if needed > slots:
+            stats.prune("category_slots")
+            return
+
+        start = i
+        for i in roots if count == 0 and roots is not None else range(i, n):
+            if len(valid_combos) >= collect_limit or stats.truncated:
+                return
+
+            # nothing from here on can reach the mins
+            reason = unreachable(i, slots, cal, prot, fat, carb, cat_counts)
+            if reason:
+                stats.prune(reason)
+                break
+
+            # a later copy of an item, but the copy before it wasn't the last item taken
+            if repeats is not None and repeats[i] and (i != start or count == 0):
+                stats.prune("repeat")
+                continue
+
+            item = items[i]
+            cat = item.category or ""
+
+            # every remaining slot is spoken for by a category min this item doesn't help
+            if needed == slots and cat_counts.get(cat, 0) >= cat_mins.get(cat, 0):
+                stats.prune("category_slots")
+                continue
+
+            # prune if this category already hit its max
+            if cat_lim.get(cat, {}).get("max") is not None:
+                if cat_counts.get(cat, 0) >= cat_lim[cat]["max"]:
+                    stats.prune("category_max")
+                    continue
+
+            new_cal  = cal  + (item.calories or 0)
+            new_prot = prot + (item.protein  or 0)
+            new_fat  = fat  + (item.fat      or 0)
+            new_carb = carb + (item.carbs    or 0)
+
+            if cal_max is not None and new_cal > cal_max:
+                stats.prune("calorie_max")
+                break
+            over = (
+                "protein_max" if prot_max is not None and new_prot > prot_max else
+                "fat_max"     if fat_max  is not None and new_fat  > fat_max  else
+                "carb_max"    if carb_max is not None and new_carb > carb_max else
+                None
+            )
+            if over:
+                stats.prune(over)
+                continue
+
+            cat_counts[cat] = cat_counts.get(cat, 0) + 1
+            combo.append(item)
+            f(i + 1, count + 1, new_cal, new_prot, new_fat, new_carb, combo, cat_counts)
+            combo.pop()
+            cat_counts[cat] -= 1
+            if cat_counts[cat] == 0:
+                del cat_counts[cat]
+
+    f(0, 0, 0, 0, 0, 0, [], {})
+    return valid_combos
+
+# lower bound on macro_distance for one macro whose total ends up somewhere in [low, high]
+def interval_distance(low, high, min_val, max_val):
+    best = None
+    # below the min the distance shrinks towards it
+    if min_val is not None and low < min_val:
+        best = max(min_val - high, 0)
+    # from the min up (or anywhere without one) only the max counts, smallest at the lowest value
+    start = low if min_val is None else max(low, min_val)
+    if start <= high:
+        d = max(start - max_val, 0) if max_val is not None else 0
+        best = d if best is None else min(best, d)
+    return best
+
+# d(x) >= slope * x + offset for one macro's distance d, a straight line under it
+# (slopes below 0 need a min, above 0 need a max no lower than the min: past a min above the max, d
+# drops back to zero just under the min, so only lines sloping down stay under it)
+def minorant_offset(slope, min_val, max_val):
+    if slope < 0:
+        return -slope * min_val
+    if slope > 0:
+        return -slope * max_val
+    return 0
+
+# picks per-macro slopes so the weighted bound below is as strong as possible for the whole menu.
+# any slopes give a valid bound, so a coarse grid over every combination (scored in one matrix product)
+# followed by a finer grid around the winner is plenty.
+def lagrangian_slopes(values, targets, max_items, steps=(0.25, 0.0625)):
+    table = np.array(values, dtype=np.float64).reshape(-1, 4)
+    low = np.array([-1.0 if min_val is not None else 0.0 for min_val, _ in targets])
+    high = np.array([1.0 if max_val is not None and (min_val is None or min_val <= max_val) else 0.0
+                     for min_val, max_val in targets])
+    mins = np.array([min_val or 0.0 for min_val, _ in targets])
+    maxs = np.array([max_val or 0.0 for _, max_val in targets])
+
+    def root_bounds(candidates):
+        offsets = (np.where(candidates < 0, -candidates * mins, 0) + np.where(candidates > 0, -candidates * maxs, 0)).sum(axis=1)
+        weights = table @ candidates.T
+        k = min(max_items, len(table))
+        if k < len(table):
+            weights = np.partition(weights, k - 1, axis=0)[:k]
+        return offsets + np.minimum(weights, 0).sum(axis=0)
+
+    center, span = np.zeros(4), 1.0
+    for step in steps:
+        axes = [np.arange(max(lo, c - span), min(hi, c + span) + 1e-9, step) for lo, hi, c in zip(low, high, center)]
+        candidates = np.array(np.meshgrid(*axes, indexing="ij")).reshape(4, -1).T
+        center = candidates[np.argmax(root_bounds(candidates))]
+        span = step
+    return center
+
+# when no exact combos exist, return the num combos closest to the macro targets (by macro_distance),
+# still respecting max_items and category limits.
+#
+# best-first branch and bound: each node is a partial combo plus the index of the next item to decide
+# on, and it branches into "include items[i]" and "skip items[i]". a node's priority is a lower bound
+# on the distance of anything in its subtree: each macro ends up between its current total and that
+# plus the largest total the remaining slots could add. that ignores the trade-offs between macros
+# (more protein means more calories), so there's a second bound from a weighted sum of the macros:
+# each macro's distance is at least slope * total + offset, which makes the whole distance linear in
+# the items added, and the best the remaining slots can do is the sum of their most negative weights.
+# once the closest unexplored node can't beat the num-th best combo found, those num are provably
+# the closest. with a stats budget that runs out, the best combos found so far are returned instead.
+# repeats works like in find_combos_dp.
+def find_closest_combos(items, macros, max_items, category_limits=None, num=10, stats=None, repeats=None):
+    cat_lim = category_limits or {}
+    stats = stats or SearchStats()
+    n = len(items)
+    if num <= 0 or max_items < 2:
+        return []
+
+    keys = ("calories", "protein", "fat", "carbs")
+    targets = [
+        (safe_float(macros.get(min_key)), safe_float(macros.get(max_key)))
+        for min_key, max_key in (("calorieMin", "calorieMax"), ("proteinMin", "proteinMax"),
+                                 ("fatMin", "fatMax"), ("carbMin", "carbMax"))
+    ]
+    values = [tuple(getattr(item, key) or 0 for key in keys) for item in items]
+    slopes = lagrangian_slopes(values, targets, max_items) if n else np.zeros(4)
+    offset = sum(minorant_offset(s, *t) for s, t in zip(slopes, targets))
+    weights = [float(w) for w in np.array(values, dtype=np.float64).reshape(-1, 4) @ slopes]
+
+    # search the items that help the weighted bound most first, so close combos turn up early and
+    # the suffix bounds tighten quickly. combos are mapped back to the caller's order at the end.
+    # (the sort is stable and copies have the same weight, so they stay next to each other)
+    order = sorted(range(n), key=lambda j: weights[j])
+    original, items = items, [items[j] for j in order]
+    repeats = [repeats[j] for j in order] if repeats is not None else None
+    values = [values[j] for j in order]
+    weights = [weights[j] for j in order]
+
+    best = [suffix_top_sums([max(v[k], 0) for v in values], max_items) for k in range(4)]
+    best_weight = suffix_top_sums([max(-w, 0) for w in weights], max_items)
+
+    cat_mins = {cat: limits["min"] for cat, limits in cat_lim.items() if limits.get("min")}
+    cat_left = suffix_category_counts(items, cat_mins)
+
+    active = [k for k, (min_val, max_val) in enumerate(targets) if min_val is not None or max_val is not None]
+    slopes = [float(s) for s in slopes]
+
+    def lower_bound(i, count, totals, cat_counts):
+        slots = max_items - count
+        if cat_mins:
+            if sum(max(m - cat_counts.get(cat, 0), 0) for cat, m in cat_mins.items()) > slots:
+                return None
+            for cat, m in cat_mins.items():
+                if cat_counts.get(cat, 0) + cat_left[cat][i] < m:
+                    return None
+        independent = 0
+        weighted = offset - best_weight[i][slots]
+        for k in active:
+            total = totals[k]
+            independent += interval_distance(total, total + best[k][i][slots], *targets[k])
+            weighted += slopes[k] * total
+        return max(independent, weighted)
+
+    def distance(totals):
+        return sum(interval_distance(totals[k], totals[k], *targets[k]) for k in active)
+
+    def meets_category_min(cat_counts):
+        return all(cat_counts.get(cat, 0) >= m for cat, m in cat_mins.items())
+
+    found = []  # max-heap of (-distance, -seq, combo) holding the num closest so far
+    seq = 0
+    root = (0, 0, (0, 0, 0, 0), {}, ())
+    frontier = [(lower_bound(0, 0, root[2], {}) or 0, 0, seq, root)]
+    while frontier:
+        bound, _, _, (i, count, totals, cat_counts, combo) = heapq.heappop(frontier)
+        if len(found) >= num and bound >= -found[0][0]:
+            break
+        if not stats.expand():
+            break
+        if i >= n or count >= max_items:
+            continue
+
+        children = [(i + 1, count, totals, cat_counts, combo)]
+
+        item = items[i]
+        cat = item.category or ""
+        max_cat = cat_lim.get(cat, {}).get("max")
+        if max_cat is not None and cat_counts.get(cat, 0) >= max_cat:
+            stats.prune("category_max")
+        elif repeats is not None and repeats[i] and (not combo or combo[-1] != i - 1):
+            stats.prune("repeat")
+        else:
+            new_totals = tuple(t + v for t, v in zip(totals, values[i]))
+            new_counts = dict(cat_counts)
+            new_counts[cat] = new_counts.get(cat, 0) + 1
+            new_combo = combo + (i,)
+            children.append((i + 1, count + 1, new_totals, new_counts, new_combo))
+
+            if count + 1 >= 2 and meets_category_min(new_counts):
+                seq += 1
+                entry = (-distance(new_totals), -seq, new_combo)
+                if len(found) < num:
+                    heapq.heappush(found, entry)
+                elif entry > found[0]:
+                    heapq.heapreplace(found, entry)
+
+        for child in children:
+            child_bound = lower_bound(*child[:4])
+            if child_bound is None:
+                stats.prune("category_min")
+                continue
+            if len(found) >= num and child_bound >= -found[0][0]:
+                stats.prune("distance_bound")
+                continue
+            seq += 1
+            heapq.heappush(frontier, (child_bound, -child[0], seq, child))
+
+    found.sort(key=lambda entry: (-entry[0], -entry[1]))
+    return [[original[j] for j in sorted(order[i] for i in combo)] for _, _, combo in found]
@@ -1,6 +1,6 @@
-from database import db
+from migrations import migrate_db
 from app import app
 
 with app.app_context():
-    db.create_all()
+    migrate_db()
     print("database tables created successfully.")
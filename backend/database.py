@@ -1,13 +1,44 @@
+import re
 from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
 
+# clean name to use in url
+def clean_name(name):
+    name = name.lower()
+    name = re.sub(r'[^\w\s-]', '', name)  # remove punctuation except dash/space
+    name = re.sub(r'\s+', '-', name.strip())  # spaces -> dash
+    return name
+
+class Restaurant(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, nullable=False, unique=True)
+    slug = db.Column(db.String, nullable=False, unique=True)  # nutritionix slug, or the cleaned name
+    logo = db.Column(db.String, nullable=True)
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+
+    # validators from the last scrape, so refresh.py can skip pages that haven't changed
+    etag = db.Column(db.String, nullable=True)
+    last_modified = db.Column(db.String, nullable=True)
+    content_hash = db.Column(db.String, nullable=True)
+    scraped_at = db.Column(db.DateTime, nullable=True)
+
+    items = db.relationship("MenuItem", back_populates="restaurant")
+
+    # case-insensitive name lookups for add_restaurant's duplicate check
+    __table_args__ = (db.Index("ix_restaurant_name_lower", db.func.lower(name)),)
+
 class MenuItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    restaurant = db.Column(db.String, nullable=False)
+    restaurant_id = db.Column(db.Integer, db.ForeignKey("restaurant.id"), nullable=False)
     name = db.Column(db.String, nullable=False)
-    calories = db.Column(db.Integer, nullable=False)
-    protein = db.Column(db.Integer, nullable=True)
-    carbs = db.Column(db.Integer, nullable=True)
-    fat = db.Column(db.Integer, nullable=True)
+    calories = db.Column(db.Float, nullable=False)
+    protein = db.Column(db.Float, nullable=True)
+    carbs = db.Column(db.Float, nullable=True)
+    fat = db.Column(db.Float, nullable=True)
     category = db.Column(db.String, nullable=True) # side, drink, main...
+
+    restaurant = db.relationship("Restaurant", back_populates="items")
+
+    # per-restaurant loads and category lists are range scans on this index
+    __table_args__ = (db.Index("ix_menu_item_restaurant_category_calories", restaurant_id, category, calories),)
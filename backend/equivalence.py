@@ -0,0 +1,60 @@
+import random
+import sys
+
+# items the combo search can't tell apart: the same calories, protein, fat and carbs, and the same
+# category when that category has a limit (otherwise the category doesn't change which combos are valid).
+#
+# the search runs over one representative per class, repeated up to max_items times for the members it
+# stands in for. `repeats[k]` marks the second and later copies, which find_combos_dp only takes straight
+# after the copy before them, so each multiset of classes is searched once instead of once per way of
+# picking its members. expand() turns a combo of representatives back into a combo of distinct members,
+# picked at random
+class ItemClasses:
+    def __init__(self, items, category_limits=None, max_items=None):
+        limited = {cat for cat, limits in (category_limits or {}).items()
+                   if limits.get("min") is not None or limits.get("max") is not None}
+        classes = {}
+        for item in items:
+            cat = item.category or ""
+            key = (item.calories, item.protein, item.fat, item.carbs, cat if cat in limited else None)
+            classes.setdefault(key, []).append(item)
+
+        # classes in order of their first member; members share calories, so calorie order is kept
+        self.items, self.repeats, self.members = [], [], {}
+        position = {id(item): k for k, item in enumerate(items)}
+        for members in classes.values():
+            rep = members[0]
+            copies = len(members) if max_items is None else min(len(members), max(max_items, 1))
+            self.items.extend([rep] * copies)
+            self.repeats.extend([False] + [True] * (copies - 1))
+            self.members[id(rep)] = members
+        self._position = position
+        self.count = len(classes)
+        self.collapsed = len(items) - len(classes)
+
+    def expand(self, combo, rng=random):
+        picked = {}
+        for rep in combo:
+            picked[id(rep)] = picked.get(id(rep), 0) + 1
+        concrete = []
+        for rep_id, k in picked.items():
+            members = self.members[rep_id]
+            concrete.extend(members[:k] if len(members) == k else rng.sample(members, k))
+        return sorted(concrete, key=lambda item: self._position[id(item)])
+
+# combos of class representatives found by the search, as a pool for the result cache: draw() samples
+# combos and expands each to concrete items, so repeated draws spread over the members
+class ClassCombos:
+    def __init__(self, combos, classes):
+        self.combos = combos
+        self.classes = classes
+
+    def __len__(self):
+        return len(self.combos)
+
+    @property
+    def nbytes(self):
+        return sys.getsizeof(self.combos) + sum(sys.getsizeof(combo) for combo in self.combos)
+
+    def draw(self, num, rng=random):
+        return [self.classes.expand(combo, rng) for combo in rng.sample(self.combos, min(num, len(self.combos)))]
@@ -0,0 +1,291 @@
+import os
+import time
+import hashlib
+import threading
+from itertools import combinations
+import numpy as np
+
+# combos of up to this many items get a frontier. the candidates grow fast with the size (see
+# build_frontier), so bigger sizes are skipped once a menu has more than FRONTIER_MAX_CANDIDATES of them
+FRONTIER_MAX_ITEMS = int(os.environ.get("FRONTIER_MAX_ITEMS") or 3)
+# pareto layers kept per combo size, the most combos a frontier lookup can return; bigger `num`s go to the search
+FRONTIER_DEPTH = int(os.environ.get("FRONTIER_DEPTH") or 10)
+FRONTIER_MAX_CANDIDATES = 2_000_000
+FRONTIER_DIR = os.environ.get("FRONTIER_DIR", "frontiers")
+BLOCK = 512  # points per dominance check block, a check takes up to BLOCK x max(BLOCK, frontier) x 4 booleans
+
+# objectives as columns to minimise: calories, -protein, fat, carbs
+SIGNS = np.array([1.0, -1.0, 1.0, 1.0])
+
+# covers[i, j]: a[i] <= b[j] in every column. compared a column at a time, which is several times faster
+# than reducing a 3d comparison over its short last axis
+def _covers(a, b):
+    out = a[:, None, 0] <= b[None, :, 0]
+    for col in range(1, a.shape[1]):
+        out &= a[:, None, col] <= b[None, :, col]
+    return out
+
+# indices of the points no other point dominates (<= in every column, < in one), one per distinct point.
+#
+# after a lexicographic sort anything that dominates a point comes before it, so the points are scanned
+# in that order in blocks: a block is checked against the frontier so far and against its own earlier
+# rows, and whatever survives joins the frontier.
+def pareto_indices(points):
+    if not len(points):
+        return np.empty(0, dtype=np.int64)
+    order = np.lexsort(points.T[::-1])
+    points = points[order]
+    distinct = np.ones(len(points), dtype=bool)
+    distinct[1:] = (points[1:] != points[:-1]).any(axis=1)
+    order, points = order[distinct], points[distinct]
+
+    front = np.empty((0, points.shape[1]))
+    kept = []
+    for start in range(0, len(points), BLOCK):
+        block, block_order = points[start:start + BLOCK], order[start:start + BLOCK]
+        if len(front):
+            dominated = _covers(front, block).any(axis=0)
+            block, block_order = block[~dominated], block_order[~dominated]
+        # row j dominates row i of what's left (j before i)
+        within = np.triu(_covers(block, block), 1).any(axis=0)
+        front = np.vstack([front, block[~within]])
+        kept.append(block_order[~within])
+    return np.concatenate(kept)
+
+# indices of the first `depth` pareto layers (the front, then the front of what's left, ...), with up to
+# `depth` copies of each distinct point. a point dominated by d others is in layer d + 1 at most, so this
+# holds every point dominated by fewer than `depth` others
+def pareto_layers(points, depth):
+    if not len(points):
+        return np.empty(0, dtype=np.int64)
+    order = np.lexsort(points.T[::-1])
+    points = points[order]
+    starts = np.ones(len(points), dtype=bool)
+    starts[1:] = (points[1:] != points[:-1]).any(axis=1)
+    group = np.cumsum(starts) - 1
+    distinct = points[starts]
+
+    # most points are dominated by `depth` or more of the first layer alone; dropping those before peeling
+    # is what keeps this fast (a layer point covers itself, which doesn't count)
+    front = pareto_indices(distinct)
+    dominators = np.zeros(len(distinct), dtype=np.int64)
+    for start in range(0, len(distinct), BLOCK * 8):
+        dominators[start:start + BLOCK * 8] = _covers(distinct[front], distinct[start:start + BLOCK * 8]).sum(axis=0)
+    dominators[front] -= 1
+
+    remaining = np.flatnonzero(dominators < depth)
+    kept = np.zeros(len(distinct), dtype=bool)
+    for _ in range(depth):
+        if not len(remaining):
+            break
+        front = remaining[pareto_indices(distinct[remaining])]
+        kept[front] = True
+        remaining = remaining[~kept[remaining]]
+
+    # rank of each point among its copies
+    first = np.flatnonzero(starts)
+    copy = np.arange(len(points)) - first[group]
+    return np.sort(order[kept[group] & (copy < depth)])
+
+# items a size-k combo among the best `depth` can contain. if d other items dominate an item, at least
+# d - (k - 1) of them aren't in a k-item combo holding it, and swapping each in gives a different combo
+# that dominates it, so only items dominated by fewer than limit = k + depth - 1 others are kept. items
+# with identical macros are interchangeable, so at most `limit` of each are kept too
+def _skyband(points, limit):
+    dominated_by = np.zeros(len(points), dtype=np.int64)
+    for start in range(0, len(points), BLOCK):
+        block = points[start:start + BLOCK]
+        le = (points[:, None, :] <= block[None, :, :]).all(axis=2)
+        lt = (points[:, None, :] < block[None, :, :]).any(axis=2)
+        dominated_by[start:start + BLOCK] = (le & lt).sum(axis=0)
+    candidates = np.flatnonzero(dominated_by < limit)
+
+    copies = {}
+    keep = []
+    for i in candidates:
+        key = points[i].tobytes()
+        copies[key] = copies.get(key, 0) + 1
+        if copies[key] <= limit:
+            keep.append(i)
+    return np.array(keep, dtype=np.int64)
+
+def _comb(n, k):
+    result = 1
+    for j in range(k):
+        result = result * (n - j) // (j + 1)
+    return result
+
+# the combos of every size 2..max_items in the first `depth` pareto layers over (calories down, protein
+# up, fat down, carbs down) for one menu. combos are kept as item ids, so they survive the snapshot being
+# rebuilt.
+#
+# the query boxes (max calories/fat/carbs, min protein) keep whatever dominates a combo that fits, and
+# those rank ahead of it or level with it, so a combo among a query's best `depth` is dominated by fewer
+# than `depth` others and is stored
+class Frontier:
+    def __init__(self, fingerprint, combos, depth=FRONTIER_DEPTH):
+        self.fingerprint = fingerprint
+        self.combos = combos  # size -> (item ids [F, size] int64, totals [F, 4] float64: cal, prot, fat, carbs)
+        self.depth = depth
+        self.max_items = max(combos) if combos else 1
+
+    @property
+    def nbytes(self):
+        return sum(ids.nbytes + totals.nbytes for ids, totals in self.combos.values())
+
+    def __len__(self):
+        return sum(len(ids) for ids, _ in self.combos.values())
+
+    # the best `num` (up to depth) combos of 2..max_items items inside the box (max calories/fat/carbs, min
+    # protein) by `optimize` ("protein": most protein, then fewest calories; "calories": the reverse).
+    # returns lists of item ids
+    def query(self, max_items, cal_max=None, prot_min=None, fat_max=None, carb_max=None, optimize="protein",
+              num=10):
+        ids, totals = [], []
+        for size in range(2, max_items + 1):
+            size_ids, size_totals = self.combos[size]
+            keep = np.ones(len(size_totals), dtype=bool)
+            for col, bound in ((0, cal_max), (2, fat_max), (3, carb_max)):
+                if bound is not None:
+                    keep &= size_totals[:, col] <= bound
+            if prot_min is not None:
+                keep &= size_totals[:, 1] >= prot_min
+            ids.extend(size_ids[keep].tolist())
+            totals.append(size_totals[keep])
+        if not ids:
+            return []
+        totals = np.concatenate(totals)
+        cal, prot = totals[:, 0], totals[:, 1]
+        ranked = np.lexsort((-prot, cal) if optimize == "calories" else (cal, -prot))
+        return [ids[i] for i in ranked[:num]]
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        arrays = {"fingerprint": np.array(self.fingerprint), "depth": np.array(self.depth)}
+        for size, (ids, totals) in self.combos.items():
+            arrays[f"ids_{size}"] = ids
+            arrays[f"totals_{size}"] = totals
+        tmp = f"{path}.tmp.npz"
+        np.savez_compressed(tmp, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            combos = {}
+            for key in data.files:
+                if key.startswith("ids_"):
+                    size = int(key[4:])
+                    combos[size] = (data[key], data[f"totals_{size}"])
+            # frontiers saved before layers were kept are exact for the best combo only
+            depth = int(data["depth"]) if "depth" in data.files else 1
+            return cls(str(data["fingerprint"]), combos, depth)
+
+# hash of a snapshot's ids and macros, to tell whether a stored frontier still matches the menu
+def fingerprint(snapshot):
+    cached = getattr(snapshot, "_fingerprint", None)
+    if cached is None:
+        h = hashlib.sha256(snapshot.ids.tobytes())
+        for col in (snapshot.calories, snapshot.protein, snapshot.fat, snapshot.carbs):
+            h.update(col.tobytes())
+        cached = snapshot._fingerprint = h.hexdigest()[:32]
+    return cached
+
+# enumerate the candidate combos of each size from the skyband items and keep the first `depth` layers.
+# missing macros count as 0, like the combo search
+def build_frontier(snapshot, max_items=FRONTIER_MAX_ITEMS, max_candidates=FRONTIER_MAX_CANDIDATES,
+                   depth=FRONTIER_DEPTH):
+    macros = np.nan_to_num(np.column_stack([snapshot.calories, snapshot.protein, snapshot.fat, snapshot.carbs]))
+    points = macros * SIGNS
+    combos = {}
+    for size in range(2, max_items + 1):
+        band = _skyband(points, size + depth - 1)
+        if _comb(len(band), size) > max_candidates:
+            break
+        members = np.array(list(combinations(band, size)), dtype=np.int64).reshape(-1, size)
+        totals = macros[members].sum(axis=1)
+        kept = pareto_layers(totals * SIGNS, depth)
+        combos[size] = (snapshot.ids[members[kept]], totals[kept])
+    return Frontier(fingerprint(snapshot), combos, depth)
+
+def _path(restaurant):
+    safe = "".join(c if c.isalnum() else "-" for c in restaurant.lower())
+    return os.path.join(FRONTIER_DIR, f"{safe}-{hashlib.sha256(restaurant.encode()).hexdigest()[:8]}.npz")
+
+# a stored frontier is used while it matches the menu and was built to the configured depth
+def _current(frontier, snapshot):
+    return frontier.fingerprint == fingerprint(snapshot) and frontier.depth == FRONTIER_DEPTH
+
+_frontiers = {}
+_building = set()
+_lock = threading.Lock()
+
+# the frontier for a snapshot's menu if one is ready: from memory, or from disk if the stored one
+# matches the menu. returns None otherwise, so the caller falls back to the search
+def get_frontier(snapshot):
+    key = snapshot.restaurant
+    frontier = _frontiers.get(key)
+    if frontier is not None and _current(frontier, snapshot):
+        return frontier
+    path = _path(key)
+    if os.path.exists(path):
+        try:
+            frontier = Frontier.load(path)
+        except Exception as e:
+            print(f"couldn't read frontier for {key}: {e}")
+            return None
+        if _current(frontier, snapshot):
+            with _lock:
+                _frontiers[key] = frontier
+            return frontier
+    return None
+
+# build and store a restaurant's frontier, skipped if the stored one is up to date
+def refresh_frontier(snapshot, max_items=FRONTIER_MAX_ITEMS):
+    if not len(snapshot) or get_frontier(snapshot) is not None:
+        return get_frontier(snapshot)
+    start = time.perf_counter()
+    frontier = build_frontier(snapshot, max_items)
+    frontier.save(_path(snapshot.restaurant))
+    with _lock:
+        _frontiers[snapshot.restaurant] = frontier
+    print(f"built frontier for {snapshot.restaurant}: {len(frontier)} combos up to {frontier.max_items} items, "
+          f"{frontier.nbytes / 1024:.0f} KB in {time.perf_counter() - start:.2f}s")
+    return frontier
+
+# rebuild a restaurant's frontier on a background thread after its menu changes
+def schedule_build(app, restaurant):
+    with _lock:
+        if restaurant in _building:
+            return
+        _building.add(restaurant)
+
+    def build():
+        from snapshot import get_snapshot
+        try:
+            with app.app_context():
+                # go again if the menu changed while this build was running
+                snapshot = get_snapshot(restaurant)
+                while refresh_frontier(snapshot) is not None:
+                    latest = get_snapshot(restaurant)
+                    if fingerprint(latest) == fingerprint(snapshot):
+                        break
+                    snapshot = latest
+        except Exception as e:
+            print(f"failed to build frontier for {restaurant}: {e}")
+        finally:
+            with _lock:
+                _building.discard(restaurant)
+
+    threading.Thread(target=build, name="frontier", daemon=True).start()
+
+# python frontier.py [restaurant ...]: build the frontier for every cached restaurant, or the given ones
+if __name__ == "__main__":
+    import sys
+    from app import app
+    from database import Restaurant
+    from snapshot import get_snapshot
+    with app.app_context():
+        names = sys.argv[1:] or [r.name for r in Restaurant.query.filter(Restaurant.item_count > 0)]
+        for name in names:
+            refresh_frontier(get_snapshot(name))
@@ -0,0 +1,102 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS") or 2)  # scrapes running at once, the rest wait queued
+JOB_HISTORY = 500  # finished jobs kept for polling, oldest dropped first
+
+QUEUED, FETCHING, PARSING, STORING, DONE, FAILED = "queued", "fetching", "parsing", "storing", "done", "failed"
+
+class Job:
+    def __init__(self, slug, refresh=False):
+        self.id = uuid.uuid4().hex
+        self.slug = slug
+        self.refresh = refresh
+        self.status = QUEUED
+        self.result = {}
+        self.error = None
+        self.error_code = None  # the http status the synchronous route would have answered with
+        self.created = time.time()
+        self.finished = None
+
+    @property
+    def active(self):
+        return self.status not in (DONE, FAILED)
+
+    def as_dict(self):
+        job = {"id": self.id, "slug": self.slug, "refresh": self.refresh, "status": self.status, **self.result}
+        if self.error:
+            job["error"] = self.error
+            job["error_code"] = self.error_code
+        if self.finished:
+            job["elapsed_s"] = round(self.finished - self.created, 2)
+        return job
+
+class JobError(Exception):
+    def __init__(self, message, code=500):
+        super().__init__(message)
+        self.code = code
+
+# background jobs run on a small thread pool, each inside the app context of whoever submitted it.
+# `work(job, app)` moves job.status along and returns the result fields; raise JobError to fail with
+# a specific code. submitting a slug that already has a queued or running job returns that job instead
+class JobQueue:
+    def __init__(self, workers=JOB_WORKERS, history=JOB_HISTORY):
+        self.workers = workers
+        self.history = history
+        self._jobs = OrderedDict()
+        self._active = {}  # slug -> in-flight job
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def submit(self, app, slug, work, refresh=False):
+        with self._lock:
+            job = self._active.get(slug)
+            if job is not None:
+                return job, False
+            job = Job(slug, refresh)
+            self._jobs[job.id] = job
+            self._active[slug] = job
+            self._trim()
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+        self._pool.submit(self._run, app, job, work)
+        return job, True
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, app, job, work):
+        try:
+            with app.app_context():
+                job.result = work(job, app) or {}
+            job.status = DONE
+        except JobError as e:
+            job.error, job.error_code = str(e), e.code
+            job.status = FAILED
+        except Exception as e:
+            job.error, job.error_code = f"Failed to scrape menu: {e}", 500
+            job.status = FAILED
+        finally:
+            job.finished = time.time()
+            with self._lock:
+                if self._active.get(job.slug) is job:
+                    del self._active[job.slug]
+            print(f"job {job.id} ({job.slug}) {job.status}" + (f": {job.error}" if job.error else ""))
+
+    # drop the oldest finished jobs past the history limit; in-flight jobs are always kept
+    def _trim(self):
+        excess = len(self._jobs) - self.history
+        for job_id in [job_id for job_id, job in self._jobs.items() if not job.active][:max(excess, 0)]:
+            del self._jobs[job_id]
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+jobs = JobQueue()
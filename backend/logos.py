@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from scraper import download
+
+LOGOS_FILE = "restaurant_logos.json"
+# logo images are downloaded once into this directory and served by /api/logos, set LOGO_PROXY=0 to
+# hand the browser the remote urls instead
+LOGO_CACHE_DIR = os.environ.get("LOGO_CACHE_DIR", "logo_cache")
+LOGO_PROXY = os.environ.get("LOGO_PROXY", "1") != "0"
+LOGO_MAX_BYTES = 2 * 1024 * 1024
+# a logo that failed to download isn't tried again for this long, /api/logos redirects straight away
+LOGO_RETRY_SECONDS = float(os.environ.get("LOGO_RETRY_SECONDS") or 300)
+
+# write to a temp file in the same directory, then rename over the target, so readers only ever see
+# the old file or the new one
+def atomic_write(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+# restaurant name -> logo url, held in memory and read from disk again only when the file's mtime
+# changes (another process wrote it). updates hold a lock across read-modify-write and are written
+# atomically, so concurrent adds can't lose or corrupt entries
+class LogoRegistry:
+    def __init__(self, path=LOGOS_FILE):
+        self.path = path
+        self._logos = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            self._logos, self._mtime = {}, None
+            return
+        if mtime != self._mtime:
+            with open(self.path) as f:
+                self._logos = json.load(f)
+            self._mtime = mtime
+
+    def all(self):
+        with self._lock:
+            self._reload()
+            return dict(self._logos)
+
+    def get(self, name):
+        with self._lock:
+            self._reload()
+            return self._logos.get(name)
+
+    def set(self, name, url):
+        with self._lock:
+            self._reload()
+            if self._logos.get(name) == url:
+                return
+            logos = {**self._logos, name: url}
+            atomic_write(self.path, json.dumps(logos, indent=2).encode())
+            self._logos, self._mtime = logos, os.stat(self.path).st_mtime_ns
+
+registry = LogoRegistry()
+
+def load_logos():
+    return registry.all()
+
+# short hash of a logo url, used as the cache file name and as the version in proxied urls, so a new
+# logo gets a new url and the old one can be cached forever
+def logo_version(url):
+    return hashlib.sha256(url.encode()).hexdigest()[:16]
+
+IMAGE_SIGNATURES = [
+    (b"\x89PNG", "image/png"), (b"\xff\xd8", "image/jpeg"), (b"GIF8", "image/gif"), (b"<svg", "image/svg+xml"),
+    (b"<?xml", "image/svg+xml"),
+]
+
+# content type from the file's first bytes, since only the image itself is kept on disk
+def image_type(data):
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    head = data[:16].lstrip()
+    return next((kind for signature, kind in IMAGE_SIGNATURES if head.startswith(signature)), "application/octet-stream")
+
+# local copies of remote logo images, on disk and in memory. get() returns (bytes, content type, etag),
+# downloading the image on first use; the etag is the sha256 of the image bytes. a failed download is
+# remembered for LOGO_RETRY_SECONDS, and get() raises for that url without fetching again until then
+class LogoCache:
+    def __init__(self, directory=LOGO_CACHE_DIR):
+        self.directory = directory
+        self._images = {}  # url -> (bytes, content type, etag)
+        self._failed = {}  # url -> monotonic time of its last failed download
+        self._lock = threading.Lock()
+        self._fetching = {}  # url -> lock, so one download per logo however many requests want it
+
+    def get(self, url):
+        image = self._images.get(url)
+        if image is None:
+            self._check_failed(url)
+            with self._lock:
+                url_lock = self._fetching.setdefault(url, threading.Lock())
+            with url_lock:
+                try:
+                    image = self._images.get(url) or self._load(url)
+                finally:
+                    # success or not, so a failed download doesn't leave its lock behind
+                    with self._lock:
+                        self._fetching.pop(url, None)
+        return image
+
+    def _check_failed(self, url):
+        failed_at = self._failed.get(url)
+        if failed_at is not None and time.monotonic() - failed_at < LOGO_RETRY_SECONDS:
+            raise ValueError(f"logo at '{url}' failed to download recently")
+
+    def _load(self, url):
+        # another request may have failed on it while this one waited for the lock
+        self._check_failed(url)
+        path = os.path.join(self.directory, logo_version(url))
+        try:
+            if not os.path.exists(path):
+                r = download(url, retries=1)
+                if len(r.content) > LOGO_MAX_BYTES:
+                    raise ValueError(f"logo at '{url}' is too large")
+                atomic_write(path, r.content)
+            with open(path, "rb") as f:
+                data = f.read()
+        except Exception:
+            self._failed[url] = time.monotonic()
+            raise
+        self._failed.pop(url, None)
+        self._images[url] = (data, image_type(data), hashlib.sha256(data).hexdigest())
+        return self._images[url]
+
+logo_cache = LogoCache()
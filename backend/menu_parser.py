@@ -0,0 +1,216 @@
+import re
+from html import unescape
+
+disallowed_categories = ["at participating locations", "catering", "trays"]
+
+TH_ID = re.compile(r"^inmGrid_c\d+$")
+
+# markup the page scan steps over: comments, doctype/processing instructions, end tags, start tags
+_TAG = re.compile(
+    r"<!--.*?-->|<[!?][^>]*>"
+    r"|</\s*([a-zA-Z][^\s/>]*)[^>]*>"
+    r"|<([a-zA-Z][^\s/>]*)((?:[^>\"']|\"[^\"]*\"|'[^']*')*)>",
+    re.S,
+)
+_ATTR = re.compile(r"""([^\s=/>]+)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s>]+))?""")
+_RAW_TEXT = {"script": re.compile(r"</script\s*>", re.I), "style": re.compile(r"</style\s*>", re.I)}
+# the only tags the scan acts on; everything else is skipped without parsing its attributes
+_WANTED = {"title", "th", "div", "img", "tr", "td", "a", "h3"}
+
+def _attrs(text):
+    attrs = {}
+    for name, value in _ATTR.findall(text):
+        if value[:1] in ("'", '"'):
+            value = value[1:-1]
+        attrs[name.lower()] = unescape(value) if value or "=" in text else None
+    return attrs
+
+# one pass over a nutritionix menu page that keeps only what parse_nutritionix_menu reads: the title,
+# the nutrition column headers, the first div#brand image, and for every <tr> its first <h3>, first
+# td.al with its first a.nmItem, and the first <td> for each `headers` token. a regex steps from tag to
+# tag, only the tags above are looked at and text is only decoded inside the elements being read.
+# it matches what the BeautifulSoup version read with soup.find / row.find, for pages whose table rows
+# aren't nested inside each other.
+#
+# text is collected the way get_text(strip=True) does it: every text node stripped, then joined.
+class _MenuPageParser:
+    def __init__(self):
+        self.title = None
+        self.headers = []      # (th id, text) for the inmGrid_c<n> column headers, in page order
+        self.rows = []         # dicts, see handle_starttag("tr")
+        self.logo_url = None
+        self.row = None
+        self._captures = []    # [tag, depth, parts, on_done, strip] for elements whose text we want
+        self._brand_depth = 0  # > 0 while inside the first div#brand
+        self._brand_seen = False
+        self._brand_img = False
+        self._al_depth = 0     # > 0 while inside the row's first td.al
+
+    def feed(self, html):
+        pos = 0
+        while True:
+            m = _TAG.search(html, pos)
+            end = m.start() if m else len(html)
+            if self._captures and end > pos:
+                self.handle_data(unescape(html[pos:end]))
+            if not m:
+                return
+            pos = m.end()
+
+            tag = (m.group(1) or m.group(2) or "").lower()
+            if not tag:
+                continue
+            if m.group(1):
+                if tag in _WANTED:
+                    self.handle_endtag(tag)
+                continue
+
+            attr_text = m.group(3)
+            if tag in _WANTED:
+                self.handle_starttag(tag, _attrs(attr_text))
+                if attr_text.rstrip().endswith("/"):
+                    self.handle_endtag(tag)
+            elif tag in _RAW_TEXT:
+                close = _RAW_TEXT[tag].search(html, pos)
+                pos = close.end() if close else len(html)
+
+    def _capture(self, tag, on_done, strip=True):
+        self._captures.append([tag, 1, [], on_done, strip])
+
+    def handle_starttag(self, tag, attrs):
+        for capture in self._captures:
+            if capture[0] == tag:
+                capture[1] += 1
+        if tag == "div" and self._brand_depth:
+            self._brand_depth += 1
+        if tag == "td" and self._al_depth:
+            self._al_depth += 1
+
+        if tag == "title" and self.title is None:
+            self.title = ""
+            # soup.title.string, so the title text isn't stripped
+            self._capture(tag, lambda text: setattr(self, "title", text), strip=False)
+        elif tag == "th" and TH_ID.match(attrs.get("id") or ""):
+            self._capture(tag, lambda text, th_id=attrs["id"]: self.headers.append((th_id, text)))
+        elif tag == "div" and attrs.get("id") == "brand" and not self._brand_seen:
+            self._brand_seen = True
+            self._brand_depth = 1
+        elif tag == "img" and self._brand_depth and not self._brand_img:
+            self._brand_img = True
+            self.logo_url = attrs.get("src") or None
+        elif tag == "tr":
+            self.row = {"sub": "subCategory" in (attrs.get("class") or "").split(), "h3": None,
+                        "al": False, "link": None, "cells": {}}
+            self.rows.append(self.row)
+        elif self.row is None:
+            return
+        elif tag == "h3" and self.row["h3"] is None:
+            self.row["h3"] = ""
+            self._capture(tag, lambda text, row=self.row: row.__setitem__("h3", text))
+        elif tag == "td":
+            if "al" in (attrs.get("class") or "").split() and not self.row["al"]:
+                self.row["al"] = True
+                self._al_depth = 1
+            cells = self.row["cells"]
+            tokens = [t for t in (attrs.get("headers") or "").split() if t not in cells]
+            if tokens:
+                for token in tokens:
+                    cells[token] = ""
+                self._capture(tag, lambda text, row=self.row, tokens=tokens: row["cells"].update(
+                    (token, text) for token in tokens))
+        elif tag == "a" and self._al_depth and self.row["link"] is None \
+                and "nmItem" in (attrs.get("class") or "").split():
+            self.row["link"] = (attrs.get("title"), "")
+            self._capture(tag, lambda text, row=self.row: row.__setitem__("link", (row["link"][0], text)))
+
+    def handle_endtag(self, tag):
+        if tag == "div" and self._brand_depth:
+            self._brand_depth -= 1
+        if tag == "td" and self._al_depth:
+            self._al_depth -= 1
+        if tag == "tr":
+            self.row = None
+            self._al_depth = 0
+        for capture in list(self._captures):
+            if capture[0] == tag:
+                capture[1] -= 1
+                if not capture[1]:
+                    self._captures.remove(capture)
+                    capture[3]("".join(capture[2]))
+
+    def handle_data(self, data):
+        if self._captures:
+            text = data.strip()
+            for capture in self._captures:
+                if not capture[4]:
+                    capture[2].append(data)
+                elif text:
+                    capture[2].append(text)
+
+# parse a nutritionix menu page, returns (restaurant_name, items_list, logo_url)
+def parse_nutritionix_menu(html, slug):
+    page = _MenuPageParser()
+    page.feed(html)
+
+    # get the restaurant name from the page
+    title_match = re.match(r"^(.+?)\s+-\s+(Full|Interactive) Nutrition", page.title or "")
+    restaurant_name = title_match.group(1).strip() if title_match else slug.replace("-", " ").title()
+
+    # get the column ids for nutrition info
+    col_ids = {}
+    for th_id, text in page.headers:
+        text = text.lower()
+        col_id = th_id.split("_")[1]  # e.g. "c1"
+        if "calorie" in text:
+            col_ids["calories"] = col_id
+        elif "total fat" in text:
+            col_ids["fat"] = col_id
+        elif "total carbohydrate" in text:
+            col_ids["carbs"] = col_id
+        elif "protein" in text:
+            col_ids["protein"] = col_id
+
+    if not col_ids:
+        raise ValueError(f"could not detect nutrition columns for '{slug}'")
+
+    items = []
+    current_category = "Other"
+
+    # go through all <tr> elements in order
+    for row in page.rows:
+        if row["sub"]:
+            if row["h3"] is not None:
+                current_category = row["h3"]
+            continue
+
+        if not row["al"] or row["link"] is None:
+            continue
+        title, text = row["link"]
+        name = title or text
+
+        if any(d in current_category.lower() for d in disallowed_categories):
+            continue
+
+        cells = row["cells"]
+        try:
+            calories = int(cells.get(f"inmGrid_{col_ids['calories']}").replace(",", ""))
+            fat      = float(cells.get(f"inmGrid_{col_ids['fat']}").replace(",", ""))
+            carbs    = float(cells.get(f"inmGrid_{col_ids['carbs']}").replace(",", ""))
+            protein  = float(cells.get(f"inmGrid_{col_ids['protein']}").replace(",", ""))
+        except (TypeError, ValueError, AttributeError):
+            continue
+
+        items.append({
+            "name": name,
+            "restaurant": restaurant_name,
+            "category": current_category,
+            "calories": calories,
+            "fat": fat,
+            "carbs": carbs,
+            "protein": protein,
+        })
+
+    if not items:
+        raise ValueError(f"No menu items found for '{slug}' — restaurant may not exist on Nutritionix")
+
+    return restaurant_name, items, page.logo_url
@@ -0,0 +1,74 @@
+import json
+import hashlib
+import threading
+from database import db, MenuItem, Restaurant
+
+MACROS = ["calories", "protein", "fat", "carbs"]
+
+_lock = threading.Lock()
+_generation = 0   # bumped by invalidate() so a build that raced a menu write isn't cached
+_cached = {}      # host url -> (body, etag); logo urls are absolute so they depend on the host
+
+# restaurants, their categories, item counts and per-category macro ranges in one pass over menu_item
+# (one GROUP BY on the restaurant_id/category index) plus the restaurant table
+def _build(logo_url):
+    ranges = {}
+    columns = [getattr(MenuItem, macro) for macro in MACROS]
+    rows = (
+        db.session.query(
+            MenuItem.restaurant_id, MenuItem.category, db.func.count(MenuItem.id),
+            *[db.func.min(c) for c in columns], *[db.func.max(c) for c in columns],
+        )
+        .group_by(MenuItem.restaurant_id, MenuItem.category)
+        .all()
+    )
+    for rid, category, count, *bounds in rows:
+        if not category:
+            continue
+        ranges.setdefault(rid, []).append({
+            "name": category,
+            "item_count": count,
+            **{macro: {"min": bounds[i], "max": bounds[i + len(MACROS)]} for i, macro in enumerate(MACROS)},
+        })
+
+    restaurants = (
+        Restaurant.query.filter(Restaurant.item_count > 0)
+        .order_by(Restaurant.name)
+        .all()
+    )
+    return {
+        "restaurants": [
+            {
+                "name": r.name,
+                "slug": r.slug,
+                "logo": logo_url(r.id, r.logo),
+                "item_count": r.item_count,
+                "categories": sorted(ranges.get(r.id, []), key=lambda c: c["name"]),
+            }
+            for r in restaurants
+        ],
+    }
+
+# the serialized metadata and its etag (a hash of the body), built once per menu version.
+# logo_url(restaurant_id, logo) turns a stored logo into the url handed to the browser
+def get_metadata(host, logo_url):
+    cached = _cached.get(host)
+    if cached is not None:
+        return cached
+
+    generation = _generation
+    body = json.dumps(_build(logo_url), separators=(",", ":"), sort_keys=True)
+    etag = hashlib.sha256(body.encode()).hexdigest()[:32]
+    with _lock:
+        if generation != _generation:
+            return body, etag
+        if len(_cached) >= 8:  # the host comes from the request, don't let odd ones pile up
+            _cached.clear()
+        return _cached.setdefault(host, (body, etag))
+
+# drop the cached metadata after a menu or logo changes
+def invalidate():
+    global _generation
+    with _lock:
+        _generation += 1
+        _cached.clear()
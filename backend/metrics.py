@@ -0,0 +1,233 @@
+import os
+import json
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from flask import request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# requests slower than this get a structured log line with their parameters
+SLOW_REQUEST_SECONDS = float(os.environ.get("SLOW_REQUEST_MS") or 1000) / 1000
+SLOW_LOG_MAX_BODY = 2000  # characters of request body kept in a slow request's log line
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+SCRAPE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# every metric, in the order /metrics lists them
+REGISTRY = []
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+# in-process metrics in the prometheus text format. values are kept per tuple of label values, passed
+# positionally in the order of `labels` (keyword labels cost more than the rest of a record put together),
+# so recording one is a dict lookup and an add under the metric's lock
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in sorted(values, key=lambda kv: tuple(map(str, kv[0]))):
+            yield from self._samples(key, value)
+
+    def _samples(self, key, value):
+        yield f"{self.name}{_labels(self.labels, key)} {_number(value)}"
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+# observations counted into fixed buckets (value <= bound), plus their sum and count
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][slot] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def _samples(self, key, value):
+        counts, total = value[0][:], value[1]
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), counts):
+            cumulative += count
+            le = 'le="{}"'.format(bound if bound == "+Inf" else _number(bound))
+            yield f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}"
+        yield f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}"
+        yield f"{self.name}_count{_labels(self.labels, key)} {cumulative}"
+
+# a value owned by some other object (like the result cache's hit count), read when /metrics is scraped
+class CallbackMetric(Metric):
+    def __init__(self, name, help, kind, read):
+        super().__init__(name, help)
+        self.kind = kind
+        self.read = read
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield f"{self.name} {_number(self.read())}"
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+http_requests = Counter("http_requests_total", "Requests served, by route and status.",
+                        ("method", "route", "status"))
+http_request_seconds = Histogram("http_request_duration_seconds", "Time to build each response, by route.",
+                                 ("method", "route"))
+db_queries = Counter("db_queries_total", "SQL statements executed, by statement type.", ("statement",))
+db_query_seconds = Histogram("db_query_duration_seconds", "SQL statement execution time, by statement type.",
+                             ("statement",), QUERY_BUCKETS)
+combo_searches = Counter("combo_searches_total", "Combo queries answered, by engine and whether the pool was cached.",
+                         ("engine", "cached"))
+combo_search_nodes = Counter("combo_search_nodes_total", "Search nodes expanded answering combo queries.", ("engine",))
+combo_results = Counter("combo_results_total", "Combos returned by combo queries.", ("engine",))
+combo_truncated = Counter("combo_search_truncated_total", "Combo searches stopped by their time or node budget.",
+                          ("engine",))
+combo_search_seconds = Histogram("combo_search_duration_seconds", "Combo search time, by engine.", ("engine",))
+snapshot_lookups = Counter("snapshot_cache_lookups_total", "Menu snapshot lookups, by hit or miss.", ("result",))
+scrape_seconds = Histogram("scrape_duration_seconds", "Time per menu scrape stage (fetch, parse, store).",
+                           ("stage",), SCRAPE_BUCKETS)
+scrape_fetches = Counter("scrape_fetches_total", "Menu page fetches, by outcome.", ("outcome",))
+scrape_retries = Counter("scrape_retries_total", "Menu page fetch attempts that were retried.")
+
+# one combo query's search, for the combo counters. results is how many combos went back to the client
+def record_search(engine, stats, results, cached=False):
+    combo_searches.inc(engine, "true" if cached else "false")
+    if not cached:
+        combo_search_nodes.inc(engine, amount=stats.nodes)
+        combo_search_seconds.observe(stats.elapsed, engine)
+    combo_results.inc(engine, amount=results)
+    if stats.truncated:
+        combo_truncated.inc(engine)
+
+# the current request's start time and db totals, per thread like the requests themselves
+_local = threading.local()
+
+def _statement_type(statement):
+    word = statement.lstrip()[:6].lower()
+    return word if word in ("select", "insert", "update", "delete") else "other"
+
+# hooked on the Engine class, so every engine (the app's and any a script makes) is counted
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_metrics_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    kind = _statement_type(statement)
+    db_queries.inc(kind)
+    db_query_seconds.observe(elapsed, kind)
+    totals = getattr(_local, "db", None)
+    if totals is not None:
+        totals[0] += 1
+        totals[1] += elapsed
+
+def _start_request():
+    _local.start = time.perf_counter()
+    _local.db = [0, 0.0]
+    _local.status = None
+
+def _record_status(response):
+    _local.status = response.status_code
+    return response
+
+# recorded on teardown, which also runs when the view raised and no after_request hook saw a response;
+# those count as 500s. streamed responses (get_combos_stream) are timed to when streaming starts, not to
+# the last record
+def _finish_request(exc=None):
+    start = getattr(_local, "start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    db_count, db_time = _local.db
+    status = _local.status or 500
+    _local.start = _local.db = _local.status = None
+
+    req = request._get_current_object()  # one context lookup instead of one per attribute
+    route = req.url_rule.rule if req.url_rule is not None else "unmatched"
+    http_requests.inc(req.method, route, status)
+    http_request_seconds.observe(elapsed, req.method, route)
+    if elapsed >= SLOW_REQUEST_SECONDS:
+        _log_slow_request(req, route, status, elapsed, db_count, db_time)
+
+def _log_slow_request(request, route, status, elapsed, db_count, db_time):
+    body = request.get_json(silent=True)
+    if body is not None and len(json.dumps(body)) > SLOW_LOG_MAX_BODY:
+        body = json.dumps(body)[:SLOW_LOG_MAX_BODY] + "..."
+    print(json.dumps({
+        "event": "slow_request",
+        "method": request.method,
+        "route": route,
+        "path": request.path,
+        "status": status,
+        "ms": round(elapsed * 1000, 1),
+        "db_queries": db_count,
+        "db_ms": round(db_time * 1000, 1),
+        "args": request.args.to_dict(flat=False),
+        "body": body,
+    }, default=str))
+
+def metrics_view():
+    return Response(render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+# time every request, count db statements and serve GET /metrics
+def init_app(app):
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    app.before_request(_start_request)
+    app.after_request(_record_status)
+    app.teardown_request(_finish_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
@@ -0,0 +1,56 @@
+from sqlalchemy import inspect, text
+from database import db, Restaurant, clean_name
+from logos import load_logos
+
+# brings an existing menu_items.db up to the current schema, safe to run on every start.
+#
+# older databases kept the restaurant name as a string on every menu_item row. those get a restaurant
+# row per distinct name (logos come from restaurant_logos.json) and menu_item is rebuilt with a
+# restaurant_id foreign key, keeping item ids. sqlite can't drop a column in place, so the old table is
+# renamed, copied into the new one and dropped, all in one transaction.
+def migrate_db():
+    inspector = inspect(db.engine)
+    columns = {c["name"] for c in inspector.get_columns("menu_item")} if inspector.has_table("menu_item") else set()
+    if "restaurant" not in columns or "restaurant_id" in columns:
+        db.create_all()
+        add_missing_columns()
+        return
+
+    print("migrating menu_item to the restaurant table")
+    Restaurant.__table__.create(db.engine, checkfirst=True)
+    logos = load_logos()
+    with db.engine.begin() as conn:
+        names = [name for (name,) in conn.execute(text("SELECT DISTINCT restaurant FROM menu_item ORDER BY restaurant"))]
+        taken = {slug for (slug,) in conn.execute(text("SELECT slug FROM restaurant"))}
+        for name in names:
+            slug = base = clean_name(name) or "restaurant"
+            suffix = 2
+            while slug in taken:
+                slug, suffix = f"{base}-{suffix}", suffix + 1
+            taken.add(slug)
+            conn.execute(Restaurant.__table__.insert().values(name=name, slug=slug, logo=logos.get(name)))
+
+        conn.execute(text("ALTER TABLE menu_item RENAME TO menu_item_legacy"))
+        db.metadata.create_all(conn)
+        conn.execute(text("""
+            INSERT INTO menu_item (id, restaurant_id, name, calories, protein, carbs, fat, category)
+            SELECT m.id, r.id, m.name, m.calories, m.protein, m.carbs, m.fat, m.category
+            FROM menu_item_legacy m JOIN restaurant r ON r.name = m.restaurant
+        """))
+        conn.execute(text("DROP TABLE menu_item_legacy"))
+        conn.execute(text("""
+            UPDATE restaurant SET item_count = (SELECT COUNT(*) FROM menu_item WHERE restaurant_id = restaurant.id)
+        """))
+    print(f"migrated {len(names)} restaurants")
+
+# nullable columns added to a model after its table was created are added with ALTER TABLE
+def add_missing_columns():
+    inspector = inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    print(f"adding {table.name}.{column.name}")
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} "
+                                      f"{column.type.compile(db.engine.dialect)}"))
@@ -0,0 +1,125 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from combos import find_combos_dp, SearchStats
+
+# worker processes for the combo search, 0 or 1 keeps every search in-process. more workers than cores
+# only adds overhead, so it's capped at the core count
+COMBO_WORKERS = min(int(os.environ.get("COMBO_WORKERS") or 0), os.cpu_count() or 1)
+PARALLEL_MIN_ITEMS = 200  # smaller menus finish fast enough on one core
+PROBE_TIME = 0.05         # seconds; a search that finishes within this isn't worth splitting
+TASKS_PER_WORKER = 4      # more chunks than workers so one slow chunk doesn't leave the rest idle
+CANCEL_SLOTS = 1024       # searches in flight at once, each gets a flag its chunks poll
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+_cancel_flags = None  # shared with the workers, set to 1 to stop a search's remaining chunks
+_next_slot = 0
+
+# worker process setup
+def _init_worker(flags):
+    global _cancel_flags
+    _cancel_flags = flags
+
+# one pool per process, created on first use. spawn rather than fork since the server is threaded
+def _get_pool(workers):
+    global _pool, _pool_workers, _cancel_flags
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            context = multiprocessing.get_context("spawn")
+            _cancel_flags = context.RawArray("b", CANCEL_SLOTS)
+            _pool = ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                        initargs=(_cancel_flags,))
+            _pool_workers = workers
+        return _pool
+
+def _claim_slot():
+    global _next_slot
+    with _pool_lock:
+        slot = _next_slot
+        _next_slot = (_next_slot + 1) % CANCEL_SLOTS
+        _cancel_flags[slot] = 0
+        return slot
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+# worker side: search the subtrees under a contiguous range of roots. combos come back as item indices,
+# which pickle much smaller than the items
+def _search_roots(items, macros, max_items, category_limits, collect_limit, roots, time_limit, node_limit,
+                  slot, repeats=None):
+    stats = SearchStats(time_limit, node_limit, cancelled=lambda: _cancel_flags[slot])
+    position = {id(item): k for k, item in enumerate(items)}
+    combos = find_combos_dp(items, macros, max_items, category_limits, collect_limit, stats, roots=roots,
+                            repeats=repeats)
+    return [[position[id(item)] for item in combo] for combo in combos], stats.as_dict()
+
+# split roots 0..n-1 into contiguous chunks of about equal work. the subtree under root i is roughly
+# C(n - i, max_items - 1) combos, so weighting by (n - i) ** (max_items - 1) gives small chunks at the
+# front, where the subtrees are deep, and big ones at the back
+def _chunks(n, max_items, count):
+    weights = [(n - i) ** max(max_items - 1, 0) for i in range(n)]
+    total = sum(weights)
+    bounds, acc = [0], 0
+    for i, weight in enumerate(weights):
+        acc += weight
+        if acc >= total * len(bounds) / count and i + 1 < n:
+            bounds.append(i + 1)
+    bounds.append(n)
+    return [range(start, stop) for start, stop in zip(bounds, bounds[1:])]
+
+# find_combos_dp split across a process pool by the index of each combo's first item.
+#
+# every combo belongs to exactly one first-item subtree, and the serial dfs visits the subtrees in index
+# order, so concatenating the chunks in order and cutting at collect_limit gives the same combos as the
+# serial search. chunks are collected in order and once the finished ones reach collect_limit the rest
+# are cancelled.
+#
+# searches that are small, or that a short serial probe finishes, stay in-process: for those, starting
+# the pool work costs more than it saves. each chunk gets the remaining time and a worker's share of the
+# remaining nodes; if one runs out the combos found so far are returned and stats.truncated is set.
+def find_combos_parallel(items, macros, max_items, category_limits=None, collect_limit=500, stats=None,
+                         workers=None, repeats=None):
+    workers = COMBO_WORKERS if workers is None else workers
+    stats = stats or SearchStats()
+    if workers < 2 or len(items) < PARALLEL_MIN_ITEMS:
+        return find_combos_dp(items, macros, max_items, category_limits, collect_limit, stats, repeats=repeats)
+
+    remaining = stats.remaining
+    probe = SearchStats(PROBE_TIME if remaining is None else min(PROBE_TIME, remaining), stats.node_limit)
+    combos = find_combos_dp(items, macros, max_items, category_limits, collect_limit, probe, repeats=repeats)
+    stats.merge(dict(probe.as_dict(), truncated=False))
+    exhausted = stats.remaining == 0 or (stats.node_limit is not None and stats.nodes >= stats.node_limit)
+    if not probe.truncated or exhausted:
+        stats.truncated = probe.truncated
+        return combos
+
+    node_limit = None if stats.node_limit is None else max(stats.node_limit - stats.nodes, 0) // workers
+    pool = _get_pool(workers)
+    slot = _claim_slot()
+    futures = [
+        pool.submit(_search_roots, items, macros, max_items, category_limits, collect_limit,
+                    roots, stats.remaining, node_limit, slot, repeats)
+        for roots in _chunks(len(items), max_items, workers * TASKS_PER_WORKER)
+    ]
+
+    valid_combos = []
+    for future in futures:
+        found, task_stats = future.result()
+        stats.merge(task_stats)
+        valid_combos.extend([items[k] for k in combo] for combo in found)
+        if len(valid_combos) >= collect_limit or stats.truncated:
+            # later chunks can't change the result, stop the running ones and drop the queued ones
+            _cancel_flags[slot] = 1
+            for rest in futures:
+                rest.cancel()
+            break
+    return valid_combos[:collect_limit]
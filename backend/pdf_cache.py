@@ -1,9 +1,10 @@
 import pdfplumber
 import os
 import re
-import requests
-from bs4 import BeautifulSoup
-from database import db, MenuItem
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from database import db
+from cache import cache_restaurant
 
 PDF_DIR = "pdf_menus"
 
@@ -18,106 +19,33 @@ restaurant_files = {
 
 disallowed_categories = ["at participating locations", "catering", "trays"]
 
-# get restaurant's full menu from nutritionix.com/{slug}/menu/premium
-# returns (restaurant_name, items_list)
-def scrape_nutritionix_menu(slug):
-    url = f"https://www.nutritionix.com/{slug}/menu/premium"
-    headers = {"User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"}
-    r = requests.get(url, headers=headers, timeout=15)
-    if r.status_code != 200:
-        raise ValueError(f"Nutritionix returned {r.status_code} for '{slug}'")
-
-    soup = BeautifulSoup(r.text, "html.parser")
-
-    # get the restaurant name from the page
-    title = soup.title.string if soup.title else ""
-    title_match = re.match(r"^(.+?)\s+-\s+(Full|Interactive) Nutrition", title)
-    restaurant_name = title_match.group(1).strip() if title_match else slug.replace("-", " ").title()
-
-    # get the column ids for nutrition info
-    col_ids = {}
-    for th in soup.find_all("th", id=re.compile(r"^inmGrid_c\d+$")):
-        text = th.get_text(strip=True).lower()
-        col_id = th["id"].split("_")[1]  # e.g. "c1"
-        if "calorie" in text:
-            col_ids["calories"] = col_id
-        elif "total fat" in text:
-            col_ids["fat"] = col_id
-        elif "total carbohydrate" in text:
-            col_ids["carbs"] = col_id
-        elif "protein" in text:
-            col_ids["protein"] = col_id
-
-    if not col_ids:
-        raise ValueError(f"could not detect nutrition columns for '{slug}'")
-
-    items = []
-    current_category = "Other"
-
-    # go through all <tr> elements in order
-    for row in soup.find_all("tr"):
-        if "subCategory" in (row.get("class") or []):
-            h3 = row.find("h3")
-            if h3:
-                current_category = h3.get_text(strip=True)
-            continue
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS") or os.cpu_count() or 1)
+MIN_PAGES_PER_TASK = 4  # every task reopens its file and re-reads its fonts, so chunks stay a few pages long
 
-        name_td = row.find("td", class_="al")
-        if not name_td:
-            continue
+NAME_PATTERN = re.compile(
+    r'\d{1,2}/\d{1,2}/\d{2,4},\s*\d{1,2}:\d{2}\s*[AP]M\s+(.*?)\s+-\s+(Full|Interactive) Nutrition (Information|Menu)'
+)
 
-        name_link = name_td.find("a", class_="nmItem")
-        if not name_link:
-            continue
-        name = name_link.get("title") or name_link.get_text(strip=True)
-
-        def get_col(col_id):
-            td = row.find("td", headers=f"inmGrid_{col_id}")
-            return td.get_text(strip=True) if td else None
-
-        try:
-            calories = int(get_col(col_ids["calories"]).replace(",", ""))
-            fat      = float(get_col(col_ids["fat"]).replace(",", ""))
-            carbs    = float(get_col(col_ids["carbs"]).replace(",", ""))
-            protein  = float(get_col(col_ids["protein"]).replace(",", ""))
-        except (TypeError, ValueError, AttributeError):
-            continue
+# restaurant name from the header nutritionix prints on the first page
+def restaurant_name_from_page(page):
+    first_page_text = page.extract_text()
+    if not first_page_text:
+        return "unknown"
 
-        items.append({
-            "name": name,
-            "restaurant": restaurant_name,
-            "category": current_category,
-            "calories": calories,
-            "fat": fat,
-            "carbs": carbs,
-            "protein": protein,
-        })
-
-    if not items:
-        raise ValueError(f"No menu items found for '{slug}' — restaurant may not exist on Nutritionix")
+    # make one page
+    first_page_text = " ".join(first_page_text.splitlines())
+    first_page_text = re.sub(r'\s+', ' ', first_page_text)
 
-    return restaurant_name, items
+    # get the name using regex
+    match = NAME_PATTERN.search(first_page_text)
+    if match:
+        return match.group(1).strip()
+    else:
+        return "unknown"
 
 def get_restaurant_name(filepath):
     with pdfplumber.open(filepath) as pdf:
-        first_page_text = pdf.pages[0].extract_text()
-        if not first_page_text:
-            return "unknown"
-
-        # make one page
-        first_page_text = " ".join(first_page_text.splitlines())
-        first_page_text = re.sub(r'\s+', ' ', first_page_text)
-
-        # get the name using regex
-        match = re.search(
-            r'\d{1,2}/\d{1,2}/\d{2,4},\s*\d{1,2}:\d{2}\s*[AP]M\s+(.*?)\s+-\s+(Full|Interactive) Nutrition (Information|Menu)',
-            first_page_text
-        )
-
-        if match:
-            return match.group(1).strip()
-        else:
-            return "unknown"
+        return restaurant_name_from_page(pdf.pages[0])
         
 def get_indices(table):
     transposed = list(map(list, zip(*table)))
@@ -138,90 +66,157 @@ def get_indices(table):
 
     return col_map
 
-def parse_menu_pdf(filepath):
+# turn every page's tables (in page order) into menu items. the category carries over from one page
+# to the next, so this always runs over the whole file in order, however the pages were extracted
+def items_from_tables(restaurant_name, page_tables):
     menu_items = []
-    restaurant_name = get_restaurant_name(filepath)
-    with pdfplumber.open(filepath) as pdf:
-        for page in pdf.pages:
-            tables = page.extract_tables()
-            if not tables or not tables[0]:  # skip if tables is empty or first table is empty
-                continue
-            
-            # get indexes for calories, protein, carbs, and fat
-            col_map = get_indices(tables[0])
-                    
-            for table in tables:
-                for row in table[1:]:
-                    if not row or len(row) < 5:
-                        continue
-                    
-                    category_candidate = row[0].strip() if row[0] else ""
-
-                    # check if the row is a category header
-                    if not any(row[i] for i in col_map.values()) and category_candidate:
-                        last_category = category_candidate
-                        if "Veggie Cravings" in last_category: # taco bell is annoying
-                            last_category = "Veggie Cravings"
-                        continue  # skip the category header row itself
-
-                    # make sure row has nutrition info
-                    if not all(row[i] for i in col_map.values()):
-                        print("skipping bad row")
-                        continue
-                    
-                    # don't need disallowed categories
-                    if any(disallowed in last_category.lower() for disallowed in disallowed_categories):
-                        continue
-
-                    name = row[0].strip()
-                    try:
-                        calories = int(row[col_map["calories"]])
-                        fat = float(row[col_map["fat"]])
-                        carbs = float(row[col_map["carbs"]])
-                        protein = float(row[col_map["protein"]])
-                    except (ValueError, IndexError): # skip bad stuff that didnt get caught somehow
-                        continue 
-
-                    restaurant_name = restaurant_name[0].upper() + restaurant_name[1:]
-                    menu_items.append({
-                        "name": name,
-                        "restaurant": restaurant_name,
-                        "category": last_category if 'last_category' in locals() else "unknown",
-                        "calories": calories,
-                        "fat": fat,
-                        "carbs": carbs,
-                        "protein": protein
-                    })
+    last_category = None
+    restaurant_name = restaurant_name[:1].upper() + restaurant_name[1:]
+    for tables in page_tables:
+        if not tables or not tables[0]:  # skip if tables is empty or first table is empty
+            continue
+
+        # get indexes for calories, protein, carbs, and fat
+        col_map = get_indices(tables[0])
+
+        for table in tables:
+            for row in table[1:]:
+                if not row or len(row) < 5:
+                    continue
+
+                category_candidate = row[0].strip() if row[0] else ""
+
+                # check if the row is a category header
+                if not any(row[i] for i in col_map.values()) and category_candidate:
+                    last_category = category_candidate
+                    if "Veggie Cravings" in last_category: # taco bell is annoying
+                        last_category = "Veggie Cravings"
+                    continue  # skip the category header row itself
+
+                # make sure row has nutrition info
+                if not all(row[i] for i in col_map.values()):
+                    print("skipping bad row")
+                    continue
+
+                category = last_category if last_category is not None else "unknown"
+
+                # don't need disallowed categories
+                if any(disallowed in category.lower() for disallowed in disallowed_categories):
+                    continue
+
+                name = row[0].strip()
+                try:
+                    calories = int(row[col_map["calories"]])
+                    fat = float(row[col_map["fat"]])
+                    carbs = float(row[col_map["carbs"]])
+                    protein = float(row[col_map["protein"]])
+                except (ValueError, IndexError): # skip bad stuff that didnt get caught somehow
+                    continue 
+
+                menu_items.append({
+                    "name": name,
+                    "restaurant": restaurant_name,
+                    "category": category,
+                    "calories": calories,
+                    "fat": fat,
+                    "carbs": carbs,
+                    "protein": protein
+                })
 
     return menu_items
 
-def cache_restaurant(restaurant_name, items):
-    print(f"caching {restaurant_name}")
-    for item in items:
-        db.session.add(MenuItem(
-            restaurant=restaurant_name,
-            name=item["name"],
-            calories=item["calories"],
-            fat=item["fat"],
-            carbs=item["carbs"],
-            protein=item["protein"],
-            category=item["category"]
-        ))
-    db.session.commit()
-    print("cached new restaurant")
-
-def cache_first_restaurants(app):
+# parse one pdf in this process, opening it once for both the name and the tables
+def parse_menu_pdf(filepath):
+    with pdfplumber.open(filepath) as pdf:
+        restaurant_name = restaurant_name_from_page(pdf.pages[0])
+        page_tables = [page.extract_tables() for page in pdf.pages]
+    return items_from_tables(restaurant_name, page_tables)
+
+# pool task: tables for pages [start, stop) of one file, plus the restaurant name for the chunk with
+# page 0. each task opens the file once
+def _extract_pages(filepath, start, stop):
+    with pdfplumber.open(filepath) as pdf:
+        pages = pdf.pages[start:stop]
+        name = restaurant_name_from_page(pages[0]) if start == 0 else None
+        return name, [page.extract_tables() for page in pages]
+
+def _page_count(filepath):
+    with pdfplumber.open(filepath) as pdf:
+        return len(pdf.pages)
+
+def _print_progress(filepath, done, total):
+    print(f"{os.path.basename(filepath)}: {done}/{total} pages")
+
+# parse many pdfs at once. every file is split into chunks of pages and all the chunks go to one
+# process pool, so big files and several files share the workers; table extraction is the slow part.
+# yields (filepath, items) as each file finishes, with exactly what parse_menu_pdf returns for it.
+# progress(filepath, pages done, total pages) is called after every chunk. a file that fails to
+# parse is yielded with the exception in place of its items
+def parse_menu_pdfs(filepaths, workers=PDF_WORKERS, progress=_print_progress):
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+        # page counts come from the workers too, so the parent never parses a pdf itself
+        counts = {pool.submit(_page_count, path): path for path in filepaths}
+        chunks = {}
+        state = {}
+        for future in as_completed(counts):
+            path = counts[future]
+            try:
+                total = future.result()
+            except Exception as e:
+                yield path, e
+                continue
+            # at most one chunk per worker, so one big file still spreads over the whole pool
+            size = max(MIN_PAGES_PER_TASK, -(-total // workers))
+            starts = range(0, total, size)
+            state[path] = {"total": total, "done": 0, "name": "unknown", "pages": [None] * len(starts)}
+            for index, start in enumerate(starts):
+                stop = min(start + size, total)
+                chunks[pool.submit(_extract_pages, path, start, stop)] = (path, index, stop - start)
+
+        failed = set()
+        for future in as_completed(chunks):
+            path, index, size = chunks[future]
+            if path in failed:
+                continue
+            file = state[path]
+            try:
+                name, tables = future.result()
+            except Exception as e:
+                failed.add(path)
+                yield path, e
+                continue
+            if name is not None:
+                file["name"] = name
+            file["pages"][index] = tables
+            file["done"] += size
+            if progress:
+                progress(path, file["done"], file["total"])
+            if file["done"] == file["total"]:
+                page_tables = [tables for chunk in file["pages"] for tables in chunk]
+                yield path, items_from_tables(file["name"], page_tables)
+
+# parse pdfs and write each menu as soon as it's parsed. paths maps each file to the name to use if
+# the pdf doesn't give one. workers <= 1 parses them one by one in this process
+def cache_pdfs(app, paths, workers=PDF_WORKERS):
     with app.app_context():
-        for restaurant, filename in restaurant_files.items():
-            print(f"parsing {restaurant}")
-            full_path = f"{PDF_DIR}/{filename}"
-            items = parse_menu_pdf(full_path)
-            restaurant_name = items[0]["restaurant"] if items else restaurant
+        if workers <= 1:
+            parsed = ((path, parse_menu_pdf(path)) for path in paths)
+        else:
+            parsed = parse_menu_pdfs(list(paths), workers)
+        for path, items in parsed:
+            if isinstance(items, Exception):
+                print(f"failed to parse {path}: {items}")
+                continue
+            restaurant_name = items[0]["restaurant"] if items else paths[path]
             cache_restaurant(restaurant_name, items)
-        db.session.commit()
-        print("cached all restaurants")
 
+def cache_first_restaurants(app, workers=PDF_WORKERS):
+    cache_pdfs(app, {f"{PDF_DIR}/{filename}": restaurant for restaurant, filename in restaurant_files.items()}, workers)
+    print("cached all restaurants")
+
+# python pdf_cache.py [pdf dir]: the initial files, or every pdf in a folder
 if __name__ == "__main__":
+    import sys
     from flask import Flask
     from dotenv import load_dotenv
     load_dotenv()
@@ -229,4 +224,11 @@ if __name__ == "__main__":
     _app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///menu_items.db'
     _app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     db.init_app(_app)
-    cache_first_restaurants(_app)
+    if len(sys.argv) > 1:
+        folder = sys.argv[1]
+        cache_pdfs(_app, {
+            os.path.join(folder, name): os.path.splitext(name)[0].replace("-", " ")
+            for name in sorted(os.listdir(folder)) if name.lower().endswith(".pdf")
+        })
+    else:
+        cache_first_restaurants(_app)
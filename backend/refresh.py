@@ -0,0 +1,135 @@
+import os
+import time
+import random
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from database import db, Restaurant
+import metrics
+from cache import cache_restaurant, save_logo
+from menu_parser import parse_nutritionix_menu
+from scraper import fetch, content_hash, make_session, menu_url, RateLimiter, SCRAPE_WORKERS, REQUESTS_PER_SECOND
+
+REFRESH_INTERVAL = float(os.environ.get("MENU_REFRESH_INTERVAL") or 0)  # seconds, 0 turns the scheduler off
+REFRESH_JITTER = float(os.environ.get("MENU_REFRESH_JITTER") or 0.1)    # +/- fraction of the interval
+
+# conditional GET for one restaurant's page, run on the worker threads. returns (response or None, error)
+def _fetch_if_changed(slug, etag, last_modified, session, limiter, base_url):
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    try:
+        return fetch(menu_url(slug, base_url), session, limiter, headers=headers), None
+    except Exception as e:
+        return None, e
+
+# re-scrape every cached restaurant (or the given names), touching only what changed.
+#
+# each page is requested with the ETag / Last-Modified from its last scrape. a 304, or a 200 whose body
+# hashes the same as last time, skips parsing and writing entirely; otherwise the page is parsed and
+# diffed into the db with cache_restaurant(refresh=True). fetches run concurrently, writes happen here
+# as each page comes back. returns a report with bytes fetched, pages skipped and rows changed.
+def refresh_restaurants(app, names=None, workers=SCRAPE_WORKERS, rate=REQUESTS_PER_SECOND, base_url=None):
+    start = time.perf_counter()
+    report = {
+        "restaurants": 0, "bytes_fetched": 0, "not_modified": 0, "unchanged": 0, "updated": 0, "failed": {},
+        "rows": {"inserted": 0, "updated": 0, "deleted": 0},
+    }
+    with app.app_context():
+        query = Restaurant.query.filter(Restaurant.item_count > 0)
+        if names is not None:
+            query = query.filter(Restaurant.name.in_(names))
+        targets = [(r.id, r.slug, r.etag, r.last_modified) for r in query.all()]
+        report["restaurants"] = len(targets)
+
+        session = make_session(workers)
+        limiter = RateLimiter(rate)
+        with session, ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(_fetch_if_changed, slug, etag, last_modified, session, limiter, base_url): (rid, slug)
+                for rid, slug, etag, last_modified in targets
+            }
+            for future in as_completed(futures):
+                rid, slug = futures[future]
+                r, error = future.result()
+                try:
+                    if error:
+                        raise error
+                    _apply(db.session.get(Restaurant, rid), slug, r, report)
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"failed to refresh {slug}: {e}")
+                    report["failed"][slug] = str(e)
+
+    report["elapsed_s"] = round(time.perf_counter() - start, 2)
+    print(f"refreshed {report['restaurants']} restaurants in {report['elapsed_s']}s: "
+          f"{report['bytes_fetched']} bytes, {report['not_modified']} not modified, "
+          f"{report['unchanged']} unchanged, {report['updated']} updated, {len(report['failed'])} failed, "
+          f"rows {report['rows']}")
+    return report
+
+def _apply(restaurant, slug, r, report):
+    restaurant.scraped_at = datetime.now(timezone.utc)
+    if r.status_code == 304:
+        report["not_modified"] += 1
+        db.session.commit()
+        return
+
+    report["bytes_fetched"] += len(r.content)
+    restaurant.etag = r.headers.get("ETag")
+    restaurant.last_modified = r.headers.get("Last-Modified")
+    digest = content_hash(r.content)
+    if digest == restaurant.content_hash:
+        report["unchanged"] += 1
+        db.session.commit()
+        return
+
+    with metrics.scrape_seconds.time("parse"):
+        restaurant_name, items, logo_url = parse_nutritionix_menu(r.text, slug)
+    restaurant.content_hash = digest
+    counts = cache_restaurant(restaurant.name, items, refresh=True)
+    if logo_url and logo_url != restaurant.logo:
+        save_logo(restaurant.name, logo_url)
+    report["updated"] += 1
+    for key in report["rows"]:
+        report["rows"][key] += counts[key]
+
+# background thread that refreshes every menu each `interval` seconds, give or take `jitter` of it so
+# several servers don't all hit nutritionix at once. the latest report is kept on `last_report`
+class RefreshScheduler:
+    def __init__(self, app, interval=REFRESH_INTERVAL, jitter=REFRESH_JITTER, **refresh_options):
+        self.app = app
+        self.interval = interval
+        self.jitter = jitter
+        self.refresh_options = refresh_options
+        self.last_report = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def next_delay(self):
+        return self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def start(self):
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="menu-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.next_delay()):
+            try:
+                self.last_report = refresh_restaurants(self.app, **self.refresh_options)
+            except Exception as e:
+                print(f"menu refresh failed: {e}")
+
+if __name__ == "__main__":
+    from app import app
+    refresh_restaurants(app)
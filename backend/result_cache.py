@@ -0,0 +1,148 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from combos import safe_float
+import metrics
+
+RESULT_CACHE_MAX_BYTES = 128 * 1024 * 1024
+RESULT_CACHE_TABLE_BYTES = 48 * 1024 * 1024  # of which samplers' counting tables (up to ~16 MB each) may hold
+RESULT_CACHE_TTL = 600  # seconds
+
+MACRO_PARAMS = ["calorieMin", "calorieMax", "proteinMin", "proteinMax", "fatMin", "fatMax", "carbMin", "carbMax"]
+
+# canonical cache key for a query, so "500" and 500.0, or categories in a different order, hit the same entry
+def query_key(route, restaurant, macros=None, categories=None, excluded=None, max_items=None, category_limits=None):
+    macros = macros or {}
+    limits = tuple(sorted(
+        (cat, limits.get("min"), limits.get("max"))
+        for cat, limits in (category_limits or {}).items()
+        if limits.get("min") is not None or limits.get("max") is not None
+    ))
+    return (
+        route,
+        restaurant,
+        tuple(safe_float(macros.get(key)) for key in MACRO_PARAMS),
+        tuple(sorted(set(categories or []))),
+        tuple(sorted(set(excluded or []))),
+        max_items,
+        limits,
+    )
+
+# rough memory footprint of a cached value. menu rows are shared with the snapshot so only the
+# containers holding them are counted, plus anything that reports its own nbytes (samplers)
+def approx_size(value):
+    if hasattr(value, "nbytes"):
+        return value.nbytes
+    if isinstance(value, list):
+        return sys.getsizeof(value) + sum(approx_size(v) for v in value if isinstance(v, list) or hasattr(v, "nbytes"))
+    return 0
+
+# thread-safe LRU cache with a memory cap and a TTL. keys start with (route, restaurant, ...)
+# so entries can be dropped per restaurant when its menu changes. entries put with tables=True (samplers)
+# also count against max_table_bytes, so a handful of them can't push every other result out. invalidate() also bumps the
+# restaurant's generation: callers read generation() before loading the menu and pass it to put(),
+# which skips the value if the menu changed while it was being computed
+class ResultCache:
+    def __init__(self, max_bytes=RESULT_CACHE_MAX_BYTES, ttl=RESULT_CACHE_TTL, clock=time.monotonic,
+                 max_table_bytes=RESULT_CACHE_TABLE_BYTES):
+        self.max_bytes = max_bytes
+        self.max_table_bytes = max_table_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (value, size, expires, tables)
+        self._bytes = 0
+        self._table_bytes = 0
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped by invalidate() with no restaurant
+        self._generations = {}  # restaurant -> bumped by invalidate(restaurant)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, expires, _ = entry
+            if expires <= self.clock():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def generation(self, restaurant):
+        return self._generation, self._generations.get(restaurant, 0)
+
+    def put(self, key, value, size=None, generation=None, tables=False):
+        size = approx_size(value) if size is None else size
+        if size > (self.max_table_bytes if tables else self.max_bytes):
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation(key[1]):
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, size, self.clock() + self.ttl, tables)
+            self._bytes += size
+            if tables:
+                self._table_bytes += size
+                while self._table_bytes > self.max_table_bytes:
+                    self._drop(next(k for k, entry in self._entries.items() if entry[3]))
+                    self.evictions += 1
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    # drop every entry for a restaurant (or everything if no restaurant is given)
+    def invalidate(self, restaurant=None):
+        with self._lock:
+            if restaurant is None:
+                self._generation += 1
+            else:
+                self._generations[restaurant] = self._generations.get(restaurant, 0) + 1
+            for key in [k for k in self._entries if restaurant is None or k[1] == restaurant]:
+                self._drop(key)
+
+    def _drop(self, key):
+        _, size, _, tables = self._entries.pop(key)
+        self._bytes -= size
+        if tables:
+            self._table_bytes -= size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "table_bytes": self._table_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+# process-wide cache shared by the query routes
+results = ResultCache()
+
+# read when /metrics is scraped; the hit ratio is over the process's lifetime
+for name, kind, help in (
+    ("hits", "counter", "Result cache lookups that hit."),
+    ("misses", "counter", "Result cache lookups that missed, expired entries included."),
+    ("evictions", "counter", "Result cache entries evicted to stay under the memory cap."),
+    ("expirations", "counter", "Result cache entries dropped on lookup after their TTL."),
+    ("entries", "gauge", "Entries in the result cache."),
+    ("bytes", "gauge", "Approximate bytes held by the result cache."),
+    ("table_bytes", "gauge", "Bytes of sampler counting tables in the result cache, part of bytes."),
+    ("hit_rate", "gauge", "Fraction of result cache lookups that hit."),
+):
+    metrics.CallbackMetric(f"result_cache_{name}" + ("_total" if kind == "counter" else ""), help, kind,
+                           lambda name=name: results.stats()[name])
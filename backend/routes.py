@@ -1,52 +1,47 @@
-from flask import Blueprint, request, jsonify
-from database import db, MenuItem
-from sqlalchemy import desc, and_
-from cache import scrape_nutritionix_menu, cache_restaurant, save_logo, load_logos
-import re
-import os
-import requests
+from flask import Blueprint, request, jsonify, current_app, redirect, url_for
+import metadata
+from database import db, MenuItem, Restaurant, clean_name
+from cache import cache_restaurant, save_logo
+from scraper import fetch, menu_url
+from menu_parser import parse_nutritionix_menu
+from logos import logo_cache, logo_version, LOGO_PROXY
+from jobs import jobs, JobError, FETCHING, PARSING, STORING
+from snapshot import get_snapshot, get_catalog
+from combos import find_closest_combos, find_combos_dp, SearchStats, safe_float
+from parallel import find_combos_parallel
+from sampling import ComboSampler
+from result_cache import results, query_key, approx_size, MACRO_PARAMS
+from frontier import get_frontier, schedule_build
+from combo_index import get_index, IndexMatches
+from equivalence import ItemClasses, ClassCombos
+import metrics
 import random
 import time
+import threading
+import queue
+import json
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 
 routes = Blueprint('routes', __name__)
 
+COLLECT_LIMIT = 500  # combos the dfs collects before sampling from them
+DEFAULT_TIME_LIMIT = 2.0  # seconds of combo search per request
+MAX_TIME_LIMIT = 10.0
+DEFAULT_NODE_LIMIT = 5_000_000
+MAX_BATCH_SPECS = 64
+MAX_SEARCH_RESULTS = 500  # items per search_items response
+MAX_BATCH_TIME_LIMIT = 20.0  # seconds for a whole get_combos_batch request
+BATCH_WORKERS = 4  # threads for a parallel batch
+
 @routes.route('/api/items')
 def get_items():
     restaurant = request.args.get('restaurant', '')
     num_items = request.args.get('num')
     num_items = int(num_items)
 
-    filters = [MenuItem.restaurant == restaurant]
-
-    # add all of the macro filters to filters arr
-    if request.args.get("calorieMax"):
-        filters.append(MenuItem.calories <= int(request.args.get("calorieMax")))
-    if request.args.get("calorieMin"):
-        filters.append(MenuItem.calories >= int(request.args.get("calorieMin")))
-
-    if request.args.get("proteinMax"):
-        filters.append(MenuItem.protein <= int(request.args.get("proteinMax")))
-    if request.args.get("proteinMin"):
-        filters.append(MenuItem.protein >= int(request.args.get("proteinMin")))
-
-    if request.args.get("fatMax"):
-        filters.append(MenuItem.fat <= int(request.args.get("fatMax")))
-    if request.args.get("fatMin"):
-        filters.append(MenuItem.fat >= int(request.args.get("fatMin")))
-
-    if request.args.get("carbMax"):
-        filters.append(MenuItem.carbs <= int(request.args.get("carbMax")))
-    if request.args.get("carbMin"):
-        filters.append(MenuItem.carbs >= int(request.args.get("carbMin")))
-
-    # add category filters to filters arr
     categories = request.args.getlist("categories")
-    if categories:
-        filters.append(MenuItem.category.in_(categories))
-
     excluded = request.args.getlist("exclude")
-    if excluded:
-        filters.append(~MenuItem.name.in_(excluded))
 
     macros = {
         "calorieMin": request.args.get("calorieMin"),
@@ -59,20 +54,26 @@ def get_items():
         "carbMax":    request.args.get("carbMax"),
     }
 
-    # query by what is in the filters arr
-    items_query = MenuItem.query.filter(and_(*filters))
-    items = items_query.all()
-
-    closest = False
-    if not items:
-        # fall back to all items for this restaurant/categories, scored by distance
-        closest = True
-        base_filters = [MenuItem.restaurant == restaurant]
-        if categories:
-            base_filters.append(MenuItem.category.in_(categories))
-        items = MenuItem.query.filter(and_(*base_filters)).all()
-        items.sort(key=lambda item: item_distance(item, macros))
-
+    # cached per normalized query; exact matches are re-sampled on every hit, closest
+    # matches are ranked once for the largest num asked for so far
+    key = query_key("items", restaurant, macros, categories, excluded)
+    cached = results.get(key)
+    if cached is None or (cached[1] and cached[2] and (not num_items or num_items > cached[2])):
+        # filter the restaurant's in-memory snapshot by macros, categories and exclusions
+        generation = results.generation(restaurant)
+        snapshot = get_snapshot(restaurant)
+        items = snapshot.filter(macros, categories, excluded)
+
+        closest = False
+        if not items:
+            # fall back to the items for this restaurant/categories closest to the macro ranges
+            closest = True
+            items = snapshot.closest(macros, categories, num_items)
+
+        cached = (items, closest, num_items)
+        results.put(key, cached, approx_size(items), generation)
+
+    items, closest, _ = cached
     if num_items:
         if num_items < len(items):
             items = random.sample(items, num_items) if not closest else items[:num_items]
@@ -91,38 +92,74 @@ def get_items():
         "closest": closest,
     })
   
-@routes.route('/api/make_combo')
-def make_combo():
-    restaurant = request.args.get('restaurant', '')
-    shuffle_num = int(request.args.get('num'))
+# /api/items across every cached restaurant (or the `restaurants` allow-list) in one vectorized pass
+# over the catalog. exact matches are a random sample of `num`, or the top `num` by `optimize`
+# ("protein" or "calories", like get_combos); with no exact match it falls back to the items closest to
+# the macro ranges, by the same distance as /api/items. each item says which restaurant it's from
+@routes.route('/api/search_items')
+def search_items():
+    num = min(int(request.args.get("num") or 20), MAX_SEARCH_RESULTS)
+    macros = {key: request.args.get(key) for key in MACRO_PARAMS}
+    restaurants = request.args.getlist("restaurants")
+    categories = request.args.getlist("categories")
+    optimize = request.args.get("optimize")
 
-    filters = [MenuItem.restaurant == restaurant]
+    catalog = get_catalog()
+    scope = catalog.restaurant_mask(restaurants) if restaurants else None
+    matches = catalog.mask(macros, categories)
+    if scope is not None:
+        matches &= scope
+    rows = np.flatnonzero(matches)
 
-    # add all of the macro filters to filters arr (only max to build a combo)
-    if request.args.get("calorieMax"):
-        filters.append(MenuItem.calories <= int(request.args.get("calorieMax")))
+    closest = not len(rows)
+    if closest:
+        rows = catalog.closest_rows(macros, categories, num, scope)
+    elif optimize in OPTIMIZE:
+        rows = best_rows(catalog, rows, optimize, num)
+    elif num < len(rows):
+        rows = np.sort(np.random.choice(rows, num, replace=False))
 
-    if request.args.get("proteinMax"):
-        filters.append(MenuItem.protein <= int(request.args.get("proteinMax")))
+    return jsonify({
+        "items": [
+            {
+                "restaurant": catalog.restaurant_names[catalog.restaurant_codes[i]],
+                "name": item.name,
+                "calories": item.calories,
+                "protein": item.protein,
+                "carbs": item.carbs,
+                "fat": item.fat,
+                "category": item.category
+            } for i, item in ((i, catalog.items[i]) for i in rows.tolist())
+        ],
+        "closest": closest,
+    })
 
-    if request.args.get("fatMax"):
-        filters.append(MenuItem.fat <= int(request.args.get("fatMax")))
+# the num best of the given rows by an OPTIMIZE objective, ties by catalog order. argpartition finds
+# the cut-off on the first key so only the rows that reach it get sorted
+def best_rows(snapshot, rows, optimize, num):
+    protein, calories = np.nan_to_num(snapshot.protein[rows]), np.nan_to_num(snapshot.calories[rows])
+    first, second = (-protein, calories) if optimize == "protein" else (calories, -protein)
+    if num < len(rows):
+        keep = first <= first[np.argpartition(first, num - 1)[num - 1]]
+        rows, first, second = rows[keep], first[keep], second[keep]
+    return rows[np.lexsort((rows, second, first))][:num]
 
-    if request.args.get("carbMax"):
-        filters.append(MenuItem.carbs <= int(request.args.get("carbMax")))
+@routes.route('/api/make_combo')
+def make_combo():
+    restaurant = request.args.get('restaurant', '')
+    shuffle_num = int(request.args.get('num'))
 
-    # add category filters to filters arr
+    macros = {
+        "calorieMax": request.args.get("calorieMax"),
+        "proteinMax": request.args.get("proteinMax"),
+        "fatMax":     request.args.get("fatMax"),
+        "carbMax":    request.args.get("carbMax"),
+    }
     categories = request.args.getlist("categories")
-    if categories:
-        filters.append(MenuItem.category.in_(categories))
-
     excluded = request.args.getlist("exclude")
-    if excluded:
-        filters.append(~MenuItem.name.in_(excluded))
 
-    # query by what is in the filters arr
-    items_query = MenuItem.query.filter(and_(*filters))
-    items = items_query.all()
+    # only max filters to build a combo
+    items = get_snapshot(restaurant).filter(macros, categories, excluded, use_min=False)
 
     if shuffle_num:
         if shuffle_num < len(items):
@@ -139,55 +176,6 @@ def make_combo():
         } for item in items
     ])
     
-from flask import request, jsonify
-
-#  how much each macro is outside its target range
-def macro_distance(totals, macros):
-    d = 0
-    checks = [
-        (totals.get("calories"), "calorieMin", "calorieMax"),
-        (totals.get("protein"),  "proteinMin", "proteinMax"),
-        (totals.get("fat"),      "fatMin",     "fatMax"),
-        (totals.get("carbs"),    "carbMin",    "carbMax"),
-    ]
-    for val, min_key, max_key in checks:
-        if val is None:
-            continue
-        min_val = safe_float(macros.get(min_key))
-        max_val = safe_float(macros.get(max_key))
-        if min_val is not None and val < min_val:
-            d += min_val - val
-        elif max_val is not None and val > max_val:
-            d += val - max_val
-    return d
-
-def item_distance(item, macros):
-    return macro_distance({
-        "calories": item.calories or 0,
-        "protein":  item.protein  or 0,
-        "fat":      item.fat      or 0,
-        "carbs":    item.carbs    or 0,
-    }, macros)
-
-def safe_float(val):
-    try:
-        return float(val)
-    except (TypeError, ValueError):
-        return None
-
-def violates_max(item, key, max_key, macros):
-    max_val = safe_float(macros.get(max_key))
-    return max_val is not None and getattr(item, key) > max_val
-
-# returns whether an item is valid for a combo
-def is_valid_item(item, macros):
-    return not (
-        violates_max(item, "calories", "calorieMax", macros) or
-        violates_max(item, "protein", "proteinMax", macros) or
-        violates_max(item, "fat", "fatMax", macros) or
-        violates_max(item, "carbs", "carbMax", macros)
-    )
-
 # json formating for combos
 def format_combo(combo):
     return {
@@ -210,170 +198,373 @@ def format_combo(combo):
         }
     }
 
-# f(i, j) = all valid combos from items[i:] given accumulated macro totals j = (cal, prot, fat, carb).
-# each call either skips items[i] (implicit, via loop advancing to i+1) or includes it and recurses.
-# combo and cat_counts are mutated in-place and restored after each branch (append/pop).
-# valid_combos is a shared collector; collect_limit provides early termination.
-def find_combos_dp(items, macros, max_items, category_limits=None, collect_limit=500):
-    cal_max  = safe_float(macros.get("calorieMax"))
-    prot_max = safe_float(macros.get("proteinMax"))
-    fat_max  = safe_float(macros.get("fatMax"))
-    carb_max = safe_float(macros.get("carbMax"))
-    cal_min  = safe_float(macros.get("calorieMin"))
-    prot_min = safe_float(macros.get("proteinMin"))
-    fat_min  = safe_float(macros.get("fatMin"))
-    carb_min = safe_float(macros.get("carbMin"))
-    cat_lim  = category_limits or {}
-
-    valid_combos = []
-    n = len(items)
-
-    def meets_min(cal, prot, fat, carb):
-        if cal_min  is not None and cal  < cal_min:  return False
-        if prot_min is not None and prot < prot_min: return False
-        if fat_min  is not None and fat  < fat_min:  return False
-        if carb_min is not None and carb < carb_min: return False
-        return True
-
-    def meets_category_min(cat_counts):
-        for cat, limits in cat_lim.items():
-            min_cat = limits.get("min")
-            if min_cat is not None and cat_counts.get(cat, 0) < min_cat:
-                return False
-        return True
-
-    # f(i, j): collect valid combos from items[i:] with accumulated totals j
-    def f(i, count, cal, prot, fat, carb, combo, cat_counts):
-        if len(valid_combos) >= collect_limit:
-            return
-
-        if count >= 2 and meets_min(cal, prot, fat, carb) and meets_category_min(cat_counts):
-            valid_combos.append(list(combo))
-            if len(valid_combos) >= collect_limit:
-                return
-
-        if count >= max_items:
-            return
-
-        for i in range(i, n):
-            if len(valid_combos) >= collect_limit:
-                return
-
-            item = items[i]
-            cat = item.category or ""
-
-            # prune if this category already hit its max
-            if cat_lim.get(cat, {}).get("max") is not None:
-                if cat_counts.get(cat, 0) >= cat_lim[cat]["max"]:
-                    continue
-
-            new_cal  = cal  + (item.calories or 0)
-            new_prot = prot + (item.protein  or 0)
-            new_fat  = fat  + (item.fat      or 0)
-            new_carb = carb + (item.carbs    or 0)
-
-            if cal_max  is not None and new_cal  > cal_max:  break
-            if prot_max is not None and new_prot > prot_max: continue
-            if fat_max  is not None and new_fat  > fat_max:  continue
-            if carb_max is not None and new_carb > carb_max: continue
-
-            cat_counts[cat] = cat_counts.get(cat, 0) + 1
-            combo.append(item)
-            f(i + 1, count + 1, new_cal, new_prot, new_fat, new_carb, combo, cat_counts)
-            combo.pop()
-            cat_counts[cat] -= 1
-            if cat_counts[cat] == 0:
-                del cat_counts[cat]
-
-    f(0, 0, 0, 0, 0, 0, [], {})
-    return valid_combos
-
-# there there are no exact combos exist, get all combos ignoring max constraints and return the closest ones
-def find_closest_combos(items, macros, max_items, category_limits=None, collect_limit=300):
-
-    # relax max constraints so the DFS doesn't prune on them
-    relaxed = dict(macros)
-    for key in ("calorieMax", "proteinMax", "fatMax", "carbMax"):
-        relaxed[key] = None
-
-    combos = find_combos_dp(items, relaxed, max_items, category_limits, collect_limit)
-
-    if not combos:
-        # also relax min constraints as a last resort
-        empty = {k: None for k in macros}
-        combos = find_combos_dp(items, empty, max_items, category_limits, collect_limit)
-
-    def combo_dist(combo):
-        return macro_distance({
-            "calories": sum(i.calories or 0 for i in combo),
-            "protein":  sum(i.protein  or 0 for i in combo),
-            "fat":      sum(i.fat      or 0 for i in combo),
-            "carbs":    sum(i.carbs    or 0 for i in combo),
-        }, macros)
-
-    combos.sort(key=combo_dist)
-    return combos
+# the fields of a combo query, from a get_combos body or one spec of a batch (which falls back to
+# the batch's own fields for anything it leaves out)
+def combo_query(spec, defaults=None):
+    defaults = defaults or {}
+    value = lambda key, default: spec[key] if key in spec else defaults.get(key, default)
+    return {
+        "macros": value("macros", None),
+        "categories": value("categories", []),
+        "excluded": value("excluded", []),
+        "num": value("num", 10),
+        "max_items": value("maxItems", 5),
+        # e.g. {"entree": {"min": 1, "max": 1}, "side": {"max": 2}}
+        "category_limits": value("categoryLimits", {}),
+        # "protein" or "calories": the best combos by that macro when the frontier can answer the query
+        # (see frontier_combos), otherwise the usual random sample sorted by it
+        "optimize": value("optimize", None),
+    }
 
 @routes.route('/api/get_combos', methods=['POST'])
 def get_combos():
     data = request.get_json()
-    categories = data.get("categories", [])
     restaurant = data.get("restaurant")
-    macros = data.get("macros")
-    num = data.get("num", 10)
-    max_items = data.get("maxItems", 5)
-    # e.g. {"entree": {"min": 1, "max": 1}, "side": {"max": 2}}
-    category_limits = data.get("categoryLimits", {})
-    excluded = data.get("excluded", [])
-
-    query = MenuItem.query
-    if restaurant:
-        query = query.filter_by(restaurant=restaurant)
-    if categories:
-        query = query.filter(MenuItem.category.in_(categories))
-    if excluded:
-        query = query.filter(~MenuItem.name.in_(excluded))
-
-    all_items = query.all()
-
-    # filter out items that individually exceed any max constraint
-    filtered_items = [item for item in all_items if is_valid_item(item, macros)]
-
-    # shuffle first so collect_limit samples are diverse, then sort by calories
-    # for the break-pruning optimisation in find_combos_dp
-    random.shuffle(filtered_items)
-    filtered_items.sort(key=lambda x: (x.calories or 0))
-
-    valid_combos = find_combos_dp(filtered_items, macros, max_items=max_items, category_limits=category_limits)
-
-    closest = False
-    if not valid_combos:
-        closest = True
-        # use all items (not just individually valid ones) for the relaxed search
-        all_shuffled = list(all_items)
-        random.shuffle(all_shuffled)
-        all_shuffled.sort(key=lambda x: (x.calories or 0))
-        valid_combos = find_closest_combos(all_shuffled, macros, max_items, category_limits)
-
-    print(f"combos found: {len(valid_combos)}, closest={closest}")
+    query = combo_query(data)
+
+    # per-request search budget, clients can lower it but not raise it past the server cap
+    time_limit = min(float(data.get("timeLimitMs") or DEFAULT_TIME_LIMIT * 1000) / 1000, MAX_TIME_LIMIT)
+    node_limit = min(int(data.get("nodeLimit") or DEFAULT_NODE_LIMIT), DEFAULT_NODE_LIMIT)
+    stats = SearchStats(time_limit, node_limit)
+
+    generation = results.generation(restaurant)
+    return jsonify(answer_combo_query(get_snapshot(restaurant), generation, restaurant, query, stats,
+                                      data.get("stats")))
+
+# run one combo query against a snapshot and build its response. generation is the result cache's
+# generation for the restaurant from before the snapshot was fetched, so a pool searched on a menu
+# that has since changed isn't cached. order is the snapshot rows in the query's categories, in search
+# order (see calorie_order); a batch passes it in to build it only once
+def answer_combo_query(snapshot, generation, restaurant, query, stats, include_stats=False, order=None):
+    macros, num, max_items, category_limits = query["macros"], query["num"], query["max_items"], query["category_limits"]
+    optimize = query.get("optimize") if query.get("optimize") in OPTIMIZE else None
+
+    if optimize:
+        best = frontier_combos(snapshot, query, optimize)
+        if best is not None:
+            metrics.record_search("frontier", stats, len(best))
+            response = {"combos": [format_combo(combo) for combo in best], "closest": False, "truncated": False}
+            if include_stats:
+                response["stats"] = {"engine": "frontier", "cached": True, **stats.as_dict()}
+            return response
+
+    # cached per normalized query; every hit draws a fresh random sample from the cached pool
+    key = query_key("combos", restaurant, macros, query["categories"], query["excluded"], max_items, category_limits)
+    pool = results.get(key)
+    cached = pool is not None
+    result = draw_combos(pool, num) if cached else None
+    if result is None and stats.truncated:
+        # no budget left (the last specs of a batch that ran out of time), so don't start a search
+        cached, pool, result = False, ([], False, None), []
+    elif result is None:
+        cached = False
+        if order is None:
+            order = search_order(snapshot, query["categories"], query["excluded"])
+        # a sampler that keeps rejecting draws is replaced by an enumerated pool
+        use_sampler = pool is None or not isinstance(pool[0], ComboSampler)
+        pool = find_combo_pool(snapshot, order, macros, max_items, category_limits, num, stats, use_sampler)
+        result = draw_combos(pool, num)
+        if result is None:
+            pool = find_combo_pool(snapshot, order, macros, max_items, category_limits, num, stats,
+                                   use_sampler=False)
+            result = draw_combos(pool, num)
+        # a search cut short by its budget isn't worth replaying to the next caller
+        if not stats.truncated:
+            results.put(key, pool, pool_size(pool), generation, tables=isinstance(pool[0], ComboSampler))
+
+    combos, closest, _ = pool
+    engine = ("closest" if closest else "sampler" if isinstance(combos, ComboSampler) else
+              "index" if isinstance(combos, IndexMatches) else "dfs")
+    metrics.record_search(engine, stats, len(result), cached)
+
+    if optimize and not closest:
+        result = sorted(result, key=OPTIMIZE[optimize])
+    response = {
+        "combos": [format_combo(combo) for combo in result],
+        "closest": closest,
+        "truncated": stats.truncated,
+    }
+    if include_stats:
+        response["stats"] = {"engine": engine, "cached": cached, **stats.as_dict()}
+    return response
+
+# sort keys for "optimize": most protein (then fewest calories) or fewest calories (then most protein)
+OPTIMIZE = {
+    "protein":  lambda combo: (-sum(item.protein or 0 for item in combo), sum(item.calories or 0 for item in combo)),
+    "calories": lambda combo: (sum(item.calories or 0 for item in combo), -sum(item.protein or 0 for item in combo)),
+}
+
+# answer an "optimize" query from the restaurant's pareto frontier (frontier.py) when it can:
+# only max calories/fat/carbs and min protein, over the whole menu with no exclusions or category
+# limits, no more items than the frontier covers and no more than its depth of combos. for those, every
+# combo that beats a valid one in every macro is valid too, so the best `num` are all in the stored
+# layers. returns None to fall back to the search, and starts building the frontier if there isn't one
+def frontier_combos(snapshot, query, optimize):
+    macros = query["macros"] or {}
+    if not len(snapshot) or query["excluded"] or any(
+        limits.get("min") is not None or limits.get("max") is not None
+        for limits in (query["category_limits"] or {}).values()
+    ):
+        return None
+    if query["categories"] and not set(snapshot.category_names) <= set(query["categories"]):
+        return None
+    bounds = {key: safe_float(macros.get(key)) for key in MACRO_PARAMS}
+    # mins of 0 or less hold for every combo anyway
+    if bounds["proteinMax"] is not None or any(
+        bounds[key] is not None and bounds[key] > 0 for key in ("calorieMin", "fatMin", "carbMin")
+    ):
+        return None
 
-    if closest:
-        result = valid_combos[:num]
+    frontier = get_frontier(snapshot)
+    if frontier is None:
+        schedule_build(current_app._get_current_object(), snapshot.restaurant)
+        return None
+    if query["max_items"] > frontier.max_items or query["num"] > frontier.depth:
+        return None
+    ids = frontier.query(query["max_items"], bounds["calorieMax"], bounds["proteinMin"], bounds["fatMax"],
+                         bounds["carbMax"], optimize, query["num"])
+    if not ids:
+        return None  # nothing fits, the search falls back to the closest combos
+    by_id = {item.id: item for item in snapshot.items}
+    return [[by_id[i] for i in combo] for combo in ids]
+
+# snapshot rows in the given categories (minus excluded items) in the order the combo search wants them:
+# shuffled first so collect_limit samples are diverse, then sorted by calories for the break-pruning
+# optimisation in find_combos_dp
+def search_order(snapshot, categories, excluded):
+    rows = np.flatnonzero(snapshot.mask(categories=categories, excluded=excluded))
+    np.random.shuffle(rows)
+    return rows[np.argsort(np.nan_to_num(snapshot.calories[rows]), kind="stable")]
+
+# everything needed to answer a combo query, cached between requests as (pool, closest, num):
+# the combos a precomputed index matched, a ComboSampler over the feasible set, the list of combos the
+# dfs collected, or the closest combos when nothing fits (ranked for `num`, so a bigger num needs a new search)
+# stats carries the request's search budget, when it runs out the pool holds whatever was found so far
+def find_combo_pool(snapshot, order, macros, max_items, category_limits, num, stats, use_sampler=True):
+    # filter out items that individually exceed any max constraint, keeping the search order
+    under_max = snapshot.mask(macros, use_min=False)
+    filtered_items = [snapshot.items[i] for i in order[under_max[order]]]
+
+    valid_combos = None
+    # restaurants with a combo index (combo_index.py) answer small enough combos by a range lookup
+    index = get_index(snapshot)
+    if index is not None and max_items <= index.max_items:
+        allowed = np.zeros(len(snapshot), dtype=bool)
+        allowed[order[under_max[order]]] = True
+        rows = index.query(macros or {}, max_items, allowed, snapshot.category_codes, snapshot.category_names,
+                           category_limits)
+        if len(rows):
+            return (IndexMatches(index, rows, snapshot.items), False, None)
+        valid_combos = []
+    elif use_sampler:
+        # draw uniformly from the whole feasible set when it's too big to enumerate;
+        # small sets (or grids too coarse to sample from) are collected by the dfs instead
+        sampler = ComboSampler(filtered_items, macros, max_items, category_limits)
+        if sampler.total == 0:
+            valid_combos = []
+        elif sampler.total is not None and sampler.total > COLLECT_LIMIT:
+            return (sampler, False, None)
+    if valid_combos is None:
+        # search over classes of interchangeable items, the pool expands combos to concrete items as
+        # they're drawn
+        classes = ItemClasses(filtered_items, category_limits, max_items)
+        valid_combos = find_combos_parallel(classes.items, macros, max_items=max_items,
+                                            category_limits=category_limits, collect_limit=COLLECT_LIMIT, stats=stats,
+                                            repeats=classes.repeats)
+        if valid_combos:
+            return (ClassCombos(valid_combos, classes), False, None)
+    if valid_combos:
+        return (valid_combos, False, None)
+
+    # use all items (not just individually valid ones) for the relaxed search
+    classes = ItemClasses([snapshot.items[i] for i in order], category_limits, max_items)
+    closest = find_closest_combos(classes.items, macros, max_items, category_limits, num, stats, classes.repeats)
+    return ([classes.expand(combo) for combo in closest], True, num)
+
+# get_combos that sends each combo as soon as the search finds it, as newline-delimited json or, with
+# ?format=sse or Accept: text/event-stream, as server-sent events. takes the same body as get_combos;
+# up to `num` (max 500) combos are streamed in search order rather than sampled, then a summary record.
+# when nothing fits, the closest combos are sent after the search ends and the summary says closest.
+# the search runs on its own thread and stops when the client goes away
+@routes.route('/api/get_combos_stream', methods=['POST'])
+def get_combos_stream():
+    data = request.get_json()
+    restaurant = data.get("restaurant")
+    query = combo_query(data)
+    query["num"] = max(min(int(query["num"]), COLLECT_LIMIT), 1)
+
+    time_limit = min(float(data.get("timeLimitMs") or DEFAULT_TIME_LIMIT * 1000) / 1000, MAX_TIME_LIMIT)
+    node_limit = min(int(data.get("nodeLimit") or DEFAULT_NODE_LIMIT), DEFAULT_NODE_LIMIT)
+    stats = SearchStats(time_limit, node_limit)
+
+    snapshot = get_snapshot(restaurant)
+    order = search_order(snapshot, query["categories"], query["excluded"])
+    sse = request.args.get("format") == "sse" or request.accept_mimetypes.best == "text/event-stream"
+    response = current_app.response_class(
+        stream_combos(snapshot, order, query, stats, sse),
+        mimetype="text/event-stream" if sse else "application/x-ndjson",
+    )
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # keep proxies from holding the stream back
+    return response
+
+_SEARCH_DONE = object()
+
+def stream_combos(snapshot, order, query, stats, sse):
+    macros, max_items, category_limits, num = query["macros"], query["max_items"], query["category_limits"], query["num"]
+    found = queue.Queue()
+    stop = threading.Event()
+    stats.cancelled = stop.is_set
+    outcome = {"closest": False, "error": None}
+
+    def search():
+        try:
+            under_max = snapshot.mask(macros, use_min=False)
+            classes = ItemClasses([snapshot.items[i] for i in order[under_max[order]]], category_limits, max_items)
+            combos = find_combos_dp(classes.items, macros, max_items, category_limits, num, stats,
+                                    on_found=lambda combo: found.put(classes.expand(combo)), repeats=classes.repeats)
+            if not combos and not stats.truncated:
+                outcome["closest"] = True
+                classes = ItemClasses([snapshot.items[i] for i in order], category_limits, max_items)
+                for combo in find_closest_combos(classes.items, macros, max_items, category_limits, num, stats,
+                                                 classes.repeats):
+                    found.put(classes.expand(combo))
+        except Exception as e:
+            outcome["error"] = str(e)
+        finally:
+            found.put(_SEARCH_DONE)
+
+    def record(kind, payload):
+        body = json.dumps(payload, separators=(",", ":"))
+        return f"event: {kind}\ndata: {body}\n\n" if sse else body + "\n"
+
+    threading.Thread(target=search, name="combo-stream", daemon=True).start()
+    count = 0
+    try:
+        while (combo := found.get()) is not _SEARCH_DONE:
+            count += 1
+            yield record("combo", format_combo(combo))
+
+        summary = {"done": True, "count": count, "closest": outcome["closest"], "truncated": stats.truncated,
+                   "stats": stats.as_dict()}
+        if outcome["error"]:
+            summary["error"] = outcome["error"]
+        metrics.record_search("closest" if outcome["closest"] else "stream", stats, count)
+        yield record("summary", summary)
+    finally:
+        # also runs when the client disconnects and the server closes this generator
+        stop.set()
+
+# many combo queries against one restaurant in one request, e.g. every meal slot of a week's plan.
+#
+# the snapshot is fetched once, the search order is built once per distinct category set, specs that
+# normalize to the same query share one search (and the result cache with get_combos), and with
+# "parallel": true the specs run on a few threads, which lets their searches share the combo process pool.
+# the whole batch shares one time budget; each spec gets whatever is left of it, capped at the per-spec limit
+@routes.route('/api/get_combos_batch', methods=['POST'])
+def get_combos_batch():
+    data = request.get_json()
+    restaurant = data.get("restaurant")
+    specs = data.get("specs") or []
+    if not isinstance(specs, list) or not specs:
+        return jsonify({"error": "specs must be a non-empty list"}), 400
+    if len(specs) > MAX_BATCH_SPECS:
+        return jsonify({"error": f"at most {MAX_BATCH_SPECS} specs per batch"}), 400
+
+    time_limit = min(float(data.get("timeLimitMs") or DEFAULT_TIME_LIMIT * 1000) / 1000, MAX_TIME_LIMIT)
+    node_limit = min(int(data.get("nodeLimit") or DEFAULT_NODE_LIMIT), DEFAULT_NODE_LIMIT)
+    deadline = time.perf_counter() + min(time_limit * len(specs), MAX_BATCH_TIME_LIMIT)
+
+    generation = results.generation(restaurant)
+    snapshot = get_snapshot(restaurant)
+    queries = [combo_query(spec, data) for spec in specs]
+    orders = {}
+    for query in queries:
+        group = (tuple(sorted(set(query["categories"] or []))), tuple(sorted(set(query["excluded"] or []))))
+        if group not in orders:
+            orders[group] = search_order(snapshot, *group)
+        query["order"] = orders[group]
+
+    # identical specs are answered by the first one's search; the rest draw from its cached pool
+    lock = threading.Lock()
+    searched = {}
+    # pool threads don't inherit the request's app context, which frontier builds and db reads need
+    app = current_app._get_current_object()
+
+    def answer(query):
+        key = query_key("combos", restaurant, query["macros"], query["categories"], query["excluded"],
+                        query["max_items"], query["category_limits"])
+        with lock:
+            gate = searched.setdefault(key, threading.Lock())
+        with gate, app.app_context():
+            stats = SearchStats(min(time_limit, deadline - time.perf_counter()), node_limit)
+            return answer_combo_query(snapshot, generation, restaurant, query, stats, data.get("stats"),
+                                      query["order"])
+
+    if data.get("parallel") and len(queries) > 1:
+        with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(queries))) as pool:
+            responses = list(pool.map(answer, queries))
     else:
-        result = random.sample(valid_combos, min(num, len(valid_combos)))
+        responses = [answer(query) for query in queries]
 
-    return jsonify({
-        "combos": [format_combo(combo) for combo in result],
-        "closest": closest,
-    })
+    return jsonify({"results": responses, "truncated": any(r["truncated"] for r in responses)})
+
+# a fresh random sample of num combos from a pool, or None if the pool can't answer
+def draw_combos(pool, num):
+    combos, closest, ranked_for = pool
+    if closest:
+        return combos[:num] if num <= ranked_for else None
+    if isinstance(combos, (ComboSampler, IndexMatches, ClassCombos)):
+        return combos.draw(num)
+    return random.sample(combos, min(num, len(combos)))
+
+def pool_size(pool):
+    combos, _, _ = pool
+    return approx_size(combos)
 
 
 @routes.route('/api/get_restaurants')
 def get_restaurants():
-    restaurant_names = db.session.query(MenuItem.restaurant).distinct().all()
-    restaurants = sorted({name for (name,) in restaurant_names})
-    logos = load_logos()
-    return jsonify([{"name": r, "logo": logos.get(r)} for r in restaurants])
+    restaurants = (
+        db.session.query(Restaurant.id, Restaurant.name, Restaurant.logo)
+        .filter(Restaurant.item_count > 0)
+        .order_by(Restaurant.name)
+        .all()
+    )
+    return jsonify([{"name": name, "logo": logo_url(rid, logo)} for rid, name, logo in restaurants])
+
+# logos go through /api/logos unless LOGO_PROXY=0. the url carries a hash of the remote url, so a
+# changed logo gets a new address and browsers can cache each one forever
+def logo_url(restaurant_id, logo):
+    if not logo or not LOGO_PROXY:
+        return logo
+    return url_for("routes.get_logo", restaurant_id=restaurant_id, v=logo_version(logo), _external=True)
+
+@routes.route('/api/logos/<int:restaurant_id>')
+def get_logo(restaurant_id):
+    restaurant = db.session.get(Restaurant, restaurant_id)
+    if restaurant is None or not restaurant.logo:
+        return jsonify({"error": "no logo"}), 404
+    try:
+        data, content_type, etag = logo_cache.get(restaurant.logo)
+    except Exception as e:
+        # couldn't download it, let the browser try the original
+        print(f"failed to cache logo for {restaurant.name}: {e}")
+        return redirect(restaurant.logo)
+
+    response = current_app.response_class(data, mimetype=content_type)
+    # the image comes from a third party and is served from this origin, so an svg can't run script
+    # here and the browser can't sniff it as something else
+    response.headers["Content-Security-Policy"] = "default-src 'none'; style-src 'unsafe-inline'"
+    response.headers["X-Content-Type-Options"] = "nosniff"
+    response.set_etag(etag)
+    response.cache_control.public = True
+    if request.args.get("v") == logo_version(restaurant.logo):
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.max_age = 3600
+    return response.make_conditional(request)
     
 @routes.route('/api/categories')
 def get_categories():
@@ -383,20 +574,39 @@ def get_categories():
 
     categories = (
         db.session.query(MenuItem.category)
-        .filter_by(restaurant=restaurant)
+        .join(Restaurant, MenuItem.restaurant_id == Restaurant.id)
+        .filter(Restaurant.name == restaurant)
         .distinct()
         .all()
     )
     return jsonify(sorted({cat for (cat,) in categories if cat}))
 
-# clean name to use in url
-def clean_name(name):
-    name = name.lower()
-    name = re.sub(r'[^\w\s-]', '', name)  # remove punctuation except dash/space
-    name = re.sub(r'\s+', '-', name.strip())  # spaces -> dash
-    return name
-
-
+# everything the page needs to draw its restaurant picker, category list and slider ranges, in one
+# response. it's built once per menu version and revalidated with If-None-Match, so a repeat load
+# is a 304 after comparing the etag
+@routes.route('/api/metadata')
+def get_metadata():
+    body, etag = metadata.get_metadata(request.host_url, logo_url)
+    response = current_app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+# already-cached restaurant matching a slug or a name (case-insensitive), if any
+def find_restaurant(slug=None, name=None):
+    if slug:
+        restaurant = Restaurant.query.filter(
+            (Restaurant.slug == slug) | (db.func.lower(Restaurant.name) == slug.replace("-", " "))
+        ).first()
+        if restaurant:
+            return restaurant
+    if name:
+        return Restaurant.query.filter(db.func.lower(Restaurant.name) == name.lower()).first()
+    return None
+
+
+# scraping takes seconds, so the route only queues a job and the client polls /api/jobs/<id>.
+# a slug that's already being scraped joins the job in flight instead of starting another
 @routes.route('/api/add_restaurant', methods=['POST'])
 def add_restaurant():
     data = request.get_json()
@@ -405,32 +615,43 @@ def add_restaurant():
         return jsonify({"error": "slug is required"}), 400
 
     slug = clean_name(slug)
+    # refresh re-scrapes a cached restaurant and applies only the differences
+    refresh = bool(data.get("refresh"))
+
+    # check if already cached (by slug, or the slug-derived name heuristic)
+    existing = find_restaurant(slug=slug)
+    if existing and existing.item_count and not refresh:
+        return jsonify({"error": f"'{existing.name}' is already cached"}), 409
 
-    # check if already cached (match by slug-derived name heuristic)
-    existing = db.session.query(MenuItem.restaurant).filter(
-        MenuItem.restaurant.ilike(slug.replace("-", " "))
-    ).first()
-    if existing:
-        return jsonify({"error": f"'{existing[0]}' is already cached"}), 409
+    job, created = jobs.submit(current_app._get_current_object(), slug, scrape_restaurant_job, refresh=refresh)
+    return jsonify({**job.as_dict(), "coalesced": not created}), 202
 
+# runs on a job thread inside the app context, see jobs.py
+def scrape_restaurant_job(job, app):
+    job.status = FETCHING
     try:
-        restaurant_name, items, logo_url = scrape_nutritionix_menu(slug)
+        page = fetch(menu_url(job.slug))
+        job.status = PARSING
+        with metrics.scrape_seconds.time("parse"):
+            restaurant_name, items, logo_url = parse_nutritionix_menu(page.text, job.slug)
     except ValueError as e:
-        return jsonify({"error": str(e)}), 404
-    except Exception as e:
-        return jsonify({"error": f"Failed to scrape menu: {str(e)}"}), 500
+        raise JobError(str(e), 404)
 
     # double-check by canonical name in case slug->name differs from DB
-    existing_by_name = db.session.query(MenuItem.restaurant).filter(
-        MenuItem.restaurant.ilike(restaurant_name)
-    ).first()
-    if existing_by_name:
-        return jsonify({"error": f"'{existing_by_name[0]}' is already cached"}), 409
+    existing_by_name = find_restaurant(name=restaurant_name)
+    if existing_by_name and existing_by_name.item_count and not job.refresh:
+        raise JobError(f"'{existing_by_name.name}' is already cached", 409)
 
-    cache_restaurant(restaurant_name, items)
+    job.status = STORING
+    job.result = {"restaurant": restaurant_name, "items_cached": len(items)}
+    counts = cache_restaurant(restaurant_name, items, job.slug, refresh=job.refresh, page=page)
     if logo_url:
         save_logo(restaurant_name, logo_url)
-    return jsonify({"restaurant": restaurant_name, "items_cached": len(items)})
-
-
-
+    return {**job.result, **counts}
+
+@routes.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify(job.as_dict())
@@ -0,0 +1,177 @@
+import random
+import numpy as np
+from combos import safe_float
+
+GRID_CELLS = 16384           # max cells in one counting table
+MAX_TABLE_CELLS = 4_000_000  # float32 cells across the n + 1 tables kept for the sampling walk
+MIN_BUCKETS = 4              # coarser than this and most draws would get rejected
+MAX_BUCKETS = 256            # finer than this doesn't change the acceptance rate much
+MAX_ATTEMPTS = 50            # draws per requested combo before giving up
+MIN_ACCEPT_RATE = 0.05       # give up early if fewer draws than this pass the exact check
+EARLY_CHECK = 100            # ... measured after this many draws
+
+MACRO_KEYS = [
+    ("calories", "calorieMin", "calorieMax"),
+    ("protein",  "proteinMin", "proteinMax"),
+    ("fat",      "fatMin",     "fatMax"),
+    ("carbs",    "carbMin",    "carbMax"),
+]
+
+# one axis of the counting grid. `step(item)` is how far an item moves the state along it.
+# capped axes drop states that run past the end (a max that's blown), saturating axes pile them
+# into the last cell (a min that's already met).
+class _Axis:
+    def __init__(self, size, saturate, step):
+        self.size = size
+        self.saturate = saturate
+        self.step = step
+
+# g[s] -> g[next(s)] for an item that moves `steps[k]` along each axis (0 where next(s) overflows a cap)
+def _pull(table, axes, steps):
+    for k, (axis, d) in enumerate(zip(axes, steps)):
+        if not d:
+            continue
+        pulled = np.zeros_like(table)
+        src = [slice(None)] * table.ndim
+        dst = [slice(None)] * table.ndim
+        if d < axis.size:
+            src[k], dst[k] = slice(d, None), slice(None, axis.size - d)
+            pulled[tuple(dst)] = table[tuple(src)]
+        if axis.saturate:
+            src[k], dst[k] = slice(axis.size - 1, None), slice(max(axis.size - d, 0), None)
+            pulled[tuple(dst)] = table[tuple(src)]
+        table = pulled
+    return table
+
+def _next_state(state, axes, steps):
+    nxt = []
+    for s, axis, d in zip(state, axes, steps):
+        s += d
+        if s >= axis.size:
+            if not axis.saturate:
+                return None
+            s = axis.size - 1
+        nxt.append(s)
+    return tuple(nxt)
+
+def _meets_exact(combo, macros, cat_lim):
+    if len(combo) < 2:
+        return False
+    for cat, limits in cat_lim.items():
+        count = sum((item.category or "") == cat for item in combo)
+        if limits.get("min") is not None and count < limits["min"]: return False
+        if limits.get("max") is not None and count > limits["max"]: return False
+    for key, min_key, max_key in MACRO_KEYS:
+        total = sum(getattr(item, key) or 0 for item in combo)
+        min_val = safe_float(macros.get(min_key))
+        max_val = safe_float(macros.get(max_key))
+        if min_val is not None and total < min_val: return False
+        if max_val is not None and total > max_val: return False
+    return True
+
+# counting tables for drawing combos uniformly at random from every valid combo, without enumerating them.
+#
+# g_i[s] counts the ways to finish a combo from grid state s using items[i:], filled backwards with
+# g_i = g_{i+1} + g_{i+1}[next(s)] (skip or include items[i]). the state is the item count, the count in
+# each limited category, and each constrained macro's running total rounded down to buckets. the bucketed
+# check is looser than the real one, so it counts a superset of the valid combos; a forward walk then
+# includes each item with probability g_{i+1}[next(s)] / g_i[s], which is a uniform draw from that
+# superset, and draws that fail the exact check are thrown away, leaving a uniform draw from the valid set.
+#
+# the tables only depend on the query, so one sampler can serve fresh draws for repeated requests.
+# `total` is the size of the superset, or None when the grid would be too big or too coarse to be useful.
+class ComboSampler:
+    def __init__(self, items, macros, max_items, category_limits=None):
+        self.items = items
+        self.macros = macros
+        self.cat_lim = category_limits or {}
+        self.tables = None
+        self.total = None
+        if max_items < 2:
+            return
+
+        n = len(items)
+        axes = [_Axis(max_items + 1, False, lambda item: 1)]
+        valid = [lambda counts: counts[0] >= 2]
+
+        for cat, limits in self.cat_lim.items():
+            min_cat, max_cat = limits.get("min"), limits.get("max")
+            if min_cat is None and max_cat is None:
+                continue
+            size = min(max_cat if max_cat is not None else min_cat, max_items) + 1
+            axes.append(_Axis(size, max_cat is None, lambda item, cat=cat: int((item.category or "") == cat)))
+            if min_cat:
+                valid.append(lambda counts, k=len(axes) - 1, m=min_cat: counts[k] >= m)
+
+        constrained = []
+        for key, min_key, max_key in MACRO_KEYS:
+            min_val = safe_float(macros.get(min_key))
+            max_val = safe_float(macros.get(max_key))
+            if (max_val is not None and max_val > 0) or (min_val is not None and min_val > 0):
+                constrained.append((key, min_val, max_val))
+
+        base = int(np.prod([axis.size for axis in axes]))
+        cells = min(GRID_CELLS, MAX_TABLE_CELLS // (n + 1))
+        buckets = min(int((cells / base) ** (1 / len(constrained))) - 1, MAX_BUCKETS) if constrained else 0
+        if base > cells or (constrained and buckets < MIN_BUCKETS):
+            return
+
+        for key, min_val, max_val in constrained:
+            span = max_val if max_val is not None and max_val > 0 else min_val
+            width = span / buckets
+            axes.append(_Axis(buckets + 1, max_val is None or max_val <= 0,
+                              lambda item, key=key, width=width: int(max(getattr(item, key) or 0, 0) // width)))
+            if min_val is not None:
+                # each item loses less than one bucket to rounding, so a combo of count items can be up to
+                # count buckets heavier than its grid total
+                valid.append(lambda counts, k=len(axes) - 1, m=min_val / width: counts[k] + counts[0] >= m)
+
+        shape = tuple(axis.size for axis in axes)
+        grid = np.indices(shape)
+        table = np.ones(shape, dtype=np.float32)
+        for check in valid:
+            table = table * check(grid)
+
+        self.axes = axes
+        self.steps = [tuple(axis.step(item) for axis in axes) for item in items]
+        self.tables = [None] * (n + 1)
+        self.tables[n] = table
+        for i in range(n - 1, -1, -1):
+            table = table + _pull(table, axes, self.steps[i])
+            self.tables[i] = table
+
+        self.origin = (0,) * len(axes)
+        self.total = float(self.tables[0][self.origin])
+
+    @property
+    def nbytes(self):
+        return sum(table.nbytes for table in self.tables) if self.tables else 0
+
+    # up to `num` distinct valid combos, or None if too many draws get rejected
+    def draw(self, num, rng=random):
+        if not self.total or num <= 0:
+            return []
+
+        combos, seen, accepted = [], set(), 0
+        for attempt in range(1, num * MAX_ATTEMPTS + 1):
+            if attempt == EARLY_CHECK and accepted < EARLY_CHECK * MIN_ACCEPT_RATE:
+                return None
+            state, picked = self.origin, []
+            for i in range(len(self.items)):
+                nxt = _next_state(state, self.axes, self.steps[i])
+                if nxt is not None and rng.random() * self.tables[i][state] < self.tables[i + 1][nxt]:
+                    state = nxt
+                    picked.append(i)
+
+            key = tuple(picked)
+            combo = [self.items[i] for i in picked]
+            if not _meets_exact(combo, self.macros, self.cat_lim):
+                continue
+            accepted += 1
+            if key in seen:
+                continue
+            seen.add(key)
+            combos.append(combo)
+            if len(combos) >= num:
+                return combos
+        return None
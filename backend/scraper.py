@@ -0,0 +1,132 @@
+import os
+import time
+import random
+import hashlib
+import threading
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from requests.adapters import HTTPAdapter
+import metrics
+
+# point this at a local stand-in (see benchmarks/stub_server.py) to scrape without hitting nutritionix
+NUTRITIONIX_URL = os.environ.get("NUTRITIONIX_URL", "https://www.nutritionix.com").rstrip("/")
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
+
+SCRAPE_WORKERS = 8        # pages fetched and parsed at once
+REQUESTS_PER_SECOND = 4   # per host
+MAX_RETRIES = 3
+BACKOFF = 0.5             # seconds before the first retry, doubled each time
+TIMEOUT = 15
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def menu_url(slug, base_url=None):
+    return f"{base_url or NUTRITIONIX_URL}/{slug}/menu/premium"
+
+# sha256 of a page body, stored with the menu so a refresh can tell an unchanged page without parsing it
+def content_hash(body):
+    return hashlib.sha256(body).hexdigest()
+
+# a session that keeps up to pool_size connections per host open between requests
+def make_session(pool_size=SCRAPE_WORKERS):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+# one pooled session for calls that don't bring their own (a single add_restaurant job, logo downloads),
+# made on first use and shared by every thread, so those calls reuse connections instead of each
+# opening a pool that's never closed
+_shared_session = None
+_shared_lock = threading.Lock()
+
+def shared_session():
+    global _shared_session
+    with _shared_lock:
+        if _shared_session is None:
+            _shared_session = make_session()
+        return _shared_session
+
+# spaces requests to each host at least 1 / rate seconds apart, shared by every thread
+class RateLimiter:
+    def __init__(self, rate=REQUESTS_PER_SECOND):
+        self.interval = 1 / rate if rate else 0
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next.get(host, now))
+            self._next[host] = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+class ScrapeError(Exception):
+    pass
+
+# GET with retries and exponential backoff (with jitter) on connection errors, timeouts, 429 and 5xx.
+# Retry-After is honoured when the server sends it. other non-2xx/304 statuses fail straight away
+# with a ValueError, like a restaurant that doesn't exist.
+def fetch(url, session=None, limiter=None, headers=None, retries=MAX_RETRIES, backoff=BACKOFF):
+    outcome = "error"
+    try:
+        with metrics.scrape_seconds.time("fetch"):
+            r = _fetch(url, session, limiter, headers, retries, backoff)
+        outcome = "not_modified" if r.status_code == 304 else "ok"
+        return r
+    finally:
+        metrics.scrape_fetches.inc(outcome)
+
+# the same GET for anything that isn't a menu page (logo images), kept out of the scrape metrics
+def download(url, retries=MAX_RETRIES, backoff=BACKOFF):
+    return _fetch(url, None, None, None, retries, backoff, source=urlsplit(url).netloc)
+
+def _fetch(url, session, limiter, headers, retries, backoff, source="Nutritionix"):
+    session = session or shared_session()
+    host = urlsplit(url).netloc
+    for attempt in range(retries + 1):
+        if limiter:
+            limiter.wait(host)
+        try:
+            r = session.get(url, headers=headers, timeout=TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == retries:
+                raise ScrapeError(f"{url}: {e}") from e
+            delay = backoff * 2 ** attempt
+        else:
+            if r.status_code in (200, 304):
+                return r
+            if r.status_code not in RETRY_STATUSES:
+                raise ValueError(f"{source} returned {r.status_code} for '{url}'")
+            if attempt == retries:
+                raise ScrapeError(f"{url}: gave up after {retries + 1} attempts ({r.status_code})")
+            retry_after = r.headers.get("Retry-After", "")
+            delay = float(retry_after) if retry_after.isdigit() else backoff * 2 ** attempt
+        metrics.scrape_retries.inc()
+        time.sleep(delay * random.uniform(0.5, 1.5))
+
+# fetch and parse many menus at once, yielding (slug, result, error) as each one finishes, so the
+# caller can write finished menus to the db while the rest are still downloading.
+# parse(response, slug) runs on the worker threads; exactly one of result and error is None.
+def scrape_many(slugs, parse, workers=SCRAPE_WORKERS, rate=REQUESTS_PER_SECOND, retries=MAX_RETRIES,
+                base_url=None):
+    session = make_session(workers)
+    limiter = RateLimiter(rate)
+
+    def scrape(slug):
+        r = fetch(menu_url(slug, base_url), session, limiter, retries=retries)
+        with metrics.scrape_seconds.time("parse"):
+            return parse(r, slug)
+
+    # closed however the caller stops iterating
+    with session, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(scrape, slug): slug for slug in slugs}
+        for future in as_completed(futures):
+            slug = futures[future]
+            try:
+                yield slug, future.result(), None
+            except Exception as e:
+                yield slug, None, e
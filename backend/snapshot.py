@@ -0,0 +1,212 @@
+import threading
+from collections import namedtuple
+import numpy as np
+from database import db, MenuItem, Restaurant
+import metrics
+
+# lightweight stand-in for a MenuItem row, same attribute names so the combo code works on either
+SnapshotItem = namedtuple("SnapshotItem", ["id", "name", "category", "calories", "protein", "fat", "carbs"])
+
+# (column, min key, max key) for every macro filter the routes accept
+MACRO_BOUNDS = [
+    ("calories", "calorieMin", "calorieMax"),
+    ("protein",  "proteinMin", "proteinMax"),
+    ("fat",      "fatMin",     "fatMax"),
+    ("carbs",    "carbMin",    "carbMax"),
+]
+
+def _bound(val):
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        return None
+
+# read-only columnar copy of one restaurant's menu.
+# macros are float arrays (NaN where the db has NULL, so comparisons drop them like SQL does),
+# categories are interned to small integer codes.
+class MenuSnapshot:
+    def __init__(self, restaurant, rows):
+        self.restaurant = restaurant
+        self.items = [SnapshotItem(*row) for row in rows]
+
+        self.ids = np.array([item.id for item in self.items], dtype=np.int64)
+        self.names = np.array([item.name for item in self.items], dtype=object)
+
+        self.category_names = sorted({item.category or "" for item in self.items})
+        codes = {cat: code for code, cat in enumerate(self.category_names)}
+        self.category_codes = np.array([codes[item.category or ""] for item in self.items], dtype=np.int32)
+
+        def column(key):
+            return np.array(
+                [np.nan if getattr(item, key) is None else getattr(item, key) for item in self.items],
+                dtype=np.float64,
+            )
+
+        self.calories = column("calories")
+        self.protein  = column("protein")
+        self.fat      = column("fat")
+        self.carbs    = column("carbs")
+
+    def __len__(self):
+        return len(self.items)
+
+    def category_mask(self, categories):
+        wanted = [self.category_names.index(c) for c in set(categories) if c in self.category_names]
+        return np.isin(self.category_codes, wanted)
+
+    # boolean mask of the rows that pass the given filters. use_min=False only applies the max bounds,
+    # which is what the combo routes want (mins are checked on the combo totals instead)
+    def mask(self, macros=None, categories=None, excluded=None, use_min=True):
+        keep = np.ones(len(self.items), dtype=bool)
+        macros = macros or {}
+
+        for key, min_key, max_key in MACRO_BOUNDS:
+            col = getattr(self, key)
+            max_val = _bound(macros.get(max_key))
+            if max_val is not None:
+                keep &= col <= max_val
+            if use_min:
+                min_val = _bound(macros.get(min_key))
+                if min_val is not None:
+                    keep &= col >= min_val
+
+        if categories:
+            keep &= self.category_mask(categories)
+        if excluded:
+            keep &= ~np.isin(self.names, list(excluded))
+        return keep
+
+    # how far each row is outside the macro ranges, same rules as routes.macro_distance
+    # (missing values count as 0, a min violation wins over a max violation)
+    def distance(self, macros):
+        dist = np.zeros(len(self.items), dtype=np.float64)
+        macros = macros or {}
+
+        for key, min_key, max_key in MACRO_BOUNDS:
+            col = np.nan_to_num(getattr(self, key))
+            min_val = _bound(macros.get(min_key))
+            max_val = _bound(macros.get(max_key))
+            under = np.zeros(len(col), dtype=bool)
+            if min_val is not None:
+                under = col < min_val
+                dist += np.where(under, min_val - col, 0)
+            if max_val is not None:
+                dist += np.where(~under & (col > max_val), col - max_val, 0)
+        return dist
+
+    # the num rows closest to the macro ranges, ordered by distance then menu order.
+    # argpartition finds the cut-off in O(n); ties at the cut-off are broken by menu order so the
+    # result matches a stable full sort
+    def closest(self, macros, categories=None, num=None):
+        return [self.items[i] for i in self.closest_rows(macros, categories, num)]
+
+    # row numbers for closest(); `mask` limits the candidates further
+    def closest_rows(self, macros, categories=None, num=None, mask=None):
+        if categories:
+            mask = self.category_mask(categories) if mask is None else mask & self.category_mask(categories)
+        candidates = np.flatnonzero(mask) if mask is not None else np.arange(len(self.items))
+        dist = self.distance(macros)[candidates]
+
+        if num and num < len(candidates):
+            kth = dist[np.argpartition(dist, num - 1)[num - 1]]
+            below = np.flatnonzero(dist < kth)
+            at = np.flatnonzero(dist == kth)[:num - len(below)]
+            picked = np.concatenate([below, at])
+        else:
+            picked = np.arange(len(candidates))
+
+        picked = picked[np.lexsort((picked, dist[picked]))]
+        return candidates[picked]
+
+    def select(self, mask):
+        return [self.items[i] for i in np.flatnonzero(mask)]
+
+    def filter(self, macros=None, categories=None, excluded=None, use_min=True):
+        return self.select(self.mask(macros, categories, excluded, use_min))
+
+# every cached restaurant's menu in one snapshot, for searches across restaurants. rows are grouped
+# by restaurant, and restaurant_codes index restaurant_names like category_codes do for categories
+class Catalog(MenuSnapshot):
+    def __init__(self, rows):
+        super().__init__(None, [row[1:] for row in rows])
+        self.restaurant_names = sorted({row[0] for row in rows})
+        codes = {name: code for code, name in enumerate(self.restaurant_names)}
+        self.restaurant_codes = np.array([codes[row[0]] for row in rows], dtype=np.int32)
+
+    def restaurant_mask(self, restaurants):
+        wanted = [self.restaurant_names.index(r) for r in set(restaurants) if r in self.restaurant_names]
+        return np.isin(self.restaurant_codes, wanted)
+
+
+_snapshots = {}
+_catalog = None
+_lock = threading.Lock()
+_generation = 0  # bumped on every invalidate so a load that raced a write isn't cached
+
+def _load(restaurant):
+    rows = (
+        db.session.query(
+            MenuItem.id, MenuItem.name, MenuItem.category,
+            MenuItem.calories, MenuItem.protein, MenuItem.fat, MenuItem.carbs,
+        )
+        .join(Restaurant, MenuItem.restaurant_id == Restaurant.id)
+        .filter(Restaurant.name == restaurant)
+        .order_by(MenuItem.id)
+        .all()
+    )
+    return MenuSnapshot(restaurant, rows)
+
+# returns the cached snapshot for a restaurant, building it from the db on first use.
+# unknown restaurants get an empty snapshot that isn't cached, so bad names can't grow the registry
+def get_snapshot(restaurant):
+    snap = _snapshots.get(restaurant)
+    if snap is not None:
+        metrics.snapshot_lookups.inc("hit")
+        return snap
+
+    metrics.snapshot_lookups.inc("miss")
+    generation = _generation
+    snap = _load(restaurant)
+    if not len(snap):
+        return snap
+    with _lock:
+        if generation != _generation:
+            return snap
+        return _snapshots.setdefault(restaurant, snap)
+
+def _load_catalog():
+    rows = (
+        db.session.query(
+            Restaurant.name, MenuItem.id, MenuItem.name, MenuItem.category,
+            MenuItem.calories, MenuItem.protein, MenuItem.fat, MenuItem.carbs,
+        )
+        .join(Restaurant, MenuItem.restaurant_id == Restaurant.id)
+        .order_by(Restaurant.name, MenuItem.id)
+        .all()
+    )
+    return Catalog(rows)
+
+# the catalog of every restaurant, built on first use and dropped whenever any menu changes
+def get_catalog():
+    global _catalog
+    catalog = _catalog
+    if catalog is not None:
+        return catalog
+
+    generation = _generation
+    catalog = _load_catalog()
+    with _lock:
+        if generation == _generation and _catalog is None:
+            _catalog = catalog
+        return _catalog or catalog
+
+# drop cached snapshots after the menu changes (all of them if no restaurant is given)
+def invalidate(restaurant=None):
+    global _generation, _catalog
+    with _lock:
+        _generation += 1
+        _catalog = None
+        if restaurant is None:
+            _snapshots.clear()
+        else:
+            _snapshots.pop(restaurant, None)
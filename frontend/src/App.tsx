@@ -149,10 +149,20 @@ type PinnedItem = {
   count: number;
 };
 
+type MacroRange = { min: number | null; max: number | null };
+
+type RestaurantMeta = {
+  name: string;
+  slug: string;
+  logo: string | null;
+  item_count: number;
+  categories: { name: string; item_count: number; calories: MacroRange; protein: MacroRange; fat: MacroRange; carbs: MacroRange }[];
+};
+
 const App = () => {
   const filters = ["calories", "protein", "carbs", "fat"];
   const [restaurant, setRestaurant] = useState("");
-  const [restaurants, setRestaurants] = useState<{ name: string; logo: string | null }[]>([]);
+  const [restaurants, setRestaurants] = useState<RestaurantMeta[]>([]);
   const [items, setItems] = useState<MenuItem[]>([]);
   const [selectedFilters, setSelectedFilters] = useState<Set<string>>(new Set());
   const [minCalories, setMinCalories] = useState<number | "">("");
@@ -365,8 +375,9 @@ const App = () => {
 
   const fetchRestaurants = async () => {
     try {
-      const res = await axios.get("http://127.0.0.1:5050/api/get_restaurants");
-      setRestaurants(res.data);
+      // restaurants with their categories in one response; the browser revalidates it with its etag
+      const res = await axios.get("http://127.0.0.1:5050/api/metadata");
+      setRestaurants(res.data.restaurants);
     } catch (err) {
       console.error("error fetching restaurants:", err);
       setRestaurants([]);
@@ -378,8 +389,18 @@ const App = () => {
     setAddLoading(true);
     setAddStatus(null);
     try {
-      const res = await axios.post("http://127.0.0.1:5050/api/add_restaurant", { slug: addSlug.trim() });
-      setAddStatus({ msg: `cached ${res.data.restaurant} (${res.data.items_cached} items)`, ok: true });
+      let { data: job } = await axios.post("http://127.0.0.1:5050/api/add_restaurant", { slug: addSlug.trim() });
+      // scraping runs as a background job, poll it until it finishes
+      while (job.status !== "done" && job.status !== "failed") {
+        setAddStatus({ msg: `${job.status}...`, ok: true });
+        await new Promise((resolve) => setTimeout(resolve, 500));
+        job = (await axios.get(`http://127.0.0.1:5050/api/jobs/${job.id}`)).data;
+      }
+      if (job.status === "failed") {
+        setAddStatus({ msg: job.error, ok: false });
+        return;
+      }
+      setAddStatus({ msg: `cached ${job.restaurant} (${job.items_cached} items)`, ok: true });
       setAddSlug("");
       fetchRestaurants();
     } catch (err: any) {
@@ -390,21 +411,16 @@ const App = () => {
     }
   };
 
-  const fetchCategories = async () => {
+  const fetchCategories = () => {
     if (!restaurant) return;
-    try {
-      const res = await axios.get("http://127.0.0.1:5050/api/categories", { params: { restaurant } });
-      setCategories(res.data);
-      setSelectedCategories(new Set(res.data));
-      setCategoryLimits(Object.fromEntries(res.data.map((c: string) => [c, { min: "", max: "" }])));
-    } catch (err) {
-      console.error("error fetching categories:", err);
-      setCategories([]);
-      setSelectedCategories(new Set());
-    }
+    const names = (restaurants.find((r) => r.name === restaurant)?.categories || []).map((c) => c.name);
+    setCategories(names);
+    setSelectedCategories(new Set(names));
+    setCategoryLimits(Object.fromEntries(names.map((c) => [c, { min: "", max: "" }])));
   };
 
-  useEffect(() => { fetchCategories(); }, [restaurant]);
+  // restaurants too: the metadata can arrive after a restaurant is picked, and is refetched after adding one
+  useEffect(() => { fetchCategories(); }, [restaurant, restaurants]);
   useEffect(() => { fetchRestaurants(); }, []);
   useEffect(() => { localStorage.setItem("exclusions", JSON.stringify(exclusions)); }, [exclusions]);
   useEffect(() => { localStorage.setItem("favItems", JSON.stringify(favItems)); }, [favItems]);